@@ -0,0 +1,53 @@
+from fastapi import Depends, Request
+from typing import Optional
+from app.core.answer_cache import AnswerCache
+from app.core.components import Components
+from app.core.db_connector import DBConnector
+from app.core.document_loader import DocumentLoader
+from app.core.embedding_processor import EmbeddingProcessor
+from app.core.ingestion_queue import IngestionQueue
+from app.core.job_store import JobStore
+from app.core.keyword_index import KeywordIndex
+from app.core.query_pipeline import QueryPipeline
+from app.core.upload_store import UploadStore
+
+
+def get_components(request: Request) -> Components:
+    """Return the components built by the application lifespan."""
+    return request.app.state.components
+
+
+def get_db_connector(components: Components = Depends(get_components)) -> DBConnector:
+    return components.db_connector
+
+
+def get_embedding_processor(components: Components = Depends(get_components)) -> EmbeddingProcessor:
+    return components.embedding_processor
+
+
+def get_document_loader(components: Components = Depends(get_components)) -> DocumentLoader:
+    return components.document_loader
+
+
+def get_query_pipeline(components: Components = Depends(get_components)) -> QueryPipeline:
+    return components.query_pipeline
+
+
+def get_ingestion_queue(components: Components = Depends(get_components)) -> IngestionQueue:
+    return components.ingestion_queue
+
+
+def get_job_store(components: Components = Depends(get_components)) -> JobStore:
+    return components.job_store
+
+
+def get_keyword_index(components: Components = Depends(get_components)) -> KeywordIndex:
+    return components.keyword_index
+
+
+def get_upload_store(components: Components = Depends(get_components)) -> UploadStore:
+    return components.upload_store
+
+
+def get_answer_cache(components: Components = Depends(get_components)) -> Optional[AnswerCache]:
+    return components.answer_cache
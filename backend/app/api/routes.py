@@ -1,19 +1,40 @@
-import openai
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, Form, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional, Dict
+from datetime import datetime, timezone
+import json
 import logging
-import traceback  # Add this import
-import chromadb  # Add this import
-from app.core.document_loader import DocumentLoader
+import os
+import traceback
+from app.core.answer_cache import AnswerCache
 from app.core.embedding_processor import EmbeddingProcessor
 from app.core.db_connector import DBConnector
-from chromadb import Client, Settings
-from langchain.chains import RetrievalQA
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from app.core.embedding_processor import EmbeddingProcessor
-import uuid
-from langchain.vectorstores import Chroma
+from app.core.document_loader import DocumentLoader
+from app.core.query_pipeline import QueryPipeline
+from app.core.ingestion_queue import DocumentBusy, IngestionQueue, IngestionQueueFull
+from app.core.job_store import JobStore
+from app.core.keyword_index import KeywordIndex
+from app.core.profiling import is_admin, profile_store, slow_requests
+from app.core.upload_store import (
+    ChecksumMismatch,
+    UploadIncomplete,
+    UploadNotFound,
+    UploadStore,
+    parse_content_range
+)
+from app.api.dependencies import (
+    get_answer_cache,
+    get_db_connector,
+    get_document_loader,
+    get_embedding_processor,
+    get_ingestion_queue,
+    get_job_store,
+    get_keyword_index,
+    get_query_pipeline,
+    get_upload_store
+)
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -33,71 +54,201 @@ class Query(BaseModel):
 
 class QueryRequest(BaseModel):
     text: str = Field(..., min_length=1)
-    context_id: str = Field(..., description="Document collection ID")
+    context_id: str = Field(..., description="Document ID")
     filters: Optional[Dict[str, str]] = Field(default_factory=dict)
 
+class BatchQueryRequest(BaseModel):
+    queries: List[QueryRequest] = Field(..., min_items=1)
+
+class BatchQueryResult(BaseModel):
+    answer: Optional[str] = None
+    sources: List[Source] = []
+    error: Optional[str] = None
+
+class BatchQueryResponse(BaseModel):
+    results: List[BatchQueryResult]
+
+class UploadRequest(BaseModel):
+    filename: str = Field(..., min_length=1)
+    content_type: Optional[str] = None
+    size: int = Field(..., gt=0, description="Total bytes of the file")
+    sha256: Optional[str] = Field(None, description="Hex digest checked when the upload is finalized")
+    doc_id: Optional[str] = Field(None, description="Existing document this upload is a new version of")
+
+# Questions accepted in one /query/batch request
+BATCH_QUERY_MAX_SIZE = int(os.getenv("BATCH_QUERY_MAX_SIZE", "256"))
+
 router = APIRouter()
 
-@router.post("/ingest")
-async def ingest_document(file: UploadFile = File(...)):
+@router.post("/ingest", status_code=202)
+async def ingest_document(
+    file: UploadFile = File(...),
+    doc_id: Optional[str] = Form(None),
+    ingestion_queue: IngestionQueue = Depends(get_ingestion_queue)
+):
     """
-    Endpoint to ingest a document, process it, store it in the vector database, and return the doc identifier.
+    Endpoint to accept a document for ingestion.
+
+    The upload is spooled and queued; parsing, embedding and storage happen in the
+    background. Poll /jobs/{job_id} for progress. Pass doc_id to upload a new
+    version of an existing document; only its changed chunks are re-embedded.
+    Re-uploading an identical file returns the existing document with status
+    "duplicate".
     """
     try:
-        logger.info(f"Processing file: {file.filename}")
-        
-        # Initialize Document Loader and process file
-        doc_loader = DocumentLoader()
-        result = await doc_loader.process_file(file)
-        
-        # Generate a unique document id using a UUID
-        doc_id = f"doc_{uuid.uuid4().hex}"
-        
-        # Initialize DBConnector with the document-specific collection name
-        db = DBConnector(collection_name=doc_id)
-        db.reset_collection()  # Reset the collection before ingesting documents
-
-        # Prepare metadata (add a doc_id field so it's also stored with each chunk)
-        metadata = [{"doc_id": doc_id, "page": i} for i in range(len(result["chunks"]))]
-
-        # Inside the ingest_document endpoint, after processing the file:
-        embedding_processor = EmbeddingProcessor()
-        embeddings = await embedding_processor.process_chunks(result["chunks"])
-
-        # Store documents with embeddings
-        db.collection.add(
-            documents=result["chunks"],
-            metadatas=metadata,
-            ids=[f"{doc_id}_{i}" for i in range(len(result["chunks"]))],
-            embeddings=embeddings  # Include embeddings
-        )
-        
-        return {
-            "status": "success",
-            "message": "Document processed and stored successfully",
-            "doc_id": doc_id,
-            "metadata": {
-                "filename": file.filename,
-                "chunk_count": len(result["chunks"]),
-                "content_type": file.content_type
-            }
-        }
-    except openai.RateLimitError as e:
-        logger.error(f"OpenAI quota exceeded: {str(e)}")
-        raise HTTPException(
-            status_code=429,
-            detail="OpenAI quota exceeded, please check your plan and billing details."
-        )
+        logger.info(f"Queueing file: {file.filename}")
+        job = await ingestion_queue.submit(file, doc_id=doc_id)
+        return _ingest_response(job)
+    except ValueError as e:
+        logger.error(f"Validation error: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except DocumentBusy as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=409, detail=str(e))
+    except IngestionQueueFull as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=503, detail="Too many documents are being processed, please retry later.")
     except Exception as e:
-        logger.error(f"Error processing document: {str(e)}")
+        logger.error(f"Error queueing document: {str(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
         raise HTTPException(
             status_code=500,
             detail=f"Error processing document: {str(e)}"
         )
 
+def _ingest_response(job: Dict) -> JSONResponse:
+    """The /ingest response for a queued job or a duplicate upload."""
+    duplicate = job["duplicate"]
+    return JSONResponse(status_code=200 if duplicate else 202, content={
+        "status": "duplicate" if duplicate else "queued",
+        "message": "An identical document was already ingested" if duplicate else "Document accepted for processing",
+        "job_id": job["job_id"],
+        "doc_id": job["doc_id"],
+        "metadata": {
+            "filename": job["filename"],
+            "content_type": job["content_type"]
+        }
+    })
+
+@router.post("/uploads", status_code=201)
+async def create_upload(
+    upload: UploadRequest,
+    document_loader: DocumentLoader = Depends(get_document_loader),
+    upload_store: UploadStore = Depends(get_upload_store)
+):
+    """
+    Start a resumable upload of a large document.
+
+    Send the file as byte ranges with PUT /uploads/{upload_id} and a
+    Content-Range header (any order, parts may be retried), then finalize it
+    with POST /uploads/{upload_id}/complete. GET /uploads/{upload_id} lists the
+    missing ranges after a dropped connection.
+    """
+    try:
+        document_loader.validate(upload.filename, upload.content_type)
+        return await run_in_threadpool(upload_store.create, upload.filename, upload.content_type, upload.size,
+                                       sha256=upload.sha256, doc_id=upload.doc_id)
+    except ValueError as e:
+        logger.error(f"Validation error: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str, upload_store: UploadStore = Depends(get_upload_store)):
+    """Get the received and missing byte ranges of an upload."""
+    try:
+        return await run_in_threadpool(upload_store.get, upload_id)
+    except UploadNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.put("/uploads/{upload_id}")
+async def upload_part(
+    upload_id: str,
+    request: Request,
+    content_range: str = Header(..., description="bytes <start>-<end inclusive>/<size>"),
+    upload_store: UploadStore = Depends(get_upload_store)
+):
+    """
+    Write one byte range of an upload; the body is written to disk as it arrives.
+    """
+    try:
+        start, end, size = parse_content_range(content_range)
+        upload = await run_in_threadpool(upload_store.get, upload_id)
+        if size != upload["size"] or end > size:
+            raise HTTPException(status_code=416, detail=f"Range {content_range} does not fit an upload of "
+                                                        f"{upload['size']} bytes")
+        return await upload_store.write_part(upload_id, start, end, request.stream())
+    except UploadNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        logger.error(f"Invalid part of upload {upload_id}: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/uploads/{upload_id}/complete", status_code=202)
+async def complete_upload(
+    upload_id: str,
+    upload_store: UploadStore = Depends(get_upload_store),
+    ingestion_queue: IngestionQueue = Depends(get_ingestion_queue)
+):
+    """
+    Verify a fully received upload and queue it for ingestion.
+
+    Responds like /ingest. When the queue is full or the document is busy the
+    upload is kept, so the call can be retried.
+    """
+    try:
+        upload, fingerprint = await run_in_threadpool(upload_store.verify, upload_id)
+        job = await ingestion_queue.submit_spooled(
+            upload_store.file_path(upload_id), fingerprint, upload["filename"], upload["content_type"],
+            doc_id=upload["doc_id"]
+        )
+        await run_in_threadpool(upload_store.delete, upload_id)
+        return _ingest_response(job)
+    except UploadNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except UploadIncomplete as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except FileNotFoundError:
+        # A concurrent request moved the file to the ingestion queue first
+        raise HTTPException(status_code=409, detail=f"Upload {upload_id} is already being completed")
+    except ChecksumMismatch as e:
+        logger.error(str(e))
+        await run_in_threadpool(upload_store.delete, upload_id)
+        raise HTTPException(status_code=422, detail=str(e))
+    except ValueError as e:
+        logger.error(f"Validation error: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except DocumentBusy as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=409, detail=str(e))
+    except IngestionQueueFull as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=503, detail="Too many documents are being processed, please retry later.")
+
+@router.delete("/uploads/{upload_id}", status_code=204)
+async def abort_upload(upload_id: str, upload_store: UploadStore = Depends(get_upload_store)):
+    """Abandon an upload and delete its received bytes."""
+    try:
+        await run_in_threadpool(upload_store.get, upload_id)
+    except UploadNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    await run_in_threadpool(upload_store.delete, upload_id)
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, job_store: JobStore = Depends(get_job_store)):
+    """
+    Get the status and stage-level progress of an ingestion job.
+    """
+    job = await run_in_threadpool(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    job.pop("owner", None)
+    return job
+
 @router.post("/query", response_model=Response)
-async def query_document(query_data: QueryRequest):
+async def query_document(
+    query_data: QueryRequest,
+    pipeline: QueryPipeline = Depends(get_query_pipeline)
+):
     """
     Endpoint to query the stored documents and get relevant answers.
     """
@@ -108,59 +259,127 @@ async def query_document(query_data: QueryRequest):
         if not query_data.text or not query_data.text.strip():
             logger.error("Query text cannot be empty")
             raise HTTPException(status_code=400, detail="Query text cannot be empty")
-            
-        # Initialize processors
-        embedding_processor = EmbeddingProcessor()
-        db = DBConnector()
-
-        # Process query
-        query_embedding = await embedding_processor.process_query(query_data.text)
-        
-        # Validate documents
-        documents = await db.query_documents(
-            query_embedding=query_embedding,
-            collection_id=query_data.context_id
-        )
-        if not documents:
+
+        # Embed the question and retrieve its context once
+        retrieval = await pipeline.retrieve(query_data.text, query_data.context_id)
+        if not retrieval.documents:
             logger.error(f"No documents found for this context_id: {query_data.context_id}")
             raise HTTPException(status_code=400, detail="No documents found for this context_id")
-        if len(documents) < 2:  # Minimum context chunks
-            logger.error(f"Insufficient context for answering with {len(documents)} documents")
-            raise HTTPException(status_code=400, detail="Insufficient context for answering")
-        
-        # Create vector store connection
-        vector_store = Chroma(
-            client=db.client,
-            collection_name=query_data.context_id,
-            embedding_function=db.embeddings
-        )
 
-        # Create RAG chain
-        qa_chain = RetrievalQA.from_chain_type(
-            llm=ChatOpenAI(model="gpt-3.5-turbo", temperature=0),
-            chain_type="stuff",
-            retriever=vector_store.as_retriever(search_kwargs={"k": 3}),
-            return_source_documents=True
-        )
-        
-        result = qa_chain.invoke({"query": query_data.text})
-        
+        # Answer from exactly the retrieved chunks
+        answer = await pipeline.answer(query_data.text, retrieval)
+
         return {
-            "answer": result["result"],
-            "sources": [
-                {
-                    "doc": doc.metadata.get("doc_id", ""),
-                    "page": doc.metadata.get("page", 0),
-                    "text": doc.page_content  # Add the text field from the source document
-                }
-                for doc in result["source_documents"]
-            ]
+            "answer": answer,
+            "sources": retrieval.sources()
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Query error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/query/batch", response_model=BatchQueryResponse)
+async def query_batch(
+    batch: BatchQueryRequest,
+    pipeline: QueryPipeline = Depends(get_query_pipeline)
+):
+    """
+    Endpoint to answer many questions, over one or more documents, in one request.
+
+    The questions are embedded in one batched call and searched with one call per
+    document, then answered concurrently (BATCH_ANSWER_CONCURRENCY). Results are
+    returned in request order; a question that fails gets an `error` instead of
+    an answer without failing the rest of the batch.
+    """
+    if len(batch.queries) > BATCH_QUERY_MAX_SIZE:
+        raise HTTPException(status_code=400,
+                            detail=f"A batch holds at most {BATCH_QUERY_MAX_SIZE} queries")
+    logger.info(f"Received batch of {len(batch.queries)} queries over "
+                f"{len({query.context_id for query in batch.queries})} documents")
+
+    results: List[Dict] = [{} for _ in batch.queries]
+    valid = []
+    for i, query in enumerate(batch.queries):
+        if query.text.strip():
+            valid.append(i)
+        else:
+            results[i] = {"error": "Query text cannot be empty"}
+
+    retrievals = await pipeline.retrieve_batch(
+        [(batch.queries[i].text, batch.queries[i].context_id) for i in valid]
+    )
+    answerable = []
+    for i, retrieval in zip(valid, retrievals):
+        if isinstance(retrieval, Exception):
+            results[i] = {"error": str(retrieval)}
+        elif not retrieval.documents:
+            results[i] = {"error": "No documents found for this context_id"}
+        else:
+            answerable.append((i, retrieval))
+
+    answers = await pipeline.answer_batch(
+        [(batch.queries[i].text, retrieval) for i, retrieval in answerable]
+    )
+    for (i, retrieval), answer in zip(answerable, answers):
+        if isinstance(answer, Exception):
+            results[i] = {"error": str(answer), "sources": retrieval.sources()}
+        else:
+            results[i] = {"answer": answer, "sources": retrieval.sources()}
+
+    failed = sum(1 for result in results if result.get("error"))
+    if failed:
+        logger.error(f"{failed} of {len(results)} batch queries failed")
+    return {"results": results}
+
+def _sse_event(event: str, data: Dict) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/query/stream")
+async def stream_query(
+    query_data: QueryRequest,
+    pipeline: QueryPipeline = Depends(get_query_pipeline)
+):
+    """
+    Endpoint to query a document and stream the answer as server-sent events.
+
+    Emits a `sources` event with the retrieved chunks first, then one `token`
+    event per LLM token, and finally `done` (or `error` if generation fails).
+    """
+    logger.info(f"Received streaming query request: {query_data}")
+
+    if not query_data.text or not query_data.text.strip():
+        logger.error("Query text cannot be empty")
+        raise HTTPException(status_code=400, detail="Query text cannot be empty")
+
+    try:
+        retrieval = await pipeline.retrieve(query_data.text, query_data.context_id)
+    except Exception as e:
+        logger.error(f"Query error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if not retrieval.documents:
+        logger.error(f"No documents found for this context_id: {query_data.context_id}")
+        raise HTTPException(status_code=400, detail="No documents found for this context_id")
+
+    async def event_stream():
+        yield _sse_event("sources", {"sources": retrieval.sources()})
+        try:
+            async for token in pipeline.stream_answer(query_data.text, retrieval):
+                yield _sse_event("token", {"text": token})
+        except Exception as e:
+            logger.error(f"Streaming query error: {str(e)}")
+            yield _sse_event("error", {"detail": str(e)})
+            return
+        yield _sse_event("done", {})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/health")
 async def health_check():
     """
@@ -168,18 +387,139 @@ async def health_check():
     """
     return {"status": "healthy"}
 
-# backend/app/api/routes.py
+@router.get("/health/ready")
+async def readiness_check(db: DBConnector = Depends(get_db_connector)):
+    """
+    Readiness check: 503 while the vector store, e.g. a remote Chroma server, does not answer.
+    """
+    try:
+        await run_in_threadpool(db.heartbeat)
+    except Exception as e:
+        logger.error(f"Vector store unavailable: {str(e)}")
+        raise HTTPException(status_code=503, detail=f"Vector store unavailable: {str(e)}")
+    return {"status": "ready"}
+
+@router.get("/embeddings/cache")
+async def get_embedding_cache_stats(
+    embedding_processor: EmbeddingProcessor = Depends(get_embedding_processor)
+):
+    """
+    Hit/miss counters and sizes of the embedding cache.
+    """
+    if embedding_processor.cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **embedding_processor.cache.stats()}
+
+@router.get("/answers/cache")
+async def get_answer_cache_stats(answer_cache: Optional[AnswerCache] = Depends(get_answer_cache)):
+    """
+    Hit/miss counters per tier and size of the answer cache.
+    """
+    if answer_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **answer_cache.stats()}
+
 @router.get("/documents/{doc_id}")
-async def get_document_status(doc_id: str):
+async def get_document_status(
+    doc_id: str,
+    db: DBConnector = Depends(get_db_connector),
+    job_store: JobStore = Depends(get_job_store)
+):
     """
-    Get document status and metadata from Chroma using the DBConnector.
+    Get document status and metadata from the ingestion job and Chroma.
+
+    While a version is being ingested the status is "processing". When the
+    latest version failed but an earlier one was ingested, the document is
+    reported ready with that earlier version and the failure under
+    `failed_revision`.
     """
+    job = await run_in_threadpool(job_store.latest_for_document, doc_id)
+    failed_revision = None
+    if job is not None and job["status"] == "failed":
+        current = await run_in_threadpool(job_store.current_for_document, doc_id)
+        if current is not None and current["status"] == "completed":
+            failed_revision = {key: job[key] for key in ("job_id", "filename", "stage", "error")}
+            failed_revision["failed_at"] = datetime.fromtimestamp(job["updated_at"], timezone.utc).isoformat()
+            job = current
+    if job is not None and job["status"] != "completed":
+        return {
+            "status": "processing" if job["status"] in ("queued", "running") else job["status"],
+            "doc_id": doc_id,
+            "job_id": job["job_id"],
+            "stage": job["stage"],
+            "error": job["error"]
+        }
+
     try:
-        # Initialize DBConnector with the document-specific collection name
-        db = DBConnector(collection_name=doc_id)
-        collection = db.get_collection(doc_id)  # Remove 'await'
-        logger.info(f"Fetching document with doc_id: {doc_id} using {collection}")
-        return {"status": "success"}
+        chunk_count = await run_in_threadpool(db.count_document_chunks, doc_id)
     except Exception as e:
         logger.error(f"Error getting document status: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    if chunk_count == 0:
+        raise HTTPException(status_code=404, detail=f"Document not found: {doc_id}")
+
+    logger.info(f"Fetched document {doc_id} with {chunk_count} chunks")
+    status = {
+        "status": "success",
+        "doc_id": doc_id,
+        "job_id": job["job_id"] if job else None,
+        "filename": job["filename"] if job else None,
+        "total_pages": job["pages_parsed"] if job else None,
+        "total_chunks": chunk_count,
+        "chunk_count": chunk_count,
+        "processed_at": datetime.fromtimestamp(job["updated_at"], timezone.utc).isoformat() if job else None
+    }
+    if failed_revision is not None:
+        status["failed_revision"] = failed_revision
+    return status
+
+@router.delete("/documents/{doc_id}")
+async def delete_document(
+    doc_id: str,
+    db: DBConnector = Depends(get_db_connector),
+    keyword_index: KeywordIndex = Depends(get_keyword_index),
+    answer_cache: Optional[AnswerCache] = Depends(get_answer_cache)
+):
+    """
+    Delete the chunks of one document, and its cached answers, leaving every other document untouched.
+    """
+    try:
+        await run_in_threadpool(keyword_index.delete_document, doc_id)
+        deleted = await run_in_threadpool(db.delete_document, doc_id)
+        if answer_cache is not None:
+            await run_in_threadpool(answer_cache.invalidate, doc_id, retrieval=True)
+    except Exception as e:
+        logger.error(f"Error deleting document: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if deleted == 0:
+        raise HTTPException(status_code=404, detail=f"Document not found: {doc_id}")
+    return {"status": "success", "doc_id": doc_id, "deleted_chunks": deleted}
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Allow only callers presenting PROFILING_TOKEN; the debug routes are off when it is unset."""
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@router.get("/debug/slow-requests", dependencies=[Depends(require_admin)])
+async def get_slow_requests():
+    """
+    The slowest recent requests and ingestion jobs with their per-stage timings.
+    """
+    return {"entries": slow_requests.entries()}
+
+@router.get("/debug/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """
+    Stored request profiles, newest first.
+    """
+    return {"profiles": profile_store.list()}
+
+@router.get("/debug/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str):
+    """
+    One request profile as collapsed stacks, ready for flamegraph.pl or speedscope.
+    """
+    collapsed = profile_store.read(profile_id)
+    if collapsed is None:
+        raise HTTPException(status_code=404, detail=f"Profile not found: {profile_id}")
+    return PlainTextResponse(collapsed)
@@ -0,0 +1,269 @@
+from typing import Any, Dict, Optional
+from app.core.metrics import ANSWER_CACHE_LOOKUPS
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+# Tier of an entry: "exact" answers a (document, normalized question) pair without
+# retrieval, "retrieval" answers a question over one exact prompt context
+TIERS = ("exact", "retrieval")
+
+_WHITESPACE = re.compile(r"\s+")
+_WORD = re.compile(r"\w+")
+# Words dropped from the question in retrieval-tier keys; none of them changes what is asked
+_FILLER = frozenset("a an the please can could would you tell me about".split())
+
+
+def normalize_question(text: str) -> str:
+    """Case, Unicode form, whitespace and trailing punctuation do not change a question."""
+    text = _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text).casefold()).strip()
+    return text.rstrip("?!. ")
+
+
+def question_terms(text: str) -> str:
+    """
+    The words of a question without punctuation and filler, in order, so
+    "Can you tell me the notice period?" and "notice period" match once they
+    retrieved the same context.
+    """
+    return " ".join(word for word in _WORD.findall(normalize_question(text)) if word not in _FILLER)
+
+
+class AnswerCache:
+    """
+    Cache of generated answers, in two tiers.
+
+    The exact tier maps a document and a normalized question to the answer and
+    the chunks it was based on, so a repeated question skips embedding,
+    retrieval and the LLM. The retrieval tier maps the prompt context (the
+    ordered retrieved chunks) and the question's terms to the answer, so a
+    rephrased question that retrieves the same chunks still skips the LLM.
+    Callers build the keys with ``make_key``, including the model and prompt
+    version, which namespace both tiers.
+
+    Entries live in SQLite, shared by every worker of the host, expire after
+    ``ttl_s`` and are evicted least recently used beyond ``max_entries``. A hit
+    only records its last-used time in memory; pending times are written with
+    the next ``put``, ``invalidate`` or eviction, or once ``TOUCH_BATCH`` are
+    pending, so lookups do not serialize on disk writes.
+
+    Each document has a generation that ``invalidate`` bumps when its chunks
+    change. Callers read it before retrieving and pass it to ``put``, which
+    drops the answer if the document changed in the meantime, so an answer
+    computed from an old version is never stored under the new one.
+    """
+
+    # Pending last-used updates written in one go
+    TOUCH_BATCH = 1000
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 ttl_s: Optional[float] = None,
+                 max_entries: Optional[int] = None):
+        """
+        Args:
+            path: SQLite file, defaults to ANSWER_CACHE_PATH
+            ttl_s: Age after which an answer is recomputed, defaults to ANSWER_CACHE_TTL_SECONDS
+            max_entries: Maximum answers kept, defaults to ANSWER_CACHE_MAX_ENTRIES
+        """
+        self.path = path or os.getenv("ANSWER_CACHE_PATH", "./answer_cache.sqlite3")
+        self.ttl_s = ttl_s or float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+        self.max_entries = max_entries or int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "10000"))
+
+        self._lock = threading.Lock()
+        self.hits = {tier: 0 for tier in TIERS}
+        self.misses = {tier: 0 for tier in TIERS}
+        self._touched: Dict[str, float] = {}
+
+        try:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                " key TEXT PRIMARY KEY,"
+                " tier TEXT NOT NULL,"
+                " doc_id TEXT NOT NULL,"
+                " answer TEXT NOT NULL,"
+                " retrieval TEXT,"
+                " created_at REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_doc_id ON answers(doc_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_last_used ON answers(last_used)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS generations ("
+                " doc_id TEXT PRIMARY KEY,"
+                " generation INTEGER NOT NULL)"
+            )
+            self._conn.commit()
+            self._entries = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+            logger.info(f"Opened answer cache at {self.path} with {self._entries} entries")
+        except Exception as e:
+            logger.error(f"Error opening answer cache: {str(e)}")
+            raise
+
+    @staticmethod
+    def make_key(tier: str, *parts: str) -> str:
+        """Hash the parts identifying an answer into a key of the given tier."""
+        digest = hashlib.sha256(tier.encode("utf-8"))
+        for part in parts:
+            digest.update(b"\x00" + part.encode("utf-8"))
+        return f"{tier}:{digest.hexdigest()}"
+
+    def generation(self, doc_id: str) -> int:
+        """Current generation of a document; 0 until it is first invalidated."""
+        with self._lock:
+            row = self._conn.execute("SELECT generation FROM generations WHERE doc_id = ?", (doc_id,)).fetchone()
+        return row[0] if row else 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """The fresh entry for a key as {"answer", "retrieval"}, or None."""
+        tier = key.split(":", 1)[0]
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer, retrieval FROM answers WHERE key = ? AND created_at >= ?", (key, now - self.ttl_s)
+            ).fetchone()
+            if row is None:
+                self.misses[tier] += 1
+            else:
+                self.hits[tier] += 1
+                self._touched[key] = now
+                if len(self._touched) >= self.TOUCH_BATCH:
+                    try:
+                        self._flush_touched()
+                        self._conn.commit()
+                    except Exception as e:
+                        logger.error(f"Error writing to answer cache: {str(e)}")
+        ANSWER_CACHE_LOOKUPS.labels(tier, "miss" if row is None else "hit").inc()
+        if row is None:
+            return None
+        return {"answer": row[0], "retrieval": json.loads(row[1]) if row[1] else None}
+
+    def put(self,
+            key: str,
+            doc_id: str,
+            generation: int,
+            answer: str,
+            retrieval: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Store an answer unless the document's generation moved past ``generation``.
+
+        Returns whether it was stored. A failed write is logged and never fails
+        the query that produced the answer.
+        """
+        tier = key.split(":", 1)[0]
+        now = time.time()
+        with self._lock:
+            try:
+                # One statement, so an invalidation by another worker cannot slip in between
+                cursor = self._conn.execute(
+                    "INSERT OR REPLACE INTO answers (key, tier, doc_id, answer, retrieval, created_at, last_used)"
+                    " SELECT ?, ?, ?, ?, ?, ?, ?"
+                    " WHERE COALESCE((SELECT generation FROM generations WHERE doc_id = ?), 0) = ?",
+                    (key, tier, doc_id, answer, json.dumps(retrieval) if retrieval is not None else None,
+                     now, now, doc_id, generation)
+                )
+                self._flush_touched()
+                self._conn.commit()
+                if cursor.rowcount <= 0:
+                    logger.debug(f"Not caching answer for {doc_id}, which changed while it was generated")
+                    return False
+                self._entries += 1
+                if self._entries > self.max_entries:
+                    self._evict()
+                return True
+            except Exception as e:
+                logger.error(f"Error writing to answer cache: {str(e)}")
+                return False
+
+    def invalidate(self, doc_id: str, retrieval: bool = False) -> int:
+        """
+        Drop the cached answers of a document whose chunks changed.
+
+        Exact-tier answers are always dropped. Retrieval-tier answers are keyed
+        on the chunks themselves, and chunk ids derive from their text, so they
+        stay correct across versions of a document; pass ``retrieval=True`` to
+        drop them too, e.g. when the document is deleted.
+        """
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT INTO generations (doc_id, generation) VALUES (?, 1)"
+                    " ON CONFLICT(doc_id) DO UPDATE SET generation = generation + 1",
+                    (doc_id,)
+                )
+                tiers = TIERS if retrieval else ("exact",)
+                cursor = self._conn.execute(
+                    f"DELETE FROM answers WHERE doc_id = ? AND tier IN ({','.join('?' * len(tiers))})",
+                    (doc_id, *tiers)
+                )
+                self._flush_touched()
+                self._conn.commit()
+            except Exception as e:
+                logger.error(f"Error invalidating cached answers of {doc_id}: {str(e)}")
+                raise
+            deleted = max(cursor.rowcount, 0)
+            self._entries = max(self._entries - deleted, 0)
+        if deleted:
+            logger.info(f"Invalidated {deleted} cached answers of {doc_id}")
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters per tier and the current size."""
+        with self._lock:
+            return {
+                **{
+                    tier: {
+                        "hits": self.hits[tier],
+                        "misses": self.misses[tier],
+                        "hit_rate": (self.hits[tier] / (self.hits[tier] + self.misses[tier])
+                                     if self.hits[tier] + self.misses[tier] else 0.0),
+                    }
+                    for tier in TIERS
+                },
+                "entries": self._entries,
+            }
+
+    def close(self):
+        with self._lock:
+            try:
+                self._flush_touched()
+                self._conn.commit()
+            except Exception as e:
+                logger.error(f"Error writing to answer cache: {str(e)}")
+            self._conn.close()
+
+    def _flush_touched(self):
+        """Write the pending last-used times of hits; the caller commits."""
+        if self._touched:
+            touched, self._touched = self._touched, {}
+            self._conn.executemany(
+                "UPDATE answers SET last_used = ? WHERE key = ?",
+                [(last_used, key) for key, last_used in touched.items()]
+            )
+
+    def _evict(self):
+        """Delete expired answers, then the least recently used beyond max_entries."""
+        self._conn.execute("DELETE FROM answers WHERE created_at < ?", (time.time() - self.ttl_s,))
+        # Other workers write to the same file, so recount rather than trust our tally
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        overflow = self._entries - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM answers WHERE key IN "
+                "(SELECT key FROM answers ORDER BY last_used ASC LIMIT ?)",
+                (overflow,)
+            )
+            self._entries -= overflow
+            logger.info(f"Evicted {overflow} entries from answer cache")
+        self._conn.commit()
@@ -0,0 +1,286 @@
+from typing import Any, Dict, List, Optional
+from app.core.metrics import VECTOR_STORE_RETRIES
+import logging
+import os
+import random
+import time
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TENANT = "default_tenant"
+DEFAULT_DATABASE = "default_database"
+
+
+class ChromaServerError(Exception):
+    """Raised when the Chroma server rejects a request."""
+
+
+class RetryTransport(httpx.BaseTransport):
+    """
+    httpx transport that retries requests the Chroma server did not answer.
+
+    A connection that could not be opened (refused, or a connect timeout) never
+    reached the server, so those requests are always retried. A connection the
+    server dropped mid-request, or a 502/503/504 from a restarting server or a
+    proxy in front of it, may come after the server acted on the request, so
+    those are only retried for idempotent requests: GET, HEAD, OPTIONS, PUT and
+    DELETE, or any request sent with the "idempotent" extension. Read timeouts
+    are never retried: the server may still be working on the request. Retries
+    back off exponentially with jitter.
+    """
+
+    RETRY_STATUSES = frozenset({502, 503, 504})
+    CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+    IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+    def __init__(self, transport: httpx.BaseTransport, retries: int, backoff_s: float):
+        self._transport = transport
+        self.retries = retries
+        self.backoff_s = backoff_s
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        idempotent = request.method in self.IDEMPOTENT_METHODS or request.extensions.get("idempotent", False)
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            try:
+                response = self._transport.handle_request(request)
+            except self.CONNECT_ERRORS as e:
+                if last:
+                    raise
+                reason = type(e).__name__
+            except httpx.RemoteProtocolError as e:
+                if last or not idempotent:
+                    raise
+                reason = type(e).__name__
+            else:
+                if last or not idempotent or response.status_code not in self.RETRY_STATUSES:
+                    return response
+                response.close()
+                reason = str(response.status_code)
+            VECTOR_STORE_RETRIES.labels(reason).inc()
+            delay = self.backoff_s * 2 ** attempt * (0.5 + random.random())
+            logger.warning(f"Chroma request {request.method} {request.url.path} failed ({reason}), "
+                           f"retrying in {delay:.2f}s ({attempt + 1}/{self.retries})")
+            time.sleep(delay)
+
+    def close(self):
+        self._transport.close()
+
+
+def create_session(headers: Optional[Dict[str, str]] = None,
+                   ssl_verify: bool = True,
+                   pool_size: Optional[int] = None,
+                   timeout_s: Optional[float] = None,
+                   connect_timeout_s: Optional[float] = None,
+                   retries: Optional[int] = None,
+                   backoff_s: Optional[float] = None) -> httpx.Client:
+    """
+    Keep-alive httpx client with a bounded connection pool, timeouts and retries.
+
+    Args:
+        pool_size: Connections kept open to the server, defaults to CHROMA_POOL_SIZE
+        timeout_s: Read and write timeout of a request, defaults to CHROMA_TIMEOUT_SECONDS
+        connect_timeout_s: Timeout of opening a connection, defaults to CHROMA_CONNECT_TIMEOUT_SECONDS
+        retries: Retries of a request the server did not answer, defaults to CHROMA_MAX_RETRIES
+        backoff_s: Base delay between retries, defaults to CHROMA_RETRY_BACKOFF_SECONDS
+    """
+    pool_size = pool_size or int(os.getenv("CHROMA_POOL_SIZE", "20"))
+    timeout_s = timeout_s or float(os.getenv("CHROMA_TIMEOUT_SECONDS", "30"))
+    connect_timeout_s = connect_timeout_s or float(os.getenv("CHROMA_CONNECT_TIMEOUT_SECONDS", "3"))
+    retries = retries if retries is not None else int(os.getenv("CHROMA_MAX_RETRIES", "3"))
+    backoff_s = backoff_s if backoff_s is not None else float(os.getenv("CHROMA_RETRY_BACKOFF_SECONDS", "0.25"))
+    limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+    return httpx.Client(
+        # A client given a transport ignores its own limits and verify, so the transport gets them
+        transport=RetryTransport(httpx.HTTPTransport(limits=limits, verify=ssl_verify), retries, backoff_s),
+        timeout=httpx.Timeout(timeout_s, connect=connect_timeout_s),
+        headers=headers
+    )
+
+
+def wait_for_server(session: httpx.Client, url: str, timeout_s: float):
+    """Poll the heartbeat of the server at url until it answers, for at most timeout_s seconds."""
+    deadline = time.monotonic() + timeout_s
+    delay = 0.5
+    while True:
+        try:
+            session.get(f"{url}/api/v2/heartbeat").raise_for_status()
+            return
+        except httpx.HTTPError as e:
+            if time.monotonic() + delay > deadline:
+                raise ConnectionError(f"Chroma server at {url} is not reachable: {str(e)}") from e
+            logger.warning(f"Waiting for the Chroma server at {url}: {str(e)}")
+            time.sleep(delay)
+            delay = min(delay * 2, 5.0)
+
+
+def _as_lists(embeddings: Optional[List[Any]]) -> Optional[List[List[float]]]:
+    # Embeddings read back from a store may be NumPy arrays, which JSON cannot encode
+    if embeddings is None:
+        return None
+    return [embedding.tolist() if hasattr(embedding, "tolist") else embedding for embedding in embeddings]
+
+
+class ChromaHttpCollection:
+    """A collection on a Chroma server, with the subset of the chromadb Collection API DBConnector uses."""
+
+    def __init__(self, client: "ChromaHttpClient", model: Dict[str, Any]):
+        self._client = client
+        self.id = model["id"]
+        self.name = model["name"]
+        self.metadata = model.get("metadata")
+        self._path = f"/collections/{self.id}"
+
+    def _post(self, action: str, payload: Dict[str, Any]) -> Any:
+        # Every operation is a read or a write by id, so a repeated one has the same effect
+        return self._client.request("POST", f"{self._path}/{action}", json=payload, idempotent=True)
+
+    def count(self) -> int:
+        return self._client.request("GET", f"{self._path}/count")
+
+    def add(self, ids: List[str], embeddings: List[List[float]],
+            documents: Optional[List[str]] = None, metadatas: Optional[List[Dict[str, Any]]] = None):
+        # Not idempotent: a repeated add fails on the ids the first one stored
+        self._client.request("POST", f"{self._path}/add", json={
+            "ids": ids, "embeddings": _as_lists(embeddings), "documents": documents, "metadatas": metadatas,
+            "uris": None
+        })
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]],
+               documents: Optional[List[str]] = None, metadatas: Optional[List[Dict[str, Any]]] = None):
+        self._post("upsert", {
+            "ids": ids, "embeddings": _as_lists(embeddings), "documents": documents, "metadatas": metadatas,
+            "uris": None
+        })
+
+    def update(self, ids: List[str], embeddings: Optional[List[List[float]]] = None,
+               documents: Optional[List[str]] = None, metadatas: Optional[List[Dict[str, Any]]] = None):
+        """Update existing records; metadata keys are merged into the stored metadata."""
+        self._post("update", {
+            "ids": ids, "embeddings": _as_lists(embeddings), "documents": documents, "metadatas": metadatas,
+            "uris": None
+        })
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None):
+        self._post("delete", {"ids": ids, "where": where, "where_document": None})
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None,
+            include: Optional[List[str]] = None) -> Dict[str, Any]:
+        return self._post("get", {
+            "ids": ids, "where": where, "limit": limit, "offset": offset, "where_document": None,
+            "include": include if include is not None else ["metadatas", "documents"]
+        })
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 10,
+              where: Optional[Dict[str, Any]] = None, include: Optional[List[str]] = None) -> Dict[str, Any]:
+        return self._post("query", {
+            "query_embeddings": _as_lists(query_embeddings), "n_results": n_results, "where": where,
+            "where_document": None,
+            "include": include if include is not None else ["metadatas", "documents", "distances"]
+        })
+
+
+class ChromaHttpClient:
+    """
+    Client of a Chroma server speaking its REST API over one pooled session.
+
+    Exposes the client and collection API DBConnector uses, so it can be passed
+    wherever a chromadb client is expected. chromadb's own HttpClient opens a
+    session without timeouts, pool limits or retries and offers no way to pass
+    one in, so the requests are made here on the session from create_session.
+    """
+
+    def __init__(self, session: httpx.Client, url: str,
+                 tenant: str = DEFAULT_TENANT, database: str = DEFAULT_DATABASE):
+        self.session = session
+        self.url = url
+        self._base = f"{url}/api/v2/tenants/{tenant}/databases/{database}"
+        self._max_batch_size: Optional[int] = None
+
+    def request(self, method: str, path: str, json: Any = None, idempotent: bool = False,
+                prefix: Optional[str] = None) -> Any:
+        """Send a request relative to the database (or prefix) and return its decoded JSON body."""
+        response = self.session.request(
+            method, (self._base if prefix is None else prefix) + path, json=json,
+            extensions={"idempotent": True} if idempotent else None
+        )
+        if response.is_error:
+            try:
+                body = response.json()
+                message = f"{body.get('error', response.status_code)}: {body.get('message', response.text)}"
+            except ValueError:
+                message = f"{response.status_code}: {response.text}"
+            raise ChromaServerError(f"Chroma {method} {path} failed with {message}")
+        return response.json()
+
+    def heartbeat(self) -> int:
+        return self.request("GET", "/heartbeat", prefix=f"{self.url}/api/v2")["nanosecond heartbeat"]
+
+    def get_max_batch_size(self) -> int:
+        """Most records the server accepts in one write."""
+        if self._max_batch_size is None:
+            checks = self.request("GET", "/pre-flight-checks", prefix=f"{self.url}/api/v2")
+            self._max_batch_size = int(checks["max_batch_size"])
+        return self._max_batch_size
+
+    def list_collections(self) -> List[str]:
+        """Names of the collections, as chromadb 0.6 returns them."""
+        return [model["name"] for model in self.request("GET", "/collections")]
+
+    def get_collection(self, name: str) -> ChromaHttpCollection:
+        return ChromaHttpCollection(self, self.request("GET", f"/collections/{name}"))
+
+    def create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> ChromaHttpCollection:
+        model = self.request("POST", "/collections", json={
+            "name": name, "metadata": metadata, "configuration": None, "get_or_create": False
+        })
+        return ChromaHttpCollection(self, model)
+
+    def get_or_create_collection(self, name: str,
+                                 metadata: Optional[Dict[str, Any]] = None) -> ChromaHttpCollection:
+        model = self.request("POST", "/collections", json={
+            "name": name, "metadata": metadata, "configuration": None, "get_or_create": True
+        }, idempotent=True)
+        return ChromaHttpCollection(self, model)
+
+    def delete_collection(self, name: str):
+        self.request("DELETE", f"/collections/{name}")
+
+    def close(self):
+        """Close the pooled session."""
+        self.session.close()
+
+
+def create_http_client(host: Optional[str] = None,
+                       port: Optional[int] = None,
+                       startup_timeout_s: Optional[float] = None) -> ChromaHttpClient:
+    """
+    Connect to a Chroma server (CHROMA_HOST, CHROMA_PORT) over a pooled session.
+
+    Waits up to CHROMA_STARTUP_TIMEOUT_SECONDS for the server, so workers may start before it.
+
+    Args:
+        host: Server host name, defaults to CHROMA_HOST
+        port: Server port, defaults to CHROMA_PORT
+        startup_timeout_s: How long to wait for the server, defaults to CHROMA_STARTUP_TIMEOUT_SECONDS
+    """
+    host = host or os.getenv("CHROMA_HOST", "localhost")
+    port = port or int(os.getenv("CHROMA_PORT", "8000"))
+    ssl = os.getenv("CHROMA_SSL", "false").lower() == "true"
+    token = os.getenv("CHROMA_AUTH_TOKEN")
+    headers = {"Authorization": f"Bearer {token}"} if token else None
+    startup_timeout_s = startup_timeout_s or float(os.getenv("CHROMA_STARTUP_TIMEOUT_SECONDS", "30"))
+    url = f"{'https' if ssl else 'http'}://{host}:{port}"
+
+    session = create_session(headers=headers)
+    try:
+        wait_for_server(session, url, startup_timeout_s)
+    except Exception as e:
+        session.close()
+        logger.error(f"Error connecting to Chroma server at {url}: {str(e)}")
+        raise
+    logger.info(f"Connected to Chroma server at {url}")
+    return ChromaHttpClient(session, url)
@@ -0,0 +1,117 @@
+from typing import List
+from app.core.answer_cache import AnswerCache
+from app.core.context_builder import ContextBuilder
+from app.core.db_connector import DBConnector, create_vector_client
+from app.core.document_loader import DocumentLoader
+from app.core.embedding_cache import EmbeddingCache
+from app.core.embedding_processor import EmbeddingProcessor
+from app.core.ingestion_queue import IngestionQueue
+from app.core.job_store import JobStore
+from app.core.keyword_index import KeywordDocument, KeywordIndex
+from app.core.providers import create_chat_model, create_embeddings
+from app.core.query_pipeline import QueryPipeline
+from app.core.upload_store import UploadStore
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Components:
+    """
+    Process-wide container for the clients used by the API routes.
+
+    Built once per worker by the application lifespan so that requests reuse a
+    single vector store client, embeddings client and cache of collection handles
+    instead of constructing them on every call.
+    """
+
+    def __init__(self):
+        """Create the shared Chroma and embeddings clients and the components built on them."""
+        try:
+            # OpenAI, or local hashing embeddings when EMBEDDING_PROVIDER=hashing.
+            # Throttled requests are retried by the EmbeddingScheduler
+            self.embeddings = create_embeddings(max_retries=0)
+
+            # Chroma, or the memory-mapped backend when VECTOR_STORE_BACKEND=mmap
+            self.client = create_vector_client()
+
+            self.embedding_cache = EmbeddingCache()
+
+            self.db_connector = DBConnector(client=self.client, embeddings=self.embeddings)
+            self.embedding_processor = EmbeddingProcessor(
+                embeddings=self.embeddings,
+                cache=self.embedding_cache
+            )
+            self.document_loader = DocumentLoader()
+
+            # ANSWER_CACHE=false generates every answer
+            self.answer_cache = AnswerCache() if os.getenv("ANSWER_CACHE", "true").lower() == "true" else None
+
+            self.job_store = JobStore()
+            self.upload_store = UploadStore()
+            self.keyword_index = KeywordIndex()
+            self.ingestion_queue = IngestionQueue(
+                job_store=self.job_store,
+                document_loader=self.document_loader,
+                embedding_processor=self.embedding_processor,
+                db_connector=self.db_connector,
+                keyword_index=self.keyword_index,
+                answer_cache=self.answer_cache
+            )
+
+            # ChatOpenAI, or a local fake chat model when LLM_PROVIDER=fake
+            self.llm = create_chat_model()
+            self.query_pipeline = QueryPipeline(
+                embedding_processor=self.embedding_processor,
+                db_connector=self.db_connector,
+                llm=self.llm,
+                keyword_index=self.keyword_index,
+                # CONTEXT_BUILDER=false stuffs the top 3 chunks verbatim, as before
+                context_builder=(ContextBuilder()
+                                 if os.getenv("CONTEXT_BUILDER", "true").lower() == "true" else None),
+                answer_cache=self.answer_cache
+            )
+            logger.info("Initialized shared application components")
+        except Exception as e:
+            logger.error(f"Error initializing application components: {str(e)}")
+            raise
+
+    def startup(self):
+        """
+        Run one-off checks that previously happened on every request, and
+        migrate documents left in per-document collections by earlier releases.
+
+        The embedding dimension is verified once per worker, so a misconfigured
+        model fails at startup rather than on the first upload.
+        VERIFY_EMBEDDINGS_ON_STARTUP=false skips the provider round trip; chunks
+        with mismatched vectors are still rejected when they are written.
+        """
+        if os.getenv("VERIFY_EMBEDDINGS_ON_STARTUP", "true").lower() == "true":
+            self.db_connector.verify_embedding_dimension()
+        # Documents stored one collection per document by earlier releases move to the shared collection
+        if os.getenv("MIGRATE_LEGACY_COLLECTIONS", "true").lower() == "true":
+            self.db_connector.migrate_legacy_collections(on_document=self._index_migrated_document)
+
+    def _index_migrated_document(self, doc_id: str, chunk_ids: List[str], texts: List[str]):
+        """Add a migrated document to the keyword index, which earlier releases did not have."""
+        keywords = KeywordDocument(doc_id)
+        for chunk_id, text in zip(chunk_ids, texts):
+            keywords.add(chunk_id, text)
+        self.keyword_index.replace_document(keywords)
+
+    def shutdown(self):
+        """Drop cached handles so nothing outlives the worker."""
+        self.db_connector.clear_collection_cache()
+        self.embedding_cache.close()
+        if self.answer_cache is not None:
+            self.answer_cache.close()
+        self.document_loader.close()
+        self.job_store.close()
+        self.upload_store.close()
+        self.keyword_index.close()
+        # The memory-mapped backend flushes its vector files and a Chroma server client closes
+        # its pooled session; the embedded Chroma client has nothing to close
+        if hasattr(self.client, "close"):
+            self.client.close()
+        logger.info("Application components shut down")
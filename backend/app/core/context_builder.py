@@ -0,0 +1,167 @@
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+from app.core.embedding_scheduler import TokenCounter
+from app.core.keyword_index import tokenize
+import functools
+import logging
+import math
+import os
+
+logger = logging.getLogger(__name__)
+
+# Separator between passages in the prompt, as QueryPipeline joins them
+PASSAGE_SEPARATOR = "\n\n"
+
+
+@dataclass
+class Passage:
+    """
+    A contiguous span of a document made of one or more retrieved chunks.
+
+    ``ids`` are the chunks it was built from in document order, ``rank`` is the
+    best retrieval rank among them, and ``metadata`` is the first chunk's
+    metadata with ``char_end`` extended to the end of the span.
+    """
+    ids: List[str]
+    text: str
+    metadata: Dict[str, Any]
+    rank: int
+
+
+def _term_vector(text: str) -> Dict[str, float]:
+    counts = Counter(tokenize(text))
+    norm = math.sqrt(sum(count * count for count in counts.values())) or 1.0
+    return {term: count / norm for term, count in counts.items()}
+
+
+def _cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(term, 0.0) for term, weight in a.items())
+
+
+def merge_passages(ids: Sequence[str],
+                   documents: Sequence[str],
+                   metadatas: Sequence[Dict[str, Any]],
+                   ranks: Sequence[int]) -> List[Passage]:
+    """
+    Merge chunks whose character ranges overlap into single passages.
+
+    Chunks are consecutive windows of one document that share up to
+    chunk_overlap characters, so the text of an overlapping neighbour is
+    appended from the end of the previous chunk on. Chunks without offsets
+    stay passages of their own. Passages come back ordered by rank.
+    """
+    spans = []
+    for chunk_id, text, metadata, rank in zip(ids, documents, metadatas, ranks):
+        metadata = metadata or {}
+        start, end = metadata.get("char_start"), metadata.get("char_end")
+        spans.append((metadata.get("doc_id", ""), start, end, chunk_id, text, metadata, rank))
+
+    passages: List[Passage] = []
+    previous = None
+    for doc_id, start, end, chunk_id, text, metadata, rank in sorted(
+            (span for span in spans if span[1] is not None and span[2] is not None),
+            key=lambda span: (span[0], span[1])):
+        if previous is not None and previous[0] == doc_id and start < previous[1] and end > previous[1]:
+            passage = passages[-1]
+            passage.text += text[previous[1] - start:]
+            passage.ids.append(chunk_id)
+            passage.metadata = {**passage.metadata, "char_end": end}
+            passage.rank = min(passage.rank, rank)
+            previous = (doc_id, end)
+        elif previous is not None and previous[0] == doc_id and end <= previous[1]:
+            # Contained in the passage already, e.g. the same chunk retrieved twice
+            passages[-1].ids.append(chunk_id)
+            passages[-1].rank = min(passages[-1].rank, rank)
+        else:
+            passages.append(Passage(ids=[chunk_id], text=text, metadata=dict(metadata), rank=rank))
+            previous = (doc_id, end)
+    passages.extend(
+        Passage(ids=[chunk_id], text=text, metadata=dict(metadata), rank=rank)
+        for _, start, end, chunk_id, text, metadata, rank in spans if start is None or end is None
+    )
+    return sorted(passages, key=lambda passage: passage.rank)
+
+
+class ContextBuilder:
+    """
+    Assembles the prompt context from a ranked list of retrieved chunks.
+
+    Chunks are picked from the ``candidates`` best by maximal marginal
+    relevance: each step takes the chunk maximizing
+    ``mmr_lambda * relevance - (1 - mmr_lambda) * similarity`` to the chunks
+    already picked, where relevance falls linearly with the retrieval rank and
+    similarity is the cosine of the chunks' keyword-index term vectors (so it
+    works the same in dense, hybrid and keyword retrieval without loading
+    chunk embeddings). Chunks at least ``duplicate_threshold`` similar to a
+    picked one are dropped as near-duplicates. Picked chunks that overlap in
+    the document are merged, and a chunk is only added while the merged
+    passages fit ``token_budget`` tokens; the best chunk is always kept.
+    """
+
+    def __init__(self,
+                 token_budget: Optional[int] = None,
+                 candidates: Optional[int] = None,
+                 mmr_lambda: Optional[float] = None,
+                 duplicate_threshold: Optional[float] = None,
+                 token_counter: Optional[TokenCounter] = None):
+        """
+        Args:
+            token_budget: Tokens of context per prompt, defaults to CONTEXT_TOKEN_BUDGET
+            candidates: Retrieved chunks to choose from, defaults to CONTEXT_CANDIDATES
+            mmr_lambda: Relevance versus diversity trade-off, defaults to CONTEXT_MMR_LAMBDA
+            duplicate_threshold: Similarity above which a chunk is a near-duplicate,
+                defaults to CONTEXT_DUPLICATE_THRESHOLD
+            token_counter: Counter of prompt tokens; shared so its encoding is loaded once
+        """
+        self.token_budget = token_budget or int(os.getenv("CONTEXT_TOKEN_BUDGET", "750"))
+        self.candidates = candidates or int(os.getenv("CONTEXT_CANDIDATES", "10"))
+        self.mmr_lambda = mmr_lambda if mmr_lambda is not None else float(os.getenv("CONTEXT_MMR_LAMBDA", "0.85"))
+        self.duplicate_threshold = duplicate_threshold or float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", "0.9"))
+        self.token_counter = token_counter or TokenCounter()
+        # Popular chunks are counted once, not on every question that retrieves them
+        self.count_tokens = functools.lru_cache(maxsize=4096)(self.token_counter.count)
+        self._separator_tokens = self.token_counter.count(PASSAGE_SEPARATOR)
+
+    def tokens(self, passages: Sequence[Passage]) -> int:
+        """Tokens of the passages joined as they appear in the prompt."""
+        if not passages:
+            return 0
+        return sum(self.count_tokens(passage.text) for passage in passages) \
+            + self._separator_tokens * (len(passages) - 1)
+
+    def build(self,
+              ids: Sequence[str],
+              documents: Sequence[str],
+              metadatas: Sequence[Dict[str, Any]]) -> List[Passage]:
+        """Select, merge and pack ranked chunks into passages ordered by relevance."""
+        n = min(len(ids), self.candidates)
+        if n == 0:
+            return []
+        vectors = [_term_vector(text) for text in documents[:n]]
+        relevance = [1.0 - rank / n for rank in range(n)]
+        # Highest similarity of each remaining chunk to the chunks picked so far
+        redundancy = [0.0] * n
+        remaining = set(range(n))
+        picked: List[int] = []
+        passages: List[Passage] = []
+
+        while remaining:
+            best = max(remaining, key=lambda i: (self.mmr_lambda * relevance[i]
+                                                  - (1 - self.mmr_lambda) * redundancy[i], -i))
+            remaining.discard(best)
+            if picked and redundancy[best] >= self.duplicate_threshold:
+                logger.debug(f"Dropped near-duplicate chunk {ids[best]}")
+                continue
+            candidate = sorted(picked + [best])
+            merged = merge_passages([ids[i] for i in candidate], [documents[i] for i in candidate],
+                                    [metadatas[i] for i in candidate], candidate)
+            if picked and self.tokens(merged) > self.token_budget:
+                continue
+            picked = candidate
+            passages = merged
+            for i in remaining:
+                redundancy[i] = max(redundancy[i], _cosine(vectors[i], vectors[best]))
+        return passages
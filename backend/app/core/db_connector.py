@@ -1,137 +1,367 @@
-from typing import List, Optional
-from langchain.docstore.document import Document
-from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings
-import chromadb
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+from langchain_core.embeddings import Embeddings
+from starlette.concurrency import run_in_threadpool
 import os
 import logging
-from chromadb.config import Settings
-from chromadb.api.models.Collection import Collection
-from chromadb import Client
-from langchain.vectorstores import Chroma as LangChainChroma
-from chromadb.api.types import EmbeddingFunction, Embeddable, DataLoader, Loadable
+import re
+import time
+import zlib
+from app.core.metrics import CHUNKS_WRITTEN, VECTOR_WRITE_SECONDS
+from app.core.providers import create_embeddings
+
+if TYPE_CHECKING:
+    # chromadb takes seconds to import, so it is only loaded when a Chroma client is created
+    from chromadb import Client
+    from chromadb.api.models.Collection import Collection
 
 logger = logging.getLogger(__name__)
 
+# Collections of earlier releases, which stored each document in its own collection
+LEGACY_COLLECTION = re.compile(r"^doc_[0-9a-f]{32}$")
+
+
+def create_vector_client(backend: Optional[str] = None):
+    """
+    Create the vector store client selected by VECTOR_STORE_BACKEND.
+
+    "chroma" (the default) returns an embedded persistent Chroma client, or with
+    CHROMA_MODE=http a client of the Chroma server at CHROMA_HOST:CHROMA_PORT,
+    which every worker and node can share; "mmap" returns an in-process
+    MmapVectorClient storing memory-mapped vector files under VECTOR_STORE_PATH,
+    optionally quantized (VECTOR_STORE_QUANTIZATION). All expose the collection
+    API DBConnector uses.
+    """
+    backend = (backend or os.getenv("VECTOR_STORE_BACKEND", "chroma")).lower()
+    if backend == "mmap":
+        from app.core.mmap_vector_store import MmapVectorClient
+        return MmapVectorClient()
+    if backend != "chroma":
+        raise ValueError(f"Unknown VECTOR_STORE_BACKEND: {backend}")
+    mode = os.getenv("CHROMA_MODE", "embedded").lower()
+    if mode == "http":
+        from app.core.chroma_http import create_http_client
+        return create_http_client()
+    if mode != "embedded":
+        raise ValueError(f"Unknown CHROMA_MODE: {mode}")
+    from chromadb import Client
+    from chromadb.config import Settings
+    return Client(
+        settings=Settings(
+            anonymized_telemetry=False,
+            allow_reset=False,
+            is_persistent=True,
+            chroma_server_api_default_path="/api/v1"
+        )
+    )
+
+
+def _legacy_chunk_index(chunk_id: str, position: int) -> int:
+    """Legacy chunk ids are <doc_id>_<chunk index>; fall back to the position read."""
+    suffix = chunk_id.rsplit("_", 1)[-1]
+    return int(suffix) if suffix.isdigit() else position
+
+
 class DBConnector:
-    def __init__(self, collection_name: str = "docuquery"):
-        """Initialize the database connector with a fixed collection name."""
+    def __init__(self,
+                 collection_name: Optional[str] = None,
+                 client: Optional["Client"] = None,
+                 embeddings: Optional[Embeddings] = None,
+                 shards: Optional[int] = None,
+                 dimension: Optional[int] = None):
+        """
+        Initialize the database connector with a fixed collection name.
+
+        Chunks of every document live in one shared collection (or, with shards > 1,
+        in collection_name_0 .. collection_name_<shards-1>), tagged with their
+        doc_id. A document is assigned to a shard by hashing its doc_id, so all its
+        chunks land in the same shard and queries filter on the doc_id metadata.
+
+        The vector store client (Chroma, or the memory-mapped backend selected by
+        VECTOR_STORE_BACKEND) and embeddings client can be injected so that a single
+        instance of each is shared by every request handled by the worker.
+
+        Args:
+            collection_name: Shared collection name, defaults to CHROMA_COLLECTION
+            shards: Number of collections chunks are spread over, defaults to CHROMA_SHARDS
+            dimension: Size of the embedding vectors, defaults to EMBEDDING_DIMENSION
+        """
         try:
-            # Initialize OpenAI embeddings
-            self.embeddings = OpenAIEmbeddings(
-                openai_api_key=os.getenv("OPENAI_API_KEY"),
-                model="text-embedding-ada-002"
-            )
+            # Initialize the embeddings selected by EMBEDDING_PROVIDER
+            self.embeddings = embeddings or create_embeddings()
             
-            # Initialize Chroma client
-            self.client = Client(
-                settings=Settings(
-                    anonymized_telemetry=False,
-                    allow_reset=True,
-                    is_persistent=True,
-                    chroma_server_api_default_path="/api/v1"
-                )
-            )
+            # Initialize the vector store client
+            self.client = client or create_vector_client()
 
-            # Assign the collection_name argument to an instance attribute
-            self.collection_name = collection_name
+            # Collection handles keyed by collection id, so repeated lookups skip the round-trip
+            self._collections: Dict[str, "Collection"] = {}
 
-            # Use the self.collection_name attribute only if it's provided
-            if self.collection_name:
-                # Use get_or_create_collection instead of get_collection
-                self.collection = self.get_or_create_collection(collection_id=self.collection_name)
-                logger.info(f"Successfully initialized ChromaDB connection with collection: {self.collection_name}")
+            self.collection_name = collection_name or os.getenv("CHROMA_COLLECTION", "docuquery")
+            self.shards = shards or int(os.getenv("CHROMA_SHARDS", "1"))
+            self.dimension = dimension or int(os.getenv("EMBEDDING_DIMENSION", "1536"))
+            if self.shards == 1:
+                self.shard_names = [self.collection_name]
             else:
-                logger.info("Successfully initialized ChromaDB connection without a default collection")
+                self.shard_names = [f"{self.collection_name}_{i}" for i in range(self.shards)]
 
-            # Optional: Sanity check for embedding dimension
-            sample_embedding = self.embeddings.embed_query("test")
-            if len(sample_embedding) != 1536:
-                raise ValueError(f"Embedding dimension mismatch: expected 1536, got {len(sample_embedding)}")
-            else:
-                logger.info("Embedding dimension verified as 1536.")
+            for name in self.shard_names:
+                self.get_or_create_collection(collection_id=name)
+            self.collection = self.get_or_create_collection(collection_id=self.shard_names[0])
+            logger.info(f"Successfully initialized ChromaDB connection with collection: {self.collection_name} "
+                        f"({self.shards} shards)")
+        except Exception as e:
+            logger.error(f"Error initializing DB connector: {str(e)}")
+            raise
+
+    def verify_embedding_dimension(self):
+        """Sanity check that the embedding model produces vectors of the configured dimension."""
+        sample_embedding = self.embeddings.embed_query("test")
+        if len(sample_embedding) != self.dimension:
+            raise ValueError(f"Embedding dimension mismatch: expected {self.dimension}, got {len(sample_embedding)}")
+        logger.info(f"Embedding dimension verified as {self.dimension}.")
+
+    def heartbeat(self):
+        """Raise if the vector store does not answer; only Chroma clients have a heartbeat to ask."""
+        if hasattr(self.client, "heartbeat"):
+            self.client.heartbeat()
+
+    def shard_for(self, doc_id: str) -> "Collection":
+        """Return the collection holding the chunks of a document."""
+        index = zlib.crc32(doc_id.encode("utf-8")) % self.shards
+        return self.get_or_create_collection(self.shard_names[index])
 
-            # Update the docuquery collection metadata
-            self.docuquery_collection = self.client.get_or_create_collection(
-                name="docuquery",
-                metadata={"dimension": 1536, "space": "cosine"}
+    @staticmethod
+    def staging_id(doc_id: str) -> str:
+        """Tag of the chunks of a document's next version, which queries filtering on doc_id do not see."""
+        return f"{doc_id}:staged"
+
+    def add_chunks(self,
+                   doc_id: str,
+                   ids: List[str],
+                   documents: List[str],
+                   metadatas: List[Dict[str, Any]],
+                   embeddings: List[List[float]],
+                   staged: bool = False):
+        """
+        Store chunks of a document in its shard; every chunk is tagged with doc_id.
+
+        Staged chunks are tagged with staging_id(doc_id) instead, until publish_chunks swaps them in.
+        """
+        try:
+            # Replaces the embedding call verify_embedding_dimension used to make on every startup
+            if embeddings and len(embeddings[0]) != self.dimension:
+                raise ValueError(f"Embedding dimension mismatch: expected {self.dimension}, got {len(embeddings[0])}")
+            started = time.perf_counter()
+            tag = self.staging_id(doc_id) if staged else doc_id
+            self.shard_for(doc_id).upsert(
+                ids=ids,
+                documents=documents,
+                metadatas=[{**metadata, "doc_id": tag} for metadata in metadatas],
+                embeddings=embeddings
             )
-            logger.info(f"Successfully initialized ChromaDB connection with collection: docuquery")
+            VECTOR_WRITE_SECONDS.observe(time.perf_counter() - started)
+            CHUNKS_WRITTEN.inc(len(ids))
         except Exception as e:
-            logger.error(f"Error initializing DB connector: {str(e)}")
+            logger.error(f"Error storing chunks for {doc_id}: {str(e)}")
             raise
-            
-    async def store_documents(self, doc_id: str, documents: List[Document]):
+
+    def document_chunk_ids(self, doc_id: str) -> List[str]:
+        """Ids of all chunks stored for a document."""
+        return self.shard_for(doc_id).get(where={"doc_id": doc_id}, include=[])["ids"]
+
+    def document_chunk_metadata(self, doc_id: str) -> Dict[str, Dict[str, Any]]:
+        """Metadata of every chunk stored for a document, keyed by chunk id."""
+        results = self.shard_for(doc_id).get(where={"doc_id": doc_id}, include=["metadatas"])
+        return dict(zip(results["ids"], results["metadatas"]))
+
+    def get_chunks(self, doc_id: str, ids: List[str]) -> Dict[str, List[Any]]:
+        """Text and metadata of the given chunks of a document, in the order of ids; unknown ids are skipped."""
+        if not ids:
+            return {"ids": [], "documents": [], "metadatas": []}
+        results = self.shard_for(doc_id).get(ids=ids, where={"doc_id": doc_id}, include=["documents", "metadatas"])
+        found = {
+            chunk_id: (text, metadata)
+            for chunk_id, text, metadata in zip(results["ids"], results["documents"], results["metadatas"])
+        }
+        ordered = [chunk_id for chunk_id in ids if chunk_id in found]
+        return {
+            "ids": ordered,
+            "documents": [found[chunk_id][0] for chunk_id in ordered],
+            "metadatas": [found[chunk_id][1] for chunk_id in ordered]
+        }
+
+    def count_document_chunks(self, doc_id: str) -> int:
+        return len(self.document_chunk_ids(doc_id))
+
+    def update_chunk_metadata(self, doc_id: str, ids: List[str], metadatas: List[Dict[str, Any]]):
+        """Replace the metadata of stored chunks without touching their embeddings."""
         try:
-            # Get or create the collection for the given doc_id
-            collection = self.get_or_create_collection(doc_id)
-
-            # Use the self.embeddings instance
-            db = Chroma(
-                client=self.client,
-                collection_name=doc_id,
-                embedding_function=self.embeddings
+            self.shard_for(doc_id).update(
+                ids=ids,
+                metadatas=[{**metadata, "doc_id": doc_id} for metadata in metadatas]
             )
+        except Exception as e:
+            logger.error(f"Error updating chunks for {doc_id}: {str(e)}")
+            raise
 
-            # Add the documents to the collection
-            db.add(documents)
+    def publish_chunks(self,
+                       doc_id: str,
+                       staged_ids: List[str],
+                       moved_ids: List[str],
+                       moved_metadatas: List[Dict[str, Any]],
+                       removed_ids: List[str]):
+        """
+        Swap a document's staged version in for its current one.
 
+        Staged chunks are tagged with doc_id, chunks kept at a new position get
+        their new metadata and removed chunks are tagged as staged, all in one
+        update, so a query sees either the whole previous version or the whole
+        new one. The removed chunks are then deleted. Chroma limits the ids per
+        call, so a document larger than that is swapped in several steps.
+        """
+        try:
+            staging_id = self.staging_id(doc_id)
+            ids = [*staged_ids, *moved_ids, *removed_ids]
+            metadatas = [
+                *({"doc_id": doc_id} for _ in staged_ids),
+                *({**metadata, "doc_id": doc_id} for metadata in moved_metadatas),
+                *({"doc_id": staging_id} for _ in removed_ids)
+            ]
+            collection = self.shard_for(doc_id)
+            step = self.client.get_max_batch_size() if hasattr(self.client, "get_max_batch_size") else len(ids)
+            for start in range(0, len(ids), max(step, 1)):
+                # Metadata is merged, so the staged chunks keep their other fields
+                collection.update(ids=ids[start:start + step], metadatas=metadatas[start:start + step])
+            self.delete_chunks(doc_id, removed_ids)
         except Exception as e:
-            logger.error(f"Error storing documents: {str(e)}")
+            logger.error(f"Error publishing the new version of {doc_id}: {str(e)}")
             raise
 
-    async def query_documents(self, query_embedding: list, collection_id: str):
-        """Query a specific document collection"""
+    def discard_staged(self, doc_id: str) -> int:
+        """Delete the staged chunks of a document, such as those left by an interrupted job."""
+        staged = self.shard_for(doc_id).get(where={"doc_id": self.staging_id(doc_id)}, include=[])["ids"]
+        return self.delete_chunks(doc_id, staged)
+
+    def delete_chunks(self, doc_id: str, ids: List[str]) -> int:
+        """Delete the given chunks of a document."""
         try:
-            # Get or create the collection for the given collection_id
-            collection = self.get_or_create_collection(collection_id)
-
-            # Use the self.embeddings instance
-            db_for_query = Chroma(
-                client=self.client,
-                collection_name=collection_id,
-                embedding_function=self.embeddings
-            )
+            if ids:
+                self.shard_for(doc_id).delete(ids=ids)
+            return len(ids)
+        except Exception as e:
+            logger.error(f"Error deleting chunks of {doc_id}: {str(e)}")
+            raise
 
-            # Query using the underlying collection
-            results = collection.query(
-                query_embeddings=[query_embedding],
-                n_results=3,
-                include=["metadatas", "documents"]
+    def delete_document(self, doc_id: str) -> int:
+        """Delete only the chunks of the given document and return how many were removed."""
+        try:
+            deleted = self.delete_chunks(doc_id, self.document_chunk_ids(doc_id))
+            # A version still being ingested is dropped too
+            self.discard_staged(doc_id)
+            logger.info(f"Deleted {deleted} chunks of {doc_id}")
+            return deleted
+        except Exception as e:
+            logger.error(f"Error deleting document {doc_id}: {str(e)}")
+            raise
+
+    async def query_documents(self, query_embedding: list, doc_id: str, n_results: int = 3):
+        """Query the chunks of one document and return them ranked by distance."""
+        return (await self.query_documents_batch([query_embedding], doc_id, n_results))[0]
+
+    async def query_documents_batch(self, query_embeddings: List[list], doc_id: str,
+                                    n_results: int = 3) -> List[Dict[str, List[Any]]]:
+        """Query the chunks of one document with many embeddings in a single search call."""
+        try:
+            # In a worker thread, so a search waiting on a Chroma server does not block the event loop
+            results = await run_in_threadpool(
+                self.shard_for(doc_id).query,
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                where={"doc_id": doc_id},
+                include=["metadatas", "documents", "distances"]
             )
 
-            return {
-                "answer": results["documents"][0][0] if results["documents"] else "No answer",
-                "sources": [
-                    {"page": meta.get("page", 0), "text": text}
-                    for meta, text in zip(results["metadatas"][0], results["documents"][0])
-                ]
-            }
+            return [
+                {
+                    "ids": results["ids"][i] if results["ids"] else [],
+                    "documents": results["documents"][i] if results["documents"] else [],
+                    "metadatas": results["metadatas"][i] if results["metadatas"] else [],
+                    "distances": results["distances"][i] if results["distances"] else []
+                }
+                for i in range(len(query_embeddings))
+            ]
         except Exception as e:
             logger.error(f"Error querying documents: {str(e)}")
             raise
 
-    def get_collection(self, name: str) -> Collection:
-        return self.client.get_collection(name)
+    def get_collection(self, name: str) -> "Collection":
+        if name not in self._collections:
+            self._collections[name] = self.client.get_collection(name)
+        return self._collections[name]
 
-    def get_or_create_collection(self, collection_id: str) -> Collection:
+    def get_or_create_collection(self, collection_id: str) -> "Collection":
+        if collection_id in self._collections:
+            return self._collections[collection_id]
         try:
-            return self.client.get_collection(collection_id)
+            collection = self.client.get_collection(collection_id)
         except Exception:
             # Create collection with explicit dimension
-            return self.client.create_collection(
+            collection = self.client.create_collection(
                 name=collection_id,
-                metadata={"dimension": 1536, "space": "cosine"}
+                metadata={"dimension": self.dimension, "space": "cosine"}
             )
+        self._collections[collection_id] = collection
+        return collection
 
-    def reset_collection(self):
-        try:
-            self.client.reset()
-            self.collection = self.client.get_or_create_collection(
-                name=self.collection_name,
-                metadata={"dimension": 1536, "space": "cosine"}
-            )
-            logger.info(f"Chroma collection reset successfully for {self.collection_name}")
-        except Exception as e:
-            logger.error(f"Error resetting Chroma collection: {str(e)}")
-            raise
+    def migrate_legacy_collections(self,
+                                   on_document: Optional[Callable[[str, List[str], List[str]], None]] = None,
+                                   batch_size: int = 1000) -> List[str]:
+        """
+        Move documents stored by earlier releases, one collection per document, into the shared collection.
+
+        Each doc_<uuid> collection is copied with its embeddings into the document's
+        shard, then dropped, so nothing is re-embedded. Copying is idempotent, so a
+        migration interrupted by a restart, or run by several workers at once, is
+        simply finished by the next one.
+
+        Args:
+            on_document: Called with (doc_id, chunk ids, chunk texts) after a document is copied
+            batch_size: Chunks read and written per call
+
+        Returns:
+            The ids of the migrated documents
+        """
+        migrated = []
+        for name in self.client.list_collections():
+            if not LEGACY_COLLECTION.match(name):
+                continue
+            try:
+                legacy = self.client.get_collection(name)
+                chunk_ids, texts = [], []
+                offset = 0
+                while True:
+                    batch = legacy.get(include=["documents", "metadatas", "embeddings"],
+                                       limit=batch_size, offset=offset)
+                    if not len(batch["ids"]):
+                        break
+                    metadatas = [
+                        {"chunk_index": _legacy_chunk_index(chunk_id, offset + i), **(metadata or {}), "doc_id": name}
+                        for i, (chunk_id, metadata) in enumerate(zip(batch["ids"], batch["metadatas"]))
+                    ]
+                    self.shard_for(name).upsert(ids=batch["ids"], documents=batch["documents"],
+                                                metadatas=metadatas, embeddings=batch["embeddings"])
+                    chunk_ids += batch["ids"]
+                    texts += batch["documents"]
+                    offset += len(batch["ids"])
+                if on_document is not None:
+                    on_document(name, chunk_ids, texts)
+                self.client.delete_collection(name)
+                migrated.append(name)
+                logger.info(f"Migrated {len(chunk_ids)} chunks of {name} into the shared collection")
+            except Exception as e:
+                # Another worker may have finished this document first; the next start retries it otherwise
+                logger.error(f"Error migrating legacy collection {name}: {str(e)}")
+        return migrated
+
+    def clear_collection_cache(self):
+        """Forget cached collection handles."""
+        self._collections.clear()
@@ -1,15 +1,81 @@
-from typing import BinaryIO, Dict, Any, List
-from PyPDF2 import PdfReader
-from docx import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from typing import AsyncIterator, BinaryIO, Callable, Dict, Any, List, Optional, Tuple, Union
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from app.core.metrics import CHUNK_SECONDS, PARSE_SECONDS
+from app.core.text_chunker import ChunkSpan, IncrementalChunker, TextChunker
+import asyncio
+import inspect
 import mimetypes
+import multiprocessing
 import logging
 from fastapi import UploadFile
-import io
+from starlette.concurrency import run_in_threadpool
+import codecs
+import os
+import shutil
+import tempfile
+import time
 
 logger = logging.getLogger(__name__)
 
 
+# Extraction runs in worker processes, so these helpers live at module level to be picklable.
+# They import the parsers themselves, so only the worker processes pay for loading them.
+
+def _count_pdf_pages(path: str) -> int:
+    from PyPDF2 import PdfReader
+    return len(PdfReader(path).pages)
+
+
+def _extract_pdf_pages(path: str, start: int, end: int) -> List[str]:
+    """Extract and clean the text of pages [start, end) of a PDF."""
+    from PyPDF2 import PdfReader
+    pdf = PdfReader(path)
+    texts = []
+    for page in pdf.pages[start:end]:
+        texts.append(page.extract_text().replace('\n', ' ').strip())
+    return texts
+
+
+def _extract_docx_text(path: str) -> str:
+    from docx import Document
+    doc = Document(path)
+    return "".join(para.text + "\n" for para in doc.paragraphs if para.text.strip())
+
+
+class _TextDecoder:
+    """
+    Incremental decoder for text files: UTF-8, switching to Latin-1 at the first invalid byte.
+
+    Latin-1 files are in practice ASCII up to their first non-ASCII byte, which
+    is not valid UTF-8, so switching there decodes them exactly as a Latin-1
+    file while reading it once.
+    """
+
+    def __init__(self):
+        self.encoding = 'utf-8'
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+
+    def decode(self, block: bytes, final: bool = False) -> str:
+        try:
+            return self._decoder.decode(block, final)
+        except UnicodeDecodeError as e:
+            logger.error("Error decoding text file as UTF-8 - decoding the rest as Latin-1")
+            # e.object is the undecoded tail of the previous block followed by this one
+            valid = e.object[:e.start].decode('utf-8')
+            self.encoding = 'latin-1'
+            self._decoder = codecs.getincrementaldecoder('latin-1')()
+            return valid + self._decoder.decode(e.object[e.start:], final)
+
+    def read(self, file: BinaryIO, size: int) -> Optional[str]:
+        """Read and decode the next block of file; None at its end."""
+        block = file.read(size)
+        if block:
+            return self.decode(block)
+        tail = self.decode(b"", final=True)
+        return tail or None
+
+
 class DocumentLoader:
     """
     Handles document loading and text extraction for different file types.
@@ -24,19 +90,57 @@ class DocumentLoader:
         'text/plain': '.txt'
     }
 
+    # Bytes read per step when spooling uploads and decoding text files
+    TXT_BLOCK_SIZE = 1024 * 1024
+
     def __init__(self,
                  chunk_size: int = 1000,
-                 chunk_overlap: int = 200):
+                 chunk_overlap: int = 200,
+                 max_workers: Optional[int] = None,
+                 pages_per_task: Optional[int] = None):
         """
         Initialize the DocumentLoader with configurable chunking parameters.
+
+        Text extraction runs in a process pool so it never blocks the event loop;
+        chunking is a linear offset scan done as the text arrives. PDFs are split into ranges of pages_per_task pages that are
+        extracted in parallel and reassembled in order.
+
+        Args:
+            max_workers: Size of the process pool, defaults to DOCUMENT_LOADER_WORKERS or the CPU count
+            pages_per_task: PDF pages extracted per task, defaults to PDF_PAGES_PER_TASK
         """
-        self.text_splitter = RecursiveCharacterTextSplitter(
+        self.chunker = TextChunker(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
-            length_function=len,
             separators=["\n\n", "\n", " ", ""]
         )
-        logger.info(f"Initialized DocumentLoader with chunk_size={chunk_size}, overlap={chunk_overlap}")
+        # Characters buffered before the chunker scans a streamed document
+        self.flush_size = chunk_size * 64
+        self.max_workers = max_workers or int(os.getenv("DOCUMENT_LOADER_WORKERS", "0")) or os.cpu_count() or 1
+        self.pages_per_task = pages_per_task or int(os.getenv("PDF_PAGES_PER_TASK", "20"))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        logger.info(f"Initialized DocumentLoader with chunk_size={chunk_size}, overlap={chunk_overlap}, "
+                    f"workers={self.max_workers}")
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created lazily so importing or constructing the loader does not start processes
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def _run(self, func: Callable, *args):
+        """Run a picklable function in the process pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), func, *args)
+
+    def close(self):
+        """Shut down the extraction process pool."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
 
     async def process_file(self, file: UploadFile) -> Dict[str, Any]:
         """
@@ -45,36 +149,84 @@ class DocumentLoader:
         logger.info(f"Starting document processing for {file.filename}")
 
         try:
-            # Validate file and get the determined content type
-            determined_content_type = await self.validate_file(file)
+            # Validate file before touching its content
+            await self.validate_file(file)
+
+            # Spool the upload to disk in blocks instead of reading it into memory
+            with tempfile.NamedTemporaryFile() as spooled:
+                await run_in_threadpool(shutil.copyfileobj, file.file, spooled, self.TXT_BLOCK_SIZE)
+                spooled.flush()
+                return await self.load_path(spooled.name, file.filename, file.content_type)
+
+        except Exception as e:
+            logger.error(f"Error processing document {file.filename}: {str(e)}")
+            raise
+
+    async def load_path(self,
+                        path: str,
+                        filename: str,
+                        content_type: Optional[str] = None,
+                        on_page: Optional[Callable[[int], None]] = None) -> Dict[str, Any]:
+        """
+        Process a file already spooled to disk and return chunks with metadata.
+
+        Args:
+            path: Location of the file on disk
+            filename: Original name of the upload, used for validation
+            content_type: MIME type reported by the client, if any
+            on_page: Called with the page number after each PDF page is extracted; awaited if it is a coroutine function
+        """
+        determined_content_type = self.validate(filename, content_type)
+        chunks = [chunk.text async for chunk in self.iter_chunks(path, filename, content_type, on_page=on_page)]
+        return {
+            "chunks": chunks,
+            "metadata": {
+                "source": filename,
+                "chunk_count": len(chunks),
+                "file_type": determined_content_type,
+            }
+        }
 
-            # Read file content
-            content = await file.read()
+    async def iter_chunks(self,
+                          path: str,
+                          filename: str,
+                          content_type: Optional[str] = None,
+                          on_page: Optional[Callable[[int], None]] = None) -> AsyncIterator[ChunkSpan]:
+        """
+        Stream the chunks of a file spooled to disk.
+
+        Pages (or text blocks) are read incrementally and chunked as they arrive,
+        so memory stays proportional to the extraction window rather than the
+        document size. Each chunk carries its character offsets in the extracted
+        document text and, for PDFs, the page it starts on.
+
+        Args:
+            path: Location of the file on disk
+            filename: Original name of the upload, used for validation
+            content_type: MIME type reported by the client, if any
+            on_page: Called with the page number after each PDF page is extracted; awaited if it is a coroutine function
+        """
+        logger.info(f"Starting document processing for {filename} from {path}")
+
+        try:
+            determined_content_type = self.validate(filename, content_type)
 
-            # Process based on determined content type
             if determined_content_type == 'application/pdf':
-                chunks = await self.load_pdf(io.BytesIO(content))
+                chunks = self._chunk_stream(self._iter_pdf_pages(path, on_page))
             elif determined_content_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
-                chunks = await self.load_docx(io.BytesIO(content))
-            elif determined_content_type == 'text/plain':
-                chunks = await self.load_txt(io.BytesIO(content))
+                chunks = self._chunk_stream(self._iter_docx_text(path))
             else:
-                raise ValueError(f"Unsupported content type: {determined_content_type}")
-
-            result = {
-                "chunks": chunks,
-                "metadata": {
-                    "source": file.filename,
-                    "chunk_count": len(chunks),
-                    "file_type": determined_content_type,
-                }
-            }
+                chunks = self._iter_txt_chunks(path)
+
+            chunk_count = 0
+            async for chunk in chunks:
+                chunk_count += 1
+                yield chunk
 
-            logger.info(f"Document processing completed for {file.filename}: {len(chunks)} chunks created")
-            return result
+            logger.info(f"Document processing completed for {filename}: {chunk_count} chunks created")
 
         except Exception as e:
-            logger.error(f"Error processing document {file.filename}: {str(e)}")
+            logger.error(f"Error processing document {filename}: {str(e)}")
             raise
 
     async def validate_file(self, file: UploadFile) -> str:
@@ -82,13 +234,20 @@ class DocumentLoader:
         Validate file type by extension and MIME type.
         Returns the determined content type.
         """
-        ext = self._get_file_extension(file.filename)
+        return self.validate(file.filename, file.content_type)
+
+    def validate(self, filename: str, content_type: Optional[str]) -> str:
+        """
+        Validate a file name and reported MIME type.
+        Returns the determined content type.
+        """
+        ext = self._get_file_extension(filename)
         if ext not in self.SUPPORTED_EXTENSIONS:
             raise ValueError(
                 f"Unsupported file extension: {ext}. Supported types: {', '.join(self.SUPPORTED_EXTENSIONS)}")
 
         # Determine the content type in a local variable
-        if not file.content_type:
+        if not content_type:
             if ext == '.txt':
                 determined_content_type = 'text/plain'
             elif ext == '.pdf':
@@ -96,9 +255,9 @@ class DocumentLoader:
             elif ext == '.docx':
                 determined_content_type = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
             else:
-                raise ValueError(f"Could not determine content type for file: {file.filename}")
+                raise ValueError(f"Could not determine content type for file: {filename}")
         else:
-            determined_content_type = file.content_type
+            determined_content_type = content_type
 
         if determined_content_type not in self.SUPPORTED_MIMETYPES:
             raise ValueError(f"Invalid content type: {determined_content_type}")
@@ -106,39 +265,132 @@ class DocumentLoader:
         if self.SUPPORTED_MIMETYPES[determined_content_type] != ext:
             raise ValueError(f"File extension {ext} does not match content type {determined_content_type}")
 
-        logger.debug(f"File validation successful for {file.filename}")
+        logger.debug(f"File validation successful for {filename}")
         return determined_content_type
 
     def _get_file_extension(self, filename: str) -> str:
         """Extract and validate file extension."""
         return '.' + filename.split('.')[-1].lower() if '.' in filename else ''
 
-    async def load_pdf(self, file: BinaryIO) -> List[str]:
-        """Extract text from PDF file and split into chunks."""
+    async def _with_path(self, source: Union[str, BinaryIO], func: Callable[[str], Any]):
+        """
+        Await func(path) on a file path, spilling in-memory files to a
+        temporary file so worker processes can open them.
+        """
+        if isinstance(source, str):
+            return await func(source)
+        with tempfile.NamedTemporaryFile() as spilled:
+            await run_in_threadpool(shutil.copyfileobj, source, spilled, self.TXT_BLOCK_SIZE)
+            spilled.flush()
+            return await func(spilled.name)
+
+    async def _chunk_stream(self, texts: AsyncIterator[Tuple[str, Optional[int]]]) -> AsyncIterator[ChunkSpan]:
+        """
+        Incrementally chunk a stream of (text, page) pieces.
+
+        The chunks are identical to chunking the concatenated text at once; only
+        the text after the last emitted chunk's overlap point stays buffered.
+        Chunking runs in the threadpool, since a large piece (a whole DOCX, or a
+        block of a text file) takes milliseconds to scan. Time spent waiting for
+        text and time spent chunking it are recorded as the parse and chunk
+        stages; time the consumer holds a chunk is not.
+        """
+        chunker = IncrementalChunker(self.chunker, self.flush_size)
+        parse_seconds = chunk_seconds = 0.0
+        pieces = texts.__aiter__()
+        while True:
+            started = time.perf_counter()
+            try:
+                text, page = await pieces.__anext__()
+            except StopAsyncIteration:
+                parse_seconds += time.perf_counter() - started
+                break
+            parsed = time.perf_counter()
+            chunks = await run_in_threadpool(chunker.feed, text, page)
+            chunk_seconds += time.perf_counter() - parsed
+            parse_seconds += parsed - started
+            for chunk in chunks:
+                yield chunk
+        started = time.perf_counter()
+        chunks = await run_in_threadpool(chunker.finish)
+        chunk_seconds += time.perf_counter() - started
+        PARSE_SECONDS.observe(parse_seconds)
+        CHUNK_SECONDS.observe(chunk_seconds)
+        for chunk in chunks:
+            yield chunk
+
+    async def _iter_pdf_pages(self,
+                              path: str,
+                              on_page: Optional[Callable[[int], None]]) -> AsyncIterator[Tuple[str, Optional[int]]]:
+        """Yield formatted page texts in order, extracting a bounded window of page ranges in parallel."""
+        page_count = await self._run(_count_pdf_pages, path)
+        ranges = iter([
+            (start, min(start + self.pages_per_task, page_count))
+            for start in range(0, page_count, self.pages_per_task)
+        ])
+        pending = deque()
+
+        def submit_next():
+            page_range = next(ranges, None)
+            if page_range is not None:
+                pending.append((page_range, asyncio.ensure_future(self._run(_extract_pdf_pages, path, *page_range))))
+
+        for _ in range(self.max_workers * 2):
+            submit_next()
+
+        try:
+            while pending:
+                (start, _), task = pending.popleft()
+                page_texts = await task
+                submit_next()
+                for page_num, page_text in enumerate(page_texts, start + 1):
+                    if page_text:
+                        yield f"Page {page_num}: {page_text}\n\n", page_num
+                    if on_page:
+                        progress = on_page(page_num)
+                        if inspect.isawaitable(progress):
+                            await progress
+        finally:
+            for _, task in pending:
+                task.cancel()
+
+        logger.info(f"Extracted {page_count} PDF pages")
+
+    async def _iter_docx_text(self, path: str) -> AsyncIterator[Tuple[str, Optional[int]]]:
+        yield await self._run(_extract_docx_text, path), None
+
+    async def _iter_txt_chunks(self, path: str) -> AsyncIterator[ChunkSpan]:
+        with open(path, 'rb') as file:
+            async for chunk in self._chunk_stream(self._iter_txt_blocks(file)):
+                yield chunk
+
+    async def _iter_txt_blocks(self, file: BinaryIO) -> AsyncIterator[Tuple[str, Optional[int]]]:
+        """Read and decode a text file block by block in the threadpool (see _TextDecoder)."""
+        decoder = _TextDecoder()
+        while (text := await run_in_threadpool(decoder.read, file, self.TXT_BLOCK_SIZE)) is not None:
+            yield text, None
+
+    async def _collect(self, chunks: AsyncIterator[ChunkSpan]) -> List[str]:
+        return [chunk.text async for chunk in chunks]
+
+    async def load_pdf(self,
+                       file: Union[str, BinaryIO],
+                       on_page: Optional[Callable[[int], None]] = None) -> List[str]:
+        """Extract text from PDF file (path or file object) and split into chunks."""
         try:
-            pdf = PdfReader(file)
-            text = ""
-            for page_num, page in enumerate(pdf.pages, 1):
-                page_text = page.extract_text()
-                # Add cleaning
-                page_text = page_text.replace('\n', ' ').strip()
-                if page_text:
-                    text += f"Page {page_num}: {page_text}\n\n"
-            return self.text_splitter.split_text(text)
+            return await self._with_path(
+                file, lambda path: self._collect(self._chunk_stream(self._iter_pdf_pages(path, on_page)))
+            )
         except Exception as e:
             logger.error(f"Error processing PDF: {str(e)}")
             raise
 
-    async def load_docx(self, file: BinaryIO) -> List[str]:
-        """Extract text from DOCX file and split into chunks."""
+    async def load_docx(self, file: Union[str, BinaryIO]) -> List[str]:
+        """Extract text from DOCX file (path or file object) and split into chunks."""
         try:
-            doc = Document(file)
-            text = ""
-            for para in doc.paragraphs:
-                if para.text.strip():
-                    text += para.text + "\n"
-
-            chunks = self.text_splitter.split_text(text)
+            chunks = await self._with_path(
+                file, lambda path: self._collect(self._chunk_stream(self._iter_docx_text(path)))
+            )
             logger.info(f"Successfully extracted {len(chunks)} chunks from DOCX")
             return chunks
         except Exception as e:
@@ -148,16 +400,9 @@ class DocumentLoader:
     async def load_txt(self, file: BinaryIO) -> List[str]:
         """Extract text from TXT file and split into chunks."""
         try:
-            text = file.read().decode('utf-8')
-            chunks = self.text_splitter.split_text(text)
+            chunks = await self._collect(self._chunk_stream(self._iter_txt_blocks(file)))
             logger.info(f"Successfully extracted {len(chunks)} chunks from TXT")
             return chunks
-        except UnicodeDecodeError:
-            logger.error("Error decoding text file - trying with different encoding")
-            file.seek(0)
-            text = file.read().decode('latin-1')
-            chunks = self.text_splitter.split_text(text)
-            return chunks
         except Exception as e:
             logger.error(f"Error processing TXT: {str(e)}")
             raise
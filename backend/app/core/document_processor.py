@@ -1,7 +1,7 @@
 from langchain.document_loaders import TextLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from typing import List
 from langchain.docstore.document import Document
+from app.core.text_chunker import TextChunker
 import logging
 
 logger = logging.getLogger(__name__)
@@ -41,11 +41,11 @@ class DocumentProcessor:
                 logger.debug(f"Document chunk {i}: {doc.page_content[:100]}...")
             
             # Split document
-            text_splitter = RecursiveCharacterTextSplitter(
+            text_chunker = TextChunker(
                 chunk_size=1000,
                 chunk_overlap=200
             )
-            splits = text_splitter.split_documents(documents)
+            splits = text_chunker.split_documents(documents)
             
             # Add debug logging
             logger.debug(f"Split into {len(splits)} chunks")
@@ -0,0 +1,192 @@
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache.
+
+    Entries are keyed by a hash of (model name, text) and persisted in SQLite as
+    float32 blobs. A bounded in-memory LRU sits in front of the database, and the
+    database itself is capped at ``max_entries`` by evicting the least recently
+    used rows.
+
+    Lookups never write: the last-used time of rows read from disk is kept in
+    memory and written in one statement with the next ``put_many``, before an
+    eviction, or once ``TOUCH_BATCH`` rows are pending.
+    """
+
+    # Pending last-used updates written in one go
+    TOUCH_BATCH = 1000
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 memory_entries: Optional[int] = None,
+                 max_entries: Optional[int] = None):
+        """
+        Open (or create) the on-disk cache.
+
+        Args:
+            path: SQLite file, defaults to EMBEDDING_CACHE_PATH
+            memory_entries: Size of the in-memory LRU, defaults to EMBEDDING_CACHE_MEMORY_ENTRIES
+            max_entries: Maximum rows kept on disk, defaults to EMBEDDING_CACHE_MAX_ENTRIES
+        """
+        self.path = path or os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.sqlite3")
+        self.memory_entries = memory_entries or int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "10000"))
+        self.max_entries = max_entries or int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._touched: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        try:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY,"
+                " vector BLOB NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+            self._conn.commit()
+            self._disk_entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            logger.info(f"Opened embedding cache at {self.path} with {self._disk_entries} entries")
+        except Exception as e:
+            logger.error(f"Error opening embedding cache: {str(e)}")
+            raise
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """Return the content address for a text embedded with the given model."""
+        return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Look up embeddings in bulk; misses are returned as None."""
+        keys = [self.make_key(model, text) for text in texts]
+        results: List[Optional[List[float]]] = [None] * len(keys)
+        with self._lock:
+            pending: Dict[str, List[int]] = {}
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    results[i] = vector
+                else:
+                    pending.setdefault(key, []).append(i)
+
+            if pending:
+                found = self._read_disk(list(pending))
+                for key, vector in found.items():
+                    self._remember(key, vector)
+                    for i in pending[key]:
+                        results[i] = vector
+
+            hits = sum(1 for vector in results if vector is not None)
+            self.hits += hits
+            self.misses += len(results) - hits
+        return results
+
+    def put_many(self, model: str, texts: Sequence[str], embeddings: Sequence[Sequence[float]]):
+        """Store freshly computed embeddings and evict old rows beyond the size bound."""
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, embedding in zip(texts, embeddings):
+                key = self.make_key(model, text)
+                vector = list(embedding)
+                self._remember(key, vector)
+                rows.append((key, array("f", vector).tobytes(), now))
+            try:
+                cursor = self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+                )
+                self._flush_touched()
+                self._conn.commit()
+                self._disk_entries += max(cursor.rowcount, 0)
+                if self._disk_entries > self.max_entries:
+                    self._evict()
+            except Exception as e:
+                # A failed cache write must never fail the embedding call itself
+                logger.error(f"Error writing to embedding cache: {str(e)}")
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and current sizes."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": self._disk_entries,
+            }
+
+    def close(self):
+        with self._lock:
+            try:
+                self._flush_touched()
+                self._conn.commit()
+            except Exception as e:
+                logger.error(f"Error writing to embedding cache: {str(e)}")
+            self._conn.close()
+
+    def _read_disk(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = array("f", blob).tolist()
+        if found:
+            now = time.time()
+            self._touched.update((key, now) for key in found)
+            if len(self._touched) >= self.TOUCH_BATCH:
+                try:
+                    self._flush_touched()
+                    self._conn.commit()
+                except Exception as e:
+                    logger.error(f"Error writing to embedding cache: {str(e)}")
+        return found
+
+    def _flush_touched(self):
+        """Write the pending last-used times; the caller commits."""
+        if self._touched:
+            touched, self._touched = self._touched, {}
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(last_used, key) for key, last_used in touched.items()]
+            )
+
+    def _remember(self, key: str, vector: List[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self):
+        overflow = self._disk_entries - self.max_entries
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (overflow,)
+        )
+        self._conn.commit()
+        self._disk_entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        logger.info(f"Evicted {overflow} entries from embedding cache")
@@ -0,0 +1,212 @@
+from typing import List, Optional, Tuple
+from langchain_core.embeddings import Embeddings
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import logging
+from app.core.metrics import EMBED_BATCH_TEXTS, EMBED_BATCH_TOKENS, EMBED_REQUESTS, EMBED_SECONDS, EMBED_TOKENS
+import os
+import random
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Texts with at least this many characters in total are counted in the threadpool
+THREADED_COUNT_CHARS = 50000
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """
+    Whether error is an OpenAI rate limit error.
+
+    openai is slow to import and only loaded by the OpenAI clients, so if it
+    was never imported the error cannot be one of its exceptions.
+    """
+    openai = sys.modules.get("openai")
+    return openai is not None and isinstance(error, openai.RateLimitError)
+
+
+class TokenCounter:
+    """
+    Counts tokens with the tiktoken encoding of the embedding model.
+
+    When the encoding cannot be loaded (tiktoken downloads it on first use),
+    tokens are estimated at four characters each.
+    """
+
+    def __init__(self, encoding_name: str = "cl100k_base"):
+        self.encoding_name = encoding_name
+        self._encoding = None
+        self._loaded = False
+        # Large inputs are counted in the threadpool, so the encoding may be requested from several threads
+        self._lock = threading.Lock()
+
+    def _get_encoding(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    try:
+                        import tiktoken
+                        self._encoding = tiktoken.get_encoding(self.encoding_name)
+                    except Exception as e:
+                        logger.warning(f"Could not load tiktoken encoding {self.encoding_name}, "
+                                       f"estimating tokens: {str(e)}")
+                    self._loaded = True
+        return self._encoding
+
+    def count(self, text: str) -> int:
+        encoding = self._get_encoding()
+        if encoding is None:
+            return len(text) // 4 + 1
+        return len(encoding.encode(text, disallowed_special=()))
+
+
+class TokenBucket:
+    """
+    Tokens-per-minute limiter.
+
+    The bucket holds up to one minute of tokens and refills continuously;
+    acquire waits until the requested tokens are available. Requests larger
+    than the whole bucket are clamped so they can still proceed once it is full.
+    """
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: int):
+        tokens = min(float(tokens), self.capacity)
+        # The lock makes waiters acquire in arrival order, so batches are not starved
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+
+
+class EmbeddingScheduler:
+    """
+    Embeds texts in token-budgeted batches running concurrently on the async client.
+
+    Texts are packed in order into batches of at most max_batch_tokens tokens and
+    max_batch_size inputs. Up to max_in_flight batches run at once, each first
+    drawing its tokens from a tokens-per-minute bucket. Throttled batches
+    (openai.RateLimitError) are retried with full-jitter exponential backoff,
+    honouring Retry-After when the provider sends it. Results are returned in
+    the order of the input texts.
+    """
+
+    def __init__(self,
+                 embeddings: Embeddings,
+                 max_batch_tokens: Optional[int] = None,
+                 max_batch_size: Optional[int] = None,
+                 max_in_flight: Optional[int] = None,
+                 tokens_per_minute: Optional[int] = None,
+                 max_retries: Optional[int] = None,
+                 base_delay: float = 0.5,
+                 max_delay: float = 30.0):
+        """
+        Args:
+            embeddings: LangChain embeddings client; aembed_documents is used for every batch
+            max_batch_tokens: Token budget per request, defaults to EMBEDDING_BATCH_TOKENS
+            max_batch_size: Inputs per request, defaults to EMBEDDING_BATCH_SIZE
+            max_in_flight: Concurrent requests, defaults to EMBEDDING_MAX_IN_FLIGHT
+            tokens_per_minute: Provider TPM limit, defaults to EMBEDDING_TOKENS_PER_MINUTE
+            max_retries: Retries of a throttled batch, defaults to EMBEDDING_MAX_RETRIES
+        """
+        self.embeddings = embeddings
+        self.max_batch_tokens = max_batch_tokens or int(os.getenv("EMBEDDING_BATCH_TOKENS", "20000"))
+        self.max_batch_size = max_batch_size or int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+        self.max_in_flight = max_in_flight or int(os.getenv("EMBEDDING_MAX_IN_FLIGHT", "4"))
+        self.tokens_per_minute = tokens_per_minute or int(os.getenv("EMBEDDING_TOKENS_PER_MINUTE", "1000000"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("EMBEDDING_MAX_RETRIES", "6"))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.token_counter = TokenCounter()
+        self.retries = 0
+        # Created on first use so they bind to the event loop that runs the requests
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._bucket: Optional[TokenBucket] = None
+
+    def batches(self, texts: List[str]) -> List[Tuple[int, int, int]]:
+        """Pack texts in order into (start, end, tokens) batches within the token and size budgets."""
+        batches = []
+        start = 0
+        tokens = 0
+        for i, text in enumerate(texts):
+            count = self.token_counter.count(text)
+            if i > start and (tokens + count > self.max_batch_tokens or i - start >= self.max_batch_size):
+                batches.append((start, i, tokens))
+                start, tokens = i, 0
+            tokens += count
+        if start < len(texts):
+            batches.append((start, len(texts), tokens))
+        return batches
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts, returning one vector per text in input order."""
+        if not texts:
+            return []
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._bucket = TokenBucket(self.tokens_per_minute)
+
+        if sum(len(text) for text in texts) >= THREADED_COUNT_CHARS:
+            # Tokenizing a large upload would block the event loop for tens of milliseconds
+            batches = await run_in_threadpool(self.batches, texts)
+        else:
+            batches = self.batches(texts)
+        results = await asyncio.gather(*(
+            self._embed_batch(texts[start:end], tokens) for start, end, tokens in batches
+        ))
+        logger.debug(f"Embedded {len(texts)} texts in {len(batches)} batches")
+        return [vector for batch in results for vector in batch]
+
+    async def _embed_batch(self, texts: List[str], tokens: int) -> List[List[float]]:
+        EMBED_BATCH_TEXTS.observe(len(texts))
+        EMBED_BATCH_TOKENS.observe(tokens)
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            # A slot is only held while the request is in flight, not during a backoff
+            async with self._semaphore:
+                await self._bucket.acquire(tokens)
+                try:
+                    embeddings = await self.embeddings.aembed_documents(texts)
+                    EMBED_SECONDS.observe(time.perf_counter() - started)
+                    EMBED_REQUESTS.labels("ok").inc()
+                    EMBED_TOKENS.inc(tokens)
+                    return embeddings
+                except Exception as e:
+                    if not is_rate_limit_error(e):
+                        EMBED_REQUESTS.labels("error").inc()
+                        raise
+                    EMBED_REQUESTS.labels("throttled").inc()
+                    # An exhausted quota will not recover by waiting
+                    if getattr(e, "code", None) == "insufficient_quota" or attempt >= self.max_retries:
+                        raise
+                    delay = self._backoff(attempt, e)
+            attempt += 1
+            self.retries += 1
+            logger.warning(f"Embedding batch of {len(texts)} texts throttled, "
+                           f"retry {attempt}/{self.max_retries} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        try:
+            return max(delay, float(retry_after)) if retry_after else delay
+        except ValueError:
+            return delay
@@ -0,0 +1,84 @@
+from typing import Any, AsyncIterator, Iterator, List, Optional
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+import asyncio
+import time
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """
+    Local chat model that answers at a configurable speed.
+
+    The answer is the first ``answer_tokens`` words of the last prompt message
+    (repeated if the prompt is shorter), so it is deterministic and costs
+    nothing. The first token arrives after ``first_token_latency_s`` plus the
+    prompt's tokens (estimated at four characters each) read at
+    ``prefill_tokens_per_second``, and the rest at ``tokens_per_second``
+    (0 for either means no delay).
+    """
+
+    tokens_per_second: float = 0.0
+    first_token_latency_s: float = 0.0
+    prefill_tokens_per_second: float = 0.0
+    answer_tokens: int = 64
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming-chat-model"
+
+    def _tokens(self, messages: List[BaseMessage]) -> List[str]:
+        words = str(messages[-1].content).split() if messages else []
+        if not words:
+            words = ["answer"]
+        self.calls += 1
+        return [words[i % len(words)] + " " for i in range(self.answer_tokens)]
+
+    def _delays(self, messages: List[BaseMessage], tokens: List[str]) -> List[float]:
+        """Delay before each answer token."""
+        prefill = 0.0
+        if self.prefill_tokens_per_second > 0:
+            prompt_tokens = sum(len(str(message.content)) for message in messages) / 4
+            prefill = prompt_tokens / self.prefill_tokens_per_second
+        step = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        return [self.first_token_latency_s + prefill] + [step] * (len(tokens) - 1)
+
+    def _generate(self,
+                  messages: List[BaseMessage],
+                  stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None,
+                  **kwargs: Any) -> ChatResult:
+        tokens = self._tokens(messages)
+        time.sleep(sum(self._delays(messages, tokens)))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens).strip()))])
+
+    async def _agenerate(self,
+                         messages: List[BaseMessage],
+                         stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                         **kwargs: Any) -> ChatResult:
+        tokens = self._tokens(messages)
+        await asyncio.sleep(sum(self._delays(messages, tokens)))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens).strip()))])
+
+    def _stream(self,
+                messages: List[BaseMessage],
+                stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        tokens = self._tokens(messages)
+        for token, delay in zip(tokens, self._delays(messages, tokens)):
+            time.sleep(delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self,
+                       messages: List[BaseMessage],
+                       stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        tokens = self._tokens(messages)
+        for token, delay in zip(tokens, self._delays(messages, tokens)):
+            await asyncio.sleep(delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
@@ -0,0 +1,432 @@
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+from app.core.answer_cache import AnswerCache
+from app.core.db_connector import DBConnector
+from app.core.document_loader import DocumentLoader
+from app.core.embedding_processor import EmbeddingProcessor
+from app.core.embedding_scheduler import is_rate_limit_error
+from app.core.job_store import JobStore
+from app.core.keyword_index import KeywordDocument, KeywordIndex
+from app.core.metrics import INGESTION_JOBS, INGESTION_JOBS_IN_PROGRESS, STAGE_BREAKDOWN
+from app.core.profiling import slow_requests
+from app.core.text_chunker import ChunkSpan
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import time
+import traceback
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionQueueFull(Exception):
+    """Raised when the ingestion backlog is at capacity."""
+
+
+class DocumentBusy(Exception):
+    """Raised when a new version is submitted while the document is still being ingested."""
+
+
+class IngestionQueue:
+    """
+    Runs document ingestion in the background on a bounded pool of asyncio workers.
+
+    Uploads are spooled to disk and recorded in the JobStore before the HTTP
+    request returns; workers then parse, embed and store them, reporting
+    progress per stage.
+
+    An upload identical to a document's current version is not ingested again.
+    A new version of an existing document only embeds and writes the chunks
+    whose text changed: chunk ids are derived from a hash of the chunk text,
+    so unchanged chunks keep their ids and embeddings, and chunks missing from
+    the new version are deleted. New chunks are staged out of sight of queries
+    and published together with the deletions once the whole version is
+    stored (DBConnector.publish_chunks), so a query never mixes two versions.
+
+    When a KeywordIndex is given, the BM25 postings of every chunk are built
+    alongside and replace the document's previous postings once all chunks are
+    stored.
+
+    When an AnswerCache is given, the document's cached answers are invalidated
+    when a new version is published, so no answer computed from the previous
+    version outlives the job.
+    """
+
+    def __init__(self,
+                 job_store: JobStore,
+                 document_loader: DocumentLoader,
+                 embedding_processor: EmbeddingProcessor,
+                 db_connector: DBConnector,
+                 workers: Optional[int] = None,
+                 max_pending: Optional[int] = None,
+                 batch_size: Optional[int] = None,
+                 keyword_index: Optional[KeywordIndex] = None,
+                 answer_cache: Optional[AnswerCache] = None):
+        """
+        Args:
+            workers: Concurrent ingestion jobs, defaults to INGESTION_WORKERS
+            max_pending: Jobs that may wait in the queue, defaults to INGESTION_QUEUE_SIZE
+            batch_size: Chunks embedded and stored per step, defaults to INGESTION_BATCH_SIZE
+            keyword_index: Inverted index updated with every ingested document
+            answer_cache: Cache of answers invalidated with every ingested document
+        """
+        self.job_store = job_store
+        self.document_loader = document_loader
+        self.embedding_processor = embedding_processor
+        self.db_connector = db_connector
+        self.keyword_index = keyword_index
+        self.answer_cache = answer_cache
+        self.workers = workers or int(os.getenv("INGESTION_WORKERS", "2"))
+        self.max_pending = max_pending or int(os.getenv("INGESTION_QUEUE_SIZE", "100"))
+        self.batch_size = batch_size or int(os.getenv("INGESTION_BATCH_SIZE", "100"))
+        self.spool_dir = os.getenv(
+            "INGESTION_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "docuquery_uploads")
+        )
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        """Start the worker tasks on the running event loop."""
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self.job_store.fail_orphaned("Worker stopped before the job finished")
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Started {self.workers} ingestion workers")
+
+    async def stop(self):
+        """Cancel the worker tasks."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Stopped ingestion workers")
+
+    async def submit(self, file: UploadFile, doc_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Validate and spool an upload, then queue it for ingestion.
+
+        Args:
+            file: The uploaded document
+            doc_id: Existing document the upload is a new version of
+
+        Returns:
+            The newly created job record, or the job of the existing document if the
+            same file was already ingested; "duplicate" tells the two apart
+
+        Raises:
+            ValueError: If the file type is not supported or doc_id is unknown
+            DocumentBusy: If doc_id is still being ingested
+            IngestionQueueFull: If too many jobs are already waiting
+        """
+        await self.document_loader.validate_file(file)
+        await run_in_threadpool(self._check_accepting, doc_id)
+        path, fingerprint = await run_in_threadpool(self._spool, file)
+        try:
+            return await self._enqueue(path, fingerprint, file.filename, file.content_type, doc_id)
+        except Exception:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+
+    async def submit_spooled(self,
+                             path: str,
+                             fingerprint: str,
+                             filename: str,
+                             content_type: Optional[str],
+                             doc_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Queue a file that is already on disk, such as a finalized chunked upload.
+
+        The file is moved into the spool directory once the job is accepted, so
+        when this raises it is left where it was and the caller may retry.
+
+        Args:
+            path: Location of the complete file
+            fingerprint: sha256 of the file
+            filename: Original name of the upload
+            content_type: MIME type reported by the client, if any
+            doc_id: Existing document the upload is a new version of
+
+        Returns and raises as submit.
+        """
+        self.document_loader.validate(filename, content_type)
+        await run_in_threadpool(self._check_accepting, doc_id)
+        spooled = os.path.join(self.spool_dir, f"{uuid.uuid4().hex}{os.path.splitext(filename)[1]}")
+        await run_in_threadpool(shutil.move, path, spooled)
+        try:
+            return await self._enqueue(spooled, fingerprint, filename, content_type, doc_id)
+        except Exception:
+            if os.path.exists(spooled):
+                await run_in_threadpool(shutil.move, spooled, path)
+            raise
+
+    def _check_accepting(self, doc_id: Optional[str]):
+        """
+        Reject an upload early, before it is spooled, if it cannot be queued now.
+
+        _enqueue checks again that the document is not busy, atomically with
+        creating the job, since another upload may be accepted in the meantime.
+        """
+        if self._queue is None:
+            raise RuntimeError("Ingestion queue has not been started")
+        if doc_id:
+            current = self.job_store.current_for_document(doc_id)
+            if current is None:
+                raise ValueError(f"Unknown document: {doc_id}")
+            if current["status"] in ("queued", "running"):
+                raise DocumentBusy(f"Document {doc_id} is still being ingested by {current['job_id']}")
+        if self._queue.full():
+            raise IngestionQueueFull(f"Ingestion queue is full ({self.max_pending} pending jobs)")
+
+    async def _enqueue(self,
+                       path: str,
+                       fingerprint: str,
+                       filename: str,
+                       content_type: Optional[str],
+                       doc_id: Optional[str]) -> Dict[str, Any]:
+        """
+        Create and queue the job of a spooled file, or return the duplicate it matches.
+
+        When this raises, the caller still owns the file at path.
+        """
+        existing = await self._find_duplicate(fingerprint, doc_id)
+        if existing is not None:
+            os.remove(path)
+            logger.info(f"{filename} is identical to {existing['doc_id']}, skipping ingestion")
+            return {**existing, "duplicate": True}
+
+        if doc_id:
+            job = await run_in_threadpool(self.job_store.create_if_idle, doc_id, filename, content_type, fingerprint)
+            if job is None:
+                raise DocumentBusy(f"Document {doc_id} is already being ingested")
+        else:
+            doc_id = f"doc_{uuid.uuid4().hex}"
+            job = await run_in_threadpool(self.job_store.create, doc_id, filename, content_type, fingerprint)
+        try:
+            self._queue.put_nowait((job["job_id"], path))
+        except asyncio.QueueFull:
+            await run_in_threadpool(self.job_store.update, job["job_id"], status="failed",
+                                    error="Ingestion queue is full")
+            raise IngestionQueueFull(f"Ingestion queue is full ({self.max_pending} pending jobs)")
+
+        logger.info(f"Queued ingestion job {job['job_id']} for {filename} as {doc_id}")
+        return {**job, "duplicate": False}
+
+    def _spool(self, file: UploadFile) -> Tuple[str, str]:
+        """Copy the upload to the spool directory, returning its path and sha256."""
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=self.spool_dir, delete=False) as spooled:
+            while block := file.file.read(1024 * 1024):
+                digest.update(block)
+                spooled.write(block)
+            return spooled.name, digest.hexdigest()
+
+    async def _find_duplicate(self, fingerprint: str, doc_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        job = await run_in_threadpool(self.job_store.find_by_fingerprint, fingerprint, doc_id)
+        if job is None:
+            return None
+        # A completed document may have been deleted since
+        if job["status"] == "completed" and job["chunks_total"]:
+            if not await run_in_threadpool(self.db_connector.count_document_chunks, job["doc_id"]):
+                return None
+        return job
+
+    @staticmethod
+    def chunk_ids(doc_id: str, texts: List[str], seen: Dict[str, int]) -> List[str]:
+        """
+        Content-derived chunk ids: the same text gets the same id in every version.
+
+        seen counts the occurrences of each text hash so far, so repeated chunks
+        within a document get distinct ids.
+        """
+        ids = []
+        for text in texts:
+            key = hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+            occurrence = seen.get(key, 0)
+            seen[key] = occurrence + 1
+            ids.append(f"{doc_id}_{key}" if occurrence == 0 else f"{doc_id}_{key}_{occurrence}")
+        return ids
+
+    async def _worker(self, index: int):
+        while True:
+            job_id, path = await self._queue.get()
+            INGESTION_JOBS_IN_PROGRESS.inc()
+            # Jobs run outside any request, so each gets its own stage breakdown for the slow log
+            breakdown: Dict[str, float] = {}
+            token = STAGE_BREAKDOWN.set(breakdown)
+            started = time.perf_counter()
+            try:
+                await self._run(job_id, path)
+            except Exception as e:
+                # _run records its own failures; this keeps the worker alive if even that failed
+                logger.error(f"Error running ingestion job {job_id}: {str(e)}")
+                logger.error(f"Traceback: {traceback.format_exc()}")
+            finally:
+                STAGE_BREAKDOWN.reset(token)
+                slow_requests.record(time.perf_counter() - started, {
+                    "kind": "ingestion_job", "job_id": job_id, "stages": breakdown
+                })
+                INGESTION_JOBS_IN_PROGRESS.dec()
+                self._queue.task_done()
+                if os.path.exists(path):
+                    os.remove(path)
+
+    async def _run(self, job_id: str, path: str):
+        job = await run_in_threadpool(self.job_store.get, job_id)
+        doc_id = job["doc_id"]
+        logger.info(f"Ingestion job {job_id} started for {job['filename']}")
+
+        pages_parsed = [0]
+
+        async def on_page(page_num: int):
+            pages_parsed[0] = page_num
+            if page_num % 10 == 0:
+                await run_in_threadpool(self.job_store.update, job_id, pages_parsed=page_num)
+
+        batch: List[ChunkSpan] = []
+        chunks_seen = 0
+        chunks_stored = 0
+        chunks_reused = 0
+        # Chunks of the current version, if this is a new version of an existing document
+        existing: Dict[str, Dict[str, Any]] = {}
+        seen_hashes: Dict[str, int] = {}
+        kept_ids = set()
+        added_ids: List[str] = []
+        moved: Dict[str, Dict[str, Any]] = {}
+        published = False
+        keywords = KeywordDocument(doc_id)
+
+        async def flush():
+            nonlocal chunks_stored, chunks_reused
+            start = chunks_stored
+            await run_in_threadpool(
+                self.job_store.update,
+                job_id, stage="embedding", pages_parsed=pages_parsed[0], chunks_total=chunks_seen
+            )
+            ids = self.chunk_ids(doc_id, [chunk.text for chunk in batch], seen_hashes)
+            fresh_ids, fresh_texts, fresh_metadatas = [], [], []
+            for i, (chunk_id, chunk) in enumerate(zip(ids, batch), start):
+                if self.keyword_index is not None:
+                    keywords.add(chunk_id, chunk.text)
+                metadata = {
+                    "doc_id": doc_id,
+                    # Documents without pages (TXT, DOCX) count as a single page
+                    "page": chunk.page or 1,
+                    "chunk_index": i,
+                    "char_start": chunk.char_start,
+                    "char_end": chunk.char_end
+                }
+                if chunk_id in existing:
+                    # Unchanged text: keep the stored embedding, only its position may have moved
+                    kept_ids.add(chunk_id)
+                    if existing[chunk_id] != metadata:
+                        moved[chunk_id] = metadata
+                    continue
+                fresh_ids.append(chunk_id)
+                fresh_texts.append(chunk.text)
+                fresh_metadatas.append(metadata)
+
+            if fresh_texts:
+                embeddings = await self.embedding_processor.process_chunks(fresh_texts)
+                await run_in_threadpool(
+                    self.job_store.update, job_id, stage="storing", chunks_embedded=start + len(batch)
+                )
+                await run_in_threadpool(
+                    self.db_connector.add_chunks,
+                    doc_id,
+                    documents=fresh_texts,
+                    metadatas=fresh_metadatas,
+                    ids=fresh_ids,
+                    embeddings=embeddings,
+                    staged=True
+                )
+                added_ids.extend(fresh_ids)
+            chunks_stored += len(batch)
+            chunks_reused += len(batch) - len(fresh_ids)
+            await run_in_threadpool(
+                self.job_store.update,
+                job_id, stage="parsing", chunks_embedded=chunks_stored, chunks_stored=chunks_stored,
+                chunks_reused=chunks_reused
+            )
+
+        try:
+            await run_in_threadpool(self.job_store.update, job_id, status="running", stage="parsing")
+            existing = await run_in_threadpool(self.db_connector.document_chunk_metadata, doc_id)
+            # Left behind by a job that was interrupted before publishing
+            await run_in_threadpool(self.db_connector.discard_staged, doc_id)
+
+            # Chunks stream out of the loader and are embedded and stored batch by batch,
+            # so memory is bounded by the batch size rather than the document size
+            async for chunk in self.document_loader.iter_chunks(
+                path, job["filename"], job["content_type"], on_page=on_page
+            ):
+                batch.append(chunk)
+                chunks_seen += 1
+                if len(batch) >= self.batch_size:
+                    await flush()
+                    batch = []
+            if batch:
+                await flush()
+                batch = []
+
+            # The previous version stays intact until every chunk of the new one is stored
+            removed = [chunk_id for chunk_id in existing if chunk_id not in kept_ids]
+            await run_in_threadpool(
+                self.db_connector.publish_chunks, doc_id, added_ids, list(moved), list(moved.values()), removed
+            )
+            published = True
+            if self.keyword_index is not None:
+                await run_in_threadpool(self.keyword_index.replace_document, keywords)
+            # Before the job reads as completed, so clients polling it never get an answer about the old version
+            await self._invalidate_answers(doc_id)
+
+            await run_in_threadpool(
+                self.job_store.update,
+                job_id,
+                status="completed",
+                stage="completed",
+                pages_parsed=pages_parsed[0],
+                chunks_total=chunks_seen
+            )
+            INGESTION_JOBS.labels("completed").inc()
+            logger.info(f"Ingestion job {job_id} completed for {doc_id}: {len(added_ids)} chunks added, "
+                        f"{chunks_reused} reused, {len(moved)} moved, {len(removed)} removed")
+        except Exception as e:
+            if is_rate_limit_error(e):
+                logger.error(f"OpenAI quota exceeded: {str(e)}")
+                error = "OpenAI quota exceeded, please check your plan and billing details."
+            else:
+                logger.error(f"Error processing document: {str(e)}")
+                logger.error(f"Traceback: {traceback.format_exc()}")
+                error = f"Error processing document: {str(e)}"
+            INGESTION_JOBS.labels("failed").inc()
+            if published:
+                # The new version is already live, only its keyword postings or cache invalidation failed
+                await self._invalidate_answers(doc_id)
+            else:
+                await self._discard(doc_id, added_ids)
+            await run_in_threadpool(self.job_store.update, job_id, status="failed", error=error)
+
+    async def _invalidate_answers(self, doc_id: str):
+        """Drop the cached answers of a document; a failure is logged, the answers then expire by TTL."""
+        if self.answer_cache is None:
+            return
+        try:
+            await run_in_threadpool(self.answer_cache.invalidate, doc_id)
+        except Exception as e:
+            logger.error(f"Error invalidating cached answers of {doc_id}: {str(e)}")
+
+    async def _discard(self, doc_id: str, ids: List[str]):
+        """
+        Remove the chunks a failed job staged; a previous version of the document
+        is left as it was.
+        """
+        try:
+            await run_in_threadpool(self.db_connector.delete_chunks, doc_id, ids)
+        except Exception as e:
+            logger.error(f"Error discarding partial document {doc_id}: {str(e)}")
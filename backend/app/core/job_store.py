@@ -0,0 +1,225 @@
+from typing import Any, Dict, Optional
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class JobStore:
+    """
+    Persistent table of ingestion jobs and their stage-level progress.
+
+    Jobs move through the statuses queued -> running -> completed | failed and
+    record the current stage (queued, parsing, embedding, storing, completed)
+    together with counters for parsed pages, embedded chunks and stored chunks.
+    Each job also records the sha256 fingerprint of the uploaded file, so an
+    identical re-upload can be answered with the existing document.
+    """
+
+    STATUSES = ("queued", "running", "completed", "failed")
+    _COLUMNS = (
+        "job_id", "doc_id", "filename", "content_type", "status", "stage",
+        "pages_parsed", "chunks_total", "chunks_embedded", "chunks_stored", "chunks_reused",
+        "fingerprint", "error", "owner", "created_at", "updated_at"
+    )
+    # Columns added after the table was first released, with their definitions
+    _ADDED_COLUMNS = {
+        "chunks_reused": "INTEGER NOT NULL DEFAULT 0",
+        "fingerprint": "TEXT",
+    }
+
+    def __init__(self, path: Optional[str] = None):
+        """Open (or create) the job table at path, defaulting to INGESTION_JOB_DB."""
+        self.path = path or os.getenv("INGESTION_JOB_DB", "./ingestion_jobs.sqlite3")
+        # Jobs are executed by the worker process that accepted the upload
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._lock = threading.Lock()
+        try:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " job_id TEXT PRIMARY KEY,"
+                " doc_id TEXT NOT NULL,"
+                " filename TEXT NOT NULL,"
+                " content_type TEXT,"
+                " status TEXT NOT NULL,"
+                " stage TEXT NOT NULL,"
+                " pages_parsed INTEGER NOT NULL DEFAULT 0,"
+                " chunks_total INTEGER NOT NULL DEFAULT 0,"
+                " chunks_embedded INTEGER NOT NULL DEFAULT 0,"
+                " chunks_stored INTEGER NOT NULL DEFAULT 0,"
+                " chunks_reused INTEGER NOT NULL DEFAULT 0,"
+                " fingerprint TEXT,"
+                " error TEXT,"
+                " owner TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            existing = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            for name, definition in self._ADDED_COLUMNS.items():
+                if name not in existing:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_doc_id ON jobs(doc_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_fingerprint ON jobs(fingerprint)")
+            self._conn.commit()
+        except Exception as e:
+            logger.error(f"Error opening job store: {str(e)}")
+            raise
+
+    def create(self,
+               doc_id: str,
+               filename: str,
+               content_type: Optional[str],
+               fingerprint: Optional[str] = None) -> Dict[str, Any]:
+        """Record a new queued job for the given document."""
+        return self._insert(doc_id, filename, content_type, fingerprint, if_idle=False)
+
+    def create_if_idle(self,
+                       doc_id: str,
+                       filename: str,
+                       content_type: Optional[str],
+                       fingerprint: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Record a new queued job unless the document already has one queued or running.
+
+        The check and the insert are one statement, so of two concurrent uploads
+        of the same document, in any worker of the host, only one gets a job.
+
+        Returns:
+            The new job, or None if the document is busy
+        """
+        return self._insert(doc_id, filename, content_type, fingerprint, if_idle=True)
+
+    def _insert(self,
+                doc_id: str,
+                filename: str,
+                content_type: Optional[str],
+                fingerprint: Optional[str],
+                if_idle: bool) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        job_id = f"job_{uuid.uuid4().hex}"
+        query = (
+            "INSERT INTO jobs (job_id, doc_id, filename, content_type, status, stage, fingerprint, owner,"
+            " created_at, updated_at)"
+            " SELECT ?, ?, ?, ?, 'queued', 'queued', ?, ?, ?, ?"
+        )
+        params = [job_id, doc_id, filename, content_type, fingerprint, self.owner, now, now]
+        if if_idle:
+            query += " WHERE NOT EXISTS (SELECT 1 FROM jobs WHERE doc_id = ? AND status IN ('queued', 'running'))"
+            params.append(doc_id)
+        with self._lock:
+            inserted = self._conn.execute(query, params).rowcount
+            self._conn.commit()
+        return self.get(job_id) if inserted > 0 else None
+
+    def update(self, job_id: str, **fields: Any):
+        """Update progress fields of a job."""
+        unknown = set(fields) - set(self._COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown job fields: {', '.join(sorted(unknown))}")
+        if "status" in fields and fields["status"] not in self.STATUSES:
+            raise ValueError(f"Invalid job status: {fields['status']}")
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE job_id = ?",
+                (*fields.values(), job_id)
+            )
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def latest_for_document(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """Return the most recent job that ingested the given document."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE doc_id = ? ORDER BY created_at DESC LIMIT 1", (doc_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def current_for_document(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the job that produced the document's current version.
+
+        Failed jobs are skipped: a failed revision leaves the previous version in place.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE doc_id = ? AND status != 'failed' ORDER BY created_at DESC LIMIT 1",
+                (doc_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def find_by_fingerprint(self, fingerprint: str, doc_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Return the newest queued, running or completed job for an identical file
+        that is still its document's current version.
+
+        Args:
+            fingerprint: sha256 of the uploaded file
+            doc_id: Only consider this document
+        """
+        # One statement: the subquery picks each candidate's current job as current_for_document does
+        query = (
+            "SELECT * FROM jobs AS candidate WHERE fingerprint = ? AND status != 'failed'"
+            " AND job_id = (SELECT job_id FROM jobs WHERE doc_id = candidate.doc_id AND status != 'failed'"
+            " ORDER BY created_at DESC LIMIT 1)"
+        )
+        params = [fingerprint]
+        if doc_id:
+            query += " AND doc_id = ?"
+            params.append(doc_id)
+        with self._lock:
+            row = self._conn.execute(query + " ORDER BY created_at DESC LIMIT 1", params).fetchone()
+        return dict(row) if row else None
+
+    def fail_orphaned(self, reason: str) -> int:
+        """
+        Mark jobs left queued or running by a dead worker on this host as failed.
+
+        Their spooled uploads lived in that worker's queue, so nobody will pick them up.
+        """
+        hostname = socket.gethostname()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, owner FROM jobs WHERE status IN ('queued', 'running') AND owner LIKE ?",
+                (f"{hostname}:%",)
+            ).fetchall()
+            orphaned = [row["job_id"] for row in rows if not self._owner_alive(row["owner"])]
+            self._conn.executemany(
+                "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE job_id = ?",
+                [(reason, time.time(), job_id) for job_id in orphaned]
+            )
+            self._conn.commit()
+        if orphaned:
+            logger.warning(f"Marked {len(orphaned)} orphaned ingestion jobs as failed")
+        return len(orphaned)
+
+    def _owner_alive(self, owner: str) -> bool:
+        pid = int(owner.rsplit(":", 1)[1])
+        if pid == os.getpid():
+            # Called before this process accepts uploads, so the job belongs to a previous
+            # process that happened to have the same pid (e.g. a restarted container)
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,234 @@
+from array import array
+from collections import Counter, OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from app.core.metrics import KEYWORD_INDEX_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Words joined by ".", "-", "_" or "/" stay one token, so clause numbers (12.3) and
+# part IDs (PX-4471) can be matched exactly
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._/-][a-z0-9]+)*")
+_SPLIT_PATTERN = re.compile(r"[._/-]")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have if in into is it its not of on or "
+    "such that the their then there these they this to was were what when where which "
+    "who will with".split()
+)
+
+
+def tokenize(text: str) -> Iterator[str]:
+    """Yield the index terms of text: lowercased words, compound tokens and their parts."""
+    for match in _TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        if token not in _STOPWORDS:
+            yield token
+        if _SPLIT_PATTERN.search(token):
+            for part in _SPLIT_PATTERN.split(token):
+                if part and part not in _STOPWORDS:
+                    yield part
+
+
+class KeywordDocument:
+    """
+    Postings of one document, accumulated chunk by chunk during ingestion.
+
+    Chunks are numbered in the order they are added; each term maps to an
+    array of (chunk ordinal, term frequency) pairs.
+    """
+
+    def __init__(self, doc_id: str):
+        self.doc_id = doc_id
+        self.chunk_ids: List[str] = []
+        self.lengths = array("I")
+        self.postings: Dict[str, array] = {}
+
+    def add(self, chunk_id: str, text: str):
+        ordinal = len(self.chunk_ids)
+        counts = Counter(tokenize(text))
+        self.chunk_ids.append(chunk_id)
+        self.lengths.append(sum(counts.values()))
+        for term, frequency in counts.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = array("I")
+            postings.extend((ordinal, frequency))
+
+
+class KeywordIndex:
+    """
+    Persistent inverted index with BM25 scoring, partitioned by doc_id.
+
+    Every document has one row listing its chunk ids and token lengths and one
+    row per term holding the term's postings as a packed array of (chunk
+    ordinal, term frequency) pairs. A query reads only the rows of its terms.
+    BM25 statistics (chunk count, average length, document frequency) are
+    computed within the document, since queries never span documents.
+
+    Each stored version of a document gets a new version token. Headers are
+    cached in memory with the token they were read at, and every search checks
+    it in the same read transaction as the postings, so a header cached before
+    another process re-indexed the document is never paired with new postings.
+    """
+
+    # Columns added after the table was first released, with their definitions
+    _ADDED_COLUMNS = {
+        "version": "TEXT NOT NULL DEFAULT ''",
+    }
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 k1: float = 1.2,
+                 b: float = 0.75,
+                 cached_documents: int = 256):
+        """
+        Open (or create) the index.
+
+        Args:
+            path: SQLite file, defaults to KEYWORD_INDEX_PATH
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+            cached_documents: Document headers (chunk ids and lengths) kept in memory
+        """
+        self.path = path or os.getenv("KEYWORD_INDEX_PATH", "./keyword_index.sqlite3")
+        self.k1 = k1
+        self.b = b
+        self.cached_documents = cached_documents
+        self._headers: "OrderedDict[str, Tuple[str, List[str], np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        try:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                " doc_id TEXT PRIMARY KEY,"
+                " chunk_ids TEXT NOT NULL,"
+                " lengths BLOB NOT NULL,"
+                " version TEXT NOT NULL DEFAULT '')"
+            )
+            existing = {row[1] for row in self._conn.execute("PRAGMA table_info(documents)")}
+            for name, definition in self._ADDED_COLUMNS.items():
+                if name not in existing:
+                    self._conn.execute(f"ALTER TABLE documents ADD COLUMN {name} {definition}")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS postings ("
+                " doc_id TEXT NOT NULL,"
+                " term TEXT NOT NULL,"
+                " postings BLOB NOT NULL,"
+                " PRIMARY KEY (doc_id, term)) WITHOUT ROWID"
+            )
+            self._conn.commit()
+            logger.info(f"Opened keyword index at {self.path}")
+        except Exception as e:
+            logger.error(f"Error opening keyword index: {str(e)}")
+            raise
+
+    def replace_document(self, document: KeywordDocument):
+        """Store the postings of a document, replacing any previous version in one transaction."""
+        try:
+            started = time.perf_counter()
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM postings WHERE doc_id = ?", (document.doc_id,))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO documents (doc_id, chunk_ids, lengths, version) VALUES (?, ?, ?, ?)",
+                    (document.doc_id, json.dumps(document.chunk_ids), document.lengths.tobytes(), uuid.uuid4().hex)
+                )
+                self._conn.executemany(
+                    "INSERT INTO postings (doc_id, term, postings) VALUES (?, ?, ?)",
+                    ((document.doc_id, term, postings.tobytes()) for term, postings in document.postings.items())
+                )
+                self._headers.pop(document.doc_id, None)
+            KEYWORD_INDEX_SECONDS.observe(time.perf_counter() - started)
+            logger.info(f"Indexed {len(document.chunk_ids)} chunks and {len(document.postings)} terms "
+                        f"of {document.doc_id}")
+        except Exception as e:
+            logger.error(f"Error indexing {document.doc_id}: {str(e)}")
+            raise
+
+    def delete_document(self, doc_id: str) -> bool:
+        """Remove a document from the index; returns whether it was indexed."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+            deleted = self._conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,)).rowcount
+            self._headers.pop(doc_id, None)
+        return deleted > 0
+
+    def has_document(self, doc_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM documents WHERE doc_id = ?", (doc_id,)).fetchone() is not None
+
+    def _header(self, doc_id: str) -> Optional[Tuple[List[str], np.ndarray]]:
+        """
+        Chunk ids and lengths of the document's current version; the caller holds
+        the lock inside the read transaction that also reads the postings.
+        """
+        row = self._conn.execute("SELECT version FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+        if row is None:
+            self._headers.pop(doc_id, None)
+            return None
+        header = self._headers.get(doc_id)
+        if header is not None and header[0] == row[0]:
+            self._headers.move_to_end(doc_id)
+            return header[1], header[2]
+        row = self._conn.execute(
+            "SELECT version, chunk_ids, lengths FROM documents WHERE doc_id = ?", (doc_id,)
+        ).fetchone()
+        lengths = array("I")
+        lengths.frombytes(row[2])
+        header = (row[0], json.loads(row[1]), np.asarray(lengths, dtype=np.float32))
+        self._headers[doc_id] = header
+        self._headers.move_to_end(doc_id)
+        if len(self._headers) > self.cached_documents:
+            self._headers.popitem(last=False)
+        return header[1], header[2]
+
+    def search(self, doc_id: str, query: str, k: int) -> List[Tuple[str, float]]:
+        """Return up to k (chunk id, BM25 score) pairs of the document, best first."""
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            # One snapshot, so the header and the postings belong to the same version
+            self._conn.execute("BEGIN")
+            try:
+                header = self._header(doc_id)
+                rows = self._conn.execute(
+                    f"SELECT postings FROM postings WHERE doc_id = ? AND term IN ({','.join('?' * len(terms))})",
+                    [doc_id, *terms]
+                ).fetchall() if header is not None else []
+            finally:
+                self._conn.commit()
+        if not rows:
+            return []
+        chunk_ids, lengths = header
+
+        count = len(chunk_ids)
+        norms = self.k1 * (1 - self.b + self.b * lengths / max(float(lengths.mean()), 1.0))
+        scores = np.zeros(count, dtype=np.float32)
+        for (blob,) in rows:
+            postings = np.frombuffer(blob, dtype=np.uint32).reshape(-1, 2)
+            ordinals, frequencies = postings[:, 0], postings[:, 1].astype(np.float32)
+            idf = math.log(1 + (count - len(ordinals) + 0.5) / (len(ordinals) + 0.5))
+            scores[ordinals] += idf * frequencies * (self.k1 + 1) / (frequencies + norms[ordinals])
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(chunk_ids[i], float(scores[i])) for i in matched]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,166 @@
+from contextvars import ContextVar
+from typing import Dict, Optional
+from prometheus_client import Counter, Gauge, Histogram
+from starlette.routing import Match
+import time
+
+# Process-wide Prometheus metrics, registered in the default registry and served at /metrics.
+# Stage timers are bound to their label once here, so the hot path only pays for observe()
+# and, while a request or job is traced, one dict update.
+
+_SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+STAGE_SECONDS = Histogram(
+    "docuquery_stage_seconds",
+    "Time spent in each stage of ingestion and querying",
+    ["stage"],
+    buckets=_SECONDS_BUCKETS
+)
+
+# Seconds per stage of the request or ingestion job running in this context, if one is traced
+STAGE_BREAKDOWN: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_breakdown", default=None)
+
+
+class StageTimer:
+    """Records a stage duration in its histogram and in the current STAGE_BREAKDOWN."""
+
+    def __init__(self, stage: str, histogram=None):
+        self.stage = stage
+        self._histogram = histogram or STAGE_SECONDS.labels(stage)
+
+    def observe(self, seconds: float):
+        self._histogram.observe(seconds)
+        breakdown = STAGE_BREAKDOWN.get()
+        if breakdown is not None:
+            breakdown[self.stage] = breakdown.get(self.stage, 0.0) + seconds
+
+
+# Text extraction (PDF/DOCX parsing, TXT decoding) the chunker waited on, per document
+PARSE_SECONDS = StageTimer("parse")
+# Chunking, per document
+CHUNK_SECONDS = StageTimer("chunk")
+# One embedding provider request, including throttled retries
+EMBED_SECONDS = StageTimer("embed")
+# One write of chunks to the vector store
+VECTOR_WRITE_SECONDS = StageTimer("vector_write")
+# Writing the postings of a document to the keyword index
+KEYWORD_INDEX_SECONDS = StageTimer("keyword_index")
+# Retrieval of the chunks for one question (or one batch of questions)
+RETRIEVAL_SECONDS = StageTimer("retrieval")
+# One LLM completion, start to last token
+LLM_SECONDS = StageTimer("llm")
+
+LLM_FIRST_TOKEN_SECONDS = StageTimer("llm_first_token", Histogram(
+    "docuquery_llm_time_to_first_token_seconds",
+    "Time from sending the prompt to the first answer token",
+    buckets=_SECONDS_BUCKETS
+))
+
+EMBED_BATCH_TEXTS = Histogram(
+    "docuquery_embedding_batch_texts",
+    "Texts per embedding provider request",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+)
+EMBED_BATCH_TOKENS = Histogram(
+    "docuquery_embedding_batch_tokens",
+    "Tokens per embedding provider request",
+    buckets=(10, 100, 500, 1000, 2500, 5000, 10000, 20000, 50000, 100000, 300000)
+)
+EMBED_REQUESTS = Counter(
+    "docuquery_embedding_requests_total",
+    "Embedding provider requests by outcome",
+    ["outcome"]
+)
+EMBED_TOKENS = Counter(
+    "docuquery_embedding_tokens_total",
+    "Tokens sent to the embedding provider"
+)
+
+VECTOR_STORE_RETRIES = Counter(
+    "docuquery_vector_store_retries_total",
+    "Chroma server requests retried, by failure",
+    ["reason"]
+)
+
+CHUNKS_WRITTEN = Counter(
+    "docuquery_vector_chunks_written_total",
+    "Chunks written to the vector store"
+)
+
+ANSWER_CACHE_LOOKUPS = Counter(
+    "docuquery_answer_cache_lookups_total",
+    "Answer cache lookups by tier and result",
+    ["tier", "result"]
+)
+
+INGESTION_JOBS = Counter(
+    "docuquery_ingestion_jobs_total",
+    "Finished ingestion jobs by status",
+    ["status"]
+)
+INGESTION_JOBS_IN_PROGRESS = Gauge(
+    "docuquery_ingestion_jobs_in_progress",
+    "Ingestion jobs being processed"
+)
+
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "docuquery_http_requests_in_progress",
+    "HTTP requests being handled",
+    ["method", "route"]
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "docuquery_http_request_seconds",
+    "HTTP request duration until the response is fully sent",
+    ["method", "route", "status"],
+    buckets=_SECONDS_BUCKETS
+)
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware tracking in-flight requests and request duration per route.
+
+    Requests are labelled with the path template of the route they match (e.g.
+    /api/v1/jobs/{job_id}), so label cardinality stays bounded; paths matching
+    no route are grouped as "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = route_template(scope)
+        method = scope["method"]
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method, route)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_progress.dec()
+            HTTP_REQUEST_SECONDS.labels(method, route, str(status[0])).observe(time.perf_counter() - started)
+
+
+def route_template(scope) -> str:
+    """Path template of the route a request matches, resolved once per request."""
+    template = scope.get("docuquery.route")
+    if template is None:
+        template = "unmatched"
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                template = route.path
+                break
+        scope["docuquery.route"] = template
+    return template
@@ -0,0 +1,627 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import json
+import logging
+import mmap
+import os
+import shutil
+import sqlite3
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_INCLUDE_DEFAULT_GET = ("metadatas", "documents")
+_INCLUDE_DEFAULT_QUERY = ("metadatas", "documents", "distances")
+
+QUANTIZATIONS = ("none", "float16", "int8")
+# Size of the float32 copy scored per block; small enough to stay in the CPU cache
+_BLOCK_BYTES = 512 * 1024
+# Rows re-quantized per step when the quantization of a collection changes
+_REQUANTIZE_ROWS = 8192
+# Every array file a collection may have; compaction writes them under a new generation suffix
+_ARRAY_FILES = ("vectors.f32", "vectors.f16", "vectors.i8", "scales.f32")
+
+
+class MmapCollection:
+    """
+    Vector collection kept in a memory-mapped float32 file with a SQLite sidecar.
+
+    Embeddings are L2-normalized and stored row by row in ``vectors.f32``; the
+    sidecar maps each row to its id, document and metadata. Cosine top-k is a
+    blockwise matrix-vector product followed by ``argpartition``. Deleted rows
+    are tombstoned (dropped from the sidecar and masked out of searches) and the
+    vector files are compacted once the dead fraction exceeds ``compact_ratio``.
+    Compaction writes a new generation of the vector files and switches to it in
+    the same sidecar transaction that renumbers the rows, so a crash leaves
+    either the old or the new layout, never a mix.
+
+    With ``quantization`` set to "float16" or "int8" (per-row scaled), a compact
+    copy of every vector is kept next to the float32 file and scanned instead of
+    it. The best ``rerank_factor * k`` candidates of that first stage are then
+    re-scored with their full-precision vectors, so only those rows of the
+    float32 file are read.
+
+    The methods mirror the subset of Chroma's Collection API used by DBConnector
+    (add, upsert, get, update, delete, query, count) and return results in the
+    same shape. Only equality filters on metadata keys, optionally combined with
+    ``$and``, are supported. A collection must only be opened by one process.
+    """
+
+    def __init__(self, path: str, name: str, metadata: Optional[Dict[str, Any]] = None,
+                 compact_ratio: Optional[float] = None,
+                 quantization: Optional[str] = None,
+                 rerank_factor: Optional[int] = None):
+        """
+        Open (or create) the collection stored in the directory path.
+
+        Args:
+            path: Directory holding the collection files
+            name: Collection name
+            metadata: Collection metadata; its "dimension" fixes the vector size,
+                otherwise the size is taken from the first vectors added
+            compact_ratio: Dead-row fraction that triggers compaction, defaults to VECTOR_STORE_COMPACT_RATIO
+            quantization: "none", "float16" or "int8", defaults to VECTOR_STORE_QUANTIZATION;
+                an existing collection is re-quantized when this changes
+            rerank_factor: Candidates re-scored per result, defaults to VECTOR_STORE_RERANK_FACTOR
+        """
+        self.path = path
+        self.name = name
+        self.compact_ratio = compact_ratio or float(os.getenv("VECTOR_STORE_COMPACT_RATIO", "0.3"))
+        self.quantization = (quantization or os.getenv("VECTOR_STORE_QUANTIZATION", "none")).lower()
+        self.rerank_factor = rerank_factor or int(os.getenv("VECTOR_STORE_RERANK_FACTOR", "4"))
+        if self.quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown vector quantization: {self.quantization}")
+        self._lock = threading.RLock()
+        self._info_path = os.path.join(path, "collection.json")
+        try:
+            os.makedirs(path, exist_ok=True)
+            if os.path.exists(self._info_path):
+                with open(self._info_path) as f:
+                    info = json.load(f)
+            else:
+                info = {"name": name, "metadata": metadata or {}, "dimension": (metadata or {}).get("dimension"),
+                        "quantization": self.quantization}
+                self._write_info(info)
+            self.metadata = info["metadata"]
+            self.dimension: Optional[int] = info["dimension"]
+            stored_quantization = info.get("quantization", "none")
+
+            self._conn = sqlite3.connect(os.path.join(path, "rows.sqlite3"), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS rows ("
+                " row INTEGER PRIMARY KEY,"
+                " id TEXT NOT NULL UNIQUE,"
+                " document TEXT,"
+                " metadata TEXT,"
+                " doc_id TEXT)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_rows_doc_id ON rows(doc_id)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._conn.commit()
+            # The vector files the sidecar's row numbers refer to
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+            self._generation = int(row[0]) if row else 0
+            self._remove_stale_generations()
+
+            # Live rows by id; rows past the highest live row are free to reuse
+            self._rows: Dict[str, int] = dict(self._conn.execute("SELECT id, row FROM rows"))
+            self._size = max(self._rows.values()) + 1 if self._rows else 0
+            self._vectors: Optional[np.memmap] = None
+            self._codes: Optional[np.memmap] = None
+            self._scales: Optional[np.memmap] = None
+            self._alive = np.zeros(0, dtype=bool)
+            if self.dimension is not None:
+                self._open_vectors(max(self._size, 1))
+                self._alive[list(self._rows.values())] = True
+                if stored_quantization != self.quantization:
+                    self._requantize(stored_quantization)
+            elif stored_quantization != self.quantization:
+                self._save_info()
+            logger.info(f"Opened vector collection {name} at {path} with {len(self._rows)} vectors "
+                        f"(quantization: {self.quantization})")
+        except Exception as e:
+            logger.error(f"Error opening vector collection {name}: {str(e)}")
+            raise
+
+    def _write_info(self, info: Dict[str, Any]):
+        tmp_path = self._info_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(info, f)
+        os.replace(tmp_path, self._info_path)
+
+    def _save_info(self):
+        self._write_info({"name": self.name, "metadata": self.metadata, "dimension": self.dimension,
+                          "quantization": self.quantization})
+
+    @staticmethod
+    def _file_name(base: str, generation: int) -> str:
+        # Generation 0 keeps the names of collections written before compaction was generational
+        return base if generation == 0 else f"{base}.{generation}"
+
+    def _array_files(self, quantization: Optional[str] = None,
+                     generation: Optional[int] = None) -> List[Tuple[str, str, Any, Optional[int]]]:
+        """(attribute, file name, dtype, row width) of every array stored for a quantization."""
+        quantization = quantization or self.quantization
+        generation = self._generation if generation is None else generation
+        files = [("_vectors", "vectors.f32", np.float32, self.dimension)]
+        if quantization == "float16":
+            files.append(("_codes", "vectors.f16", np.float16, self.dimension))
+        elif quantization == "int8":
+            files.append(("_codes", "vectors.i8", np.int8, self.dimension))
+            files.append(("_scales", "scales.f32", np.float32, None))
+        return [(attribute, self._file_name(base, generation), dtype, width)
+                for attribute, base, dtype, width in files]
+
+    def _remove_stale_generations(self):
+        """Delete vector files of other generations, left by a compaction that crashed or was superseded."""
+        current = {self._file_name(base, self._generation) for base in _ARRAY_FILES}
+        for file_name in os.listdir(self.path):
+            base = file_name.rsplit(".", 1)[0] if file_name.rsplit(".", 1)[-1].isdigit() else file_name
+            if base in _ARRAY_FILES and file_name not in current:
+                os.remove(os.path.join(self.path, file_name))
+
+    def _open_vectors(self, capacity: int):
+        """Map the vector files, growing them to hold at least capacity rows."""
+        vectors_path = os.path.join(self.path, self._file_name("vectors.f32", self._generation))
+        row_bytes = self.dimension * 4
+        current = os.path.getsize(vectors_path) // row_bytes if os.path.exists(vectors_path) else 0
+        if current < capacity:
+            # Double the files so appends are amortized
+            capacity = max(capacity, current * 2, 1024)
+        else:
+            capacity = current
+        if self._vectors is None or len(self._vectors) != capacity:
+            self._flush()
+            self._vectors = self._codes = self._scales = None
+            for attribute, file_name, dtype, width in self._array_files():
+                file_path = os.path.join(self.path, file_name)
+                needed = capacity * np.dtype(dtype).itemsize * (width or 1)
+                if not os.path.exists(file_path) or os.path.getsize(file_path) < needed:
+                    with open(file_path, "ab") as f:
+                        f.truncate(needed)
+                shape = (capacity, width) if width else (capacity,)
+                setattr(self, attribute, np.memmap(file_path, dtype=dtype, mode="r+", shape=shape))
+            if self._codes is not None and hasattr(mmap, "MADV_RANDOM"):
+                # Only re-scored rows are read from the float32 file, so skip readahead
+                self._vectors._mmap.madvise(mmap.MADV_RANDOM)
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:min(len(self._alive), capacity)] = self._alive[:capacity]
+        self._alive = alive
+
+    def _flush(self):
+        for array in (self._vectors, self._codes, self._scales):
+            if array is not None:
+                array.flush()
+
+    def _quantize(self, vectors: np.ndarray) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """Return the (codes, scales) stored for normalized vectors."""
+        if self.quantization == "float16":
+            return vectors.astype(np.float16), None
+        if self.quantization == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            return np.rint(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+        return None, None
+
+    def _store(self, rows, vectors: np.ndarray):
+        self._vectors[rows] = vectors
+        codes, scales = self._quantize(vectors)
+        if codes is not None:
+            self._codes[rows] = codes
+        if scales is not None:
+            self._scales[rows] = scales
+        self._flush()
+
+    def _requantize(self, previous: str):
+        """Rebuild the quantized arrays from the float32 vectors after the quantization changed."""
+        for _, file_name, _, _ in self._array_files(previous)[1:]:
+            file_path = os.path.join(self.path, file_name)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        if self._codes is not None:
+            for start in range(0, self._size, _REQUANTIZE_ROWS):
+                end = min(self._size, start + _REQUANTIZE_ROWS)
+                codes, scales = self._quantize(np.asarray(self._vectors[start:end]))
+                self._codes[start:end] = codes
+                if scales is not None:
+                    self._scales[start:end] = scales
+            self._flush()
+        self._save_info()
+        logger.info(f"Re-quantized vector collection {self.name} from {previous} to {self.quantization}")
+
+    def _normalize(self, embeddings: Sequence[Sequence[float]]) -> np.ndarray:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2:
+            raise ValueError("Embeddings must be a list of vectors")
+        if self.dimension is None:
+            self.dimension = int(vectors.shape[1])
+            self._save_info()
+            self._open_vectors(1)
+        if vectors.shape[1] != self.dimension:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match collection "
+                             f"dimensionality {self.dimension}")
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def count(self) -> int:
+        return len(self._rows)
+
+    def stats(self) -> Dict[str, Any]:
+        """Row counts and the bytes scanned by a full search versus the float32 vectors."""
+        with self._lock:
+            search_bytes = self._size * self.dimension * 4 if self.dimension else 0
+            if self._codes is not None:
+                search_bytes = self._size * self._codes.itemsize * self.dimension
+                if self._scales is not None:
+                    search_bytes += self._size * self._scales.itemsize
+            return {
+                "vectors": len(self._rows),
+                "rows": self._size,
+                "dead_fraction": self.dead_fraction(),
+                "quantization": self.quantization,
+                "search_bytes": search_bytes,
+                "full_precision_bytes": self._size * (self.dimension or 0) * 4,
+            }
+
+    def add(self, ids: List[str], embeddings: Sequence[Sequence[float]],
+            documents: Optional[List[str]] = None, metadatas: Optional[List[Dict[str, Any]]] = None):
+        """Add new vectors; ids that already exist are skipped, as in Chroma."""
+        with self._lock:
+            existing = [i for i in ids if i in self._rows]
+            if existing:
+                logger.warning(f"Skipping {len(existing)} existing ids in {self.name}")
+                keep = [n for n, i in enumerate(ids) if i not in self._rows]
+                ids = [ids[n] for n in keep]
+                embeddings = [embeddings[n] for n in keep]
+                documents = [documents[n] for n in keep] if documents is not None else None
+                metadatas = [metadatas[n] for n in keep] if metadatas is not None else None
+            if ids:
+                self._write(ids, embeddings, documents, metadatas)
+
+    def upsert(self, ids: List[str], embeddings: Sequence[Sequence[float]],
+               documents: Optional[List[str]] = None, metadatas: Optional[List[Dict[str, Any]]] = None):
+        """Insert vectors, overwriting rows whose id already exists."""
+        with self._lock:
+            self._write(ids, embeddings, documents, metadatas)
+
+    def _write(self, ids, embeddings, documents, metadatas):
+        vectors = self._normalize(embeddings)
+        rows = []
+        for id_ in ids:
+            row = self._rows.get(id_)
+            if row is None:
+                row = self._size
+                self._size += 1
+            rows.append(row)
+        self._open_vectors(self._size)
+
+        # Vectors are flushed before the sidecar commits, so a committed row always has its vector
+        self._store(rows, vectors)
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO rows (row, id, document, metadata, doc_id) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (row, id_,
+                     documents[n] if documents is not None else None,
+                     json.dumps(metadatas[n]) if metadatas is not None else None,
+                     metadatas[n].get("doc_id") if metadatas is not None else None)
+                    for n, (row, id_) in enumerate(zip(rows, ids))
+                ]
+            )
+        self._rows.update(zip(ids, rows))
+        self._alive[rows] = True
+
+    def update(self, ids: List[str], embeddings: Optional[Sequence[Sequence[float]]] = None,
+               documents: Optional[List[str]] = None, metadatas: Optional[List[Dict[str, Any]]] = None):
+        """Update existing rows; metadata keys are merged into the stored metadata, as in Chroma."""
+        with self._lock:
+            missing = [i for i in ids if i not in self._rows]
+            if missing:
+                raise ValueError(f"Cannot update unknown ids in {self.name}: {missing[:5]}")
+            rows = [self._rows[i] for i in ids]
+            if embeddings is not None:
+                self._store(rows, self._normalize(embeddings))
+            stored = self._fetch(rows, with_documents=False)
+            with self._conn:
+                for n, row in enumerate(rows):
+                    if metadatas is not None:
+                        merged = {**(stored[row][2] or {}), **metadatas[n]}
+                        merged = {key: value for key, value in merged.items() if value is not None}
+                        self._conn.execute(
+                            "UPDATE rows SET metadata = ?, doc_id = ? WHERE row = ?",
+                            (json.dumps(merged), merged.get("doc_id"), row)
+                        )
+                    if documents is not None:
+                        self._conn.execute("UPDATE rows SET document = ? WHERE row = ?", (documents[n], row))
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None):
+        """Tombstone the matching rows, compacting the vector files when enough are dead."""
+        with self._lock:
+            rows = self._select_rows(ids, where)
+            if not rows:
+                return
+            with self._conn:
+                self._conn.executemany("DELETE FROM rows WHERE row = ?", [(row,) for row in rows])
+            self._alive[rows] = False
+            removed = set(rows)
+            self._rows = {id_: row for id_, row in self._rows.items() if row not in removed}
+            self._size = max(self._rows.values()) + 1 if self._rows else 0
+            if self._vectors is not None and self.dead_fraction() > self.compact_ratio:
+                self.compact()
+
+    def dead_fraction(self) -> float:
+        """Fraction of the written rows that are tombstones."""
+        return 1.0 - len(self._rows) / self._size if self._size else 0.0
+
+    def compact(self):
+        """
+        Rewrite the vector files without tombstones and renumber the rows.
+
+        The compacted arrays go to files of the next generation. The sidecar
+        transaction that renumbers the rows also records that generation, so it
+        is the commit point: until it commits the old files stay in use, and
+        after it the old files are only garbage.
+        """
+        with self._lock:
+            order = sorted(self._rows.items(), key=lambda item: item[1])
+            old_rows = [row for _, row in order]
+            capacity = max(len(order), 1024)
+            generation = self._generation + 1
+            written = []
+            try:
+                for attribute, file_name, dtype, width in self._array_files(generation=generation):
+                    file_path = os.path.join(self.path, file_name)
+                    shape = (capacity, width) if width else (capacity,)
+                    written.append(file_path)
+                    compacted = np.memmap(file_path, dtype=dtype, mode="w+", shape=shape)
+                    if old_rows:
+                        compacted[:len(old_rows)] = getattr(self, attribute)[old_rows]
+                    compacted.flush()
+                    del compacted
+
+                # Rows only move down and are renumbered in ascending order, so the target row is always free
+                with self._conn:
+                    self._conn.executemany(
+                        "UPDATE rows SET row = ? WHERE row = ?",
+                        [(new, old) for new, old in enumerate(old_rows) if new != old]
+                    )
+                    self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('generation', ?)",
+                                       (str(generation),))
+            except Exception as e:
+                for file_path in written:
+                    if os.path.exists(file_path):
+                        os.remove(file_path)
+                logger.error(f"Error compacting vector collection {self.name}: {str(e)}")
+                raise
+
+            self._flush()
+            self._vectors = self._codes = self._scales = None
+            self._generation = generation
+            self._remove_stale_generations()
+            self._rows = {id_: new for new, (id_, _) in enumerate(order)}
+            self._size = len(order)
+            self._alive = np.zeros(0, dtype=bool)
+            self._open_vectors(capacity)
+            self._alive[:self._size] = True
+            logger.info(f"Compacted vector collection {self.name} to {self._size} vectors")
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, include: Sequence[str] = _INCLUDE_DEFAULT_GET) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._select_rows(ids, where)[:limit]
+            fetched = self._fetch(rows, with_documents="documents" in include)
+            return {
+                "ids": [fetched[row][0] for row in rows],
+                "embeddings": [self._vectors[row].tolist() for row in rows] if "embeddings" in include else None,
+                "documents": [fetched[row][1] for row in rows] if "documents" in include else None,
+                "metadatas": [fetched[row][2] for row in rows] if "metadatas" in include else None,
+            }
+
+    def query(self, query_embeddings: Sequence[Sequence[float]], n_results: int = 10,
+              where: Optional[Dict[str, Any]] = None,
+              include: Sequence[str] = _INCLUDE_DEFAULT_QUERY) -> Dict[str, Any]:
+        """Cosine top-k for each query embedding; distances are 1 - cosine similarity."""
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        with self._lock:
+            if self._vectors is None or not self._rows:
+                return {key: [[] for _ in query_embeddings] for key in results}
+            queries = self._normalize(query_embeddings)
+            candidates = np.asarray(self._select_rows(None, where), dtype=np.int64) if where else None
+            live = len(self._rows) if candidates is None else len(candidates)
+            k = min(n_results, live)
+            shortlist = min(live, k * self.rerank_factor)
+            # The first stage only pays off when it leaves fewer rows to re-score
+            first_stage = self._codes is not None and shortlist < live
+
+            if k <= 0:
+                ranked = [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)) for _ in queries]
+            elif first_stage:
+                approximate = self._scores(self._codes, candidates, queries, self._scales)
+                ranked = []
+                for column, query in enumerate(queries):
+                    top = self._top_k(approximate[:, column], shortlist, candidates is None)
+                    # Read the shortlisted float32 rows in file order
+                    rows = np.sort(top if candidates is None else candidates[top])
+                    exact = self._vectors[rows] @ query
+                    best = self._top_k(exact, k, False)
+                    ranked.append((rows[best], exact[best]))
+            else:
+                scores = self._scores(self._vectors, candidates, queries)
+                ranked = []
+                for column in range(len(queries)):
+                    best = self._top_k(scores[:, column], k, candidates is None)
+                    ranked.append((best if candidates is None else candidates[best], scores[best, column]))
+
+            for rows, similarities in ranked:
+                rows = rows.tolist()
+                fetched = self._fetch(rows, with_documents="documents" in include)
+                results["ids"].append([fetched[row][0] for row in rows])
+                results["documents"].append([fetched[row][1] for row in rows])
+                results["metadatas"].append([fetched[row][2] for row in rows])
+                results["distances"].append((1.0 - similarities).tolist())
+
+        for key in ("documents", "metadatas", "distances"):
+            if key not in include:
+                results[key] = None
+        return results
+
+    def _scores(self, source: np.ndarray, rows: Optional[np.ndarray], queries: np.ndarray,
+                scales: Optional[np.ndarray] = None) -> np.ndarray:
+        """Similarity of each row (all written rows when rows is None) to each query, block by block."""
+        count = self._size if rows is None else len(rows)
+        if rows is None and source.dtype == np.float32:
+            # Contiguous float32 rows are scored in place, without a copy
+            return np.asarray(source[:count]) @ queries.T
+        scores = np.empty((count, len(queries)), dtype=np.float32)
+        block_rows = max(64, _BLOCK_BYTES // (self.dimension * 4))
+        for start in range(0, count, block_rows):
+            end = min(count, start + block_rows)
+            selection = slice(start, end) if rows is None else rows[start:end]
+            block = np.asarray(source[selection], dtype=np.float32) @ queries.T
+            if scales is not None:
+                block *= scales[selection][:, None]
+            scores[start:end] = block
+        return scores
+
+    def _top_k(self, scores: np.ndarray, k: int, mask_dead: bool) -> np.ndarray:
+        """Indices of the k highest scores, best first."""
+        if mask_dead:
+            scores = np.where(self._alive[:len(scores)], scores, -np.inf)
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        return top[np.argsort(-scores[top], kind="stable")]
+
+    def _fetch(self, rows: List[int], with_documents: bool = True) -> Dict[int, Tuple[str, Any, Any]]:
+        """Load (id, document, metadata) of the given rows from the sidecar."""
+        fetched = {}
+        columns = "row, id, document, metadata" if with_documents else "row, id, NULL, metadata"
+        # Stay below SQLite's limit on bound parameters
+        for offset in range(0, len(rows), 500):
+            batch = rows[offset:offset + 500]
+            for row, id_, document, metadata in self._conn.execute(
+                f"SELECT {columns} FROM rows WHERE row IN ({','.join('?' * len(batch))})", batch
+            ):
+                fetched[row] = (id_, document, json.loads(metadata) if metadata is not None else None)
+        return fetched
+
+    def _select_rows(self, ids: Optional[List[str]], where: Optional[Dict[str, Any]]) -> List[int]:
+        """Rows matching ids and a where filter, in row order."""
+        if ids is not None:
+            rows = sorted(self._rows[i] for i in ids if i in self._rows)
+            if not where:
+                return rows
+        if not where:
+            return sorted(self._rows.values())
+        clause, params = self._where_clause(where)
+        matched = [row for (row,) in self._conn.execute(f"SELECT row FROM rows WHERE {clause} ORDER BY row", params)]
+        if ids is not None:
+            allowed = set(rows)
+            matched = [row for row in matched if row in allowed]
+        return matched
+
+    def _where_clause(self, where: Dict[str, Any]) -> Tuple[str, List[Any]]:
+        clauses, params = [], []
+        for key, value in where.items():
+            if key == "$and":
+                parts = [self._where_clause(condition) for condition in value]
+                clauses.append("(" + " AND ".join(part for part, _ in parts) + ")")
+                params.extend(param for _, part_params in parts for param in part_params)
+                continue
+            if key.startswith("$"):
+                raise ValueError(f"Unsupported where operator: {key}")
+            if isinstance(value, dict):
+                if set(value) != {"$eq"}:
+                    raise ValueError(f"Unsupported where condition on {key}: {value}")
+                value = value["$eq"]
+            if key == "doc_id":
+                clauses.append("doc_id = ?")
+            else:
+                clauses.append("json_extract(metadata, ?) = ?")
+                params.append(f'$."{key}"')
+            params.append(value)
+        return " AND ".join(clauses) or "1", params
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._vectors = self._codes = self._scales = None
+            self._conn.close()
+
+
+class MmapVectorClient:
+    """
+    Client for MmapCollection stores, one subdirectory per collection under path.
+
+    Offers the collection management calls of the Chroma client that the app
+    uses, so it can be passed wherever a Chroma client is expected. Opened
+    collections are cached so every caller shares the same instance.
+    """
+
+    def __init__(self, path: Optional[str] = None, quantization: Optional[str] = None):
+        """
+        Open the store at path, defaulting to VECTOR_STORE_PATH.
+
+        Args:
+            quantization: Storage mode of every collection, defaults to VECTOR_STORE_QUANTIZATION
+        """
+        self.path = path or os.getenv("VECTOR_STORE_PATH", "./vector_store")
+        self.quantization = quantization
+        os.makedirs(self.path, exist_ok=True)
+        self._collections: Dict[str, MmapCollection] = {}
+        self._lock = threading.Lock()
+
+    def _collection_path(self, name: str) -> str:
+        if not name or os.sep in name or name.startswith("."):
+            raise ValueError(f"Invalid collection name: {name}")
+        return os.path.join(self.path, name)
+
+    def list_collections(self) -> List[str]:
+        return sorted(
+            name for name in os.listdir(self.path)
+            if os.path.exists(os.path.join(self.path, name, "collection.json"))
+        )
+
+    def get_collection(self, name: str) -> MmapCollection:
+        with self._lock:
+            if name not in self._collections:
+                path = self._collection_path(name)
+                if not os.path.exists(os.path.join(path, "collection.json")):
+                    raise ValueError(f"Collection {name} does not exist.")
+                self._collections[name] = MmapCollection(path, name, quantization=self.quantization)
+            return self._collections[name]
+
+    def create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> MmapCollection:
+        with self._lock:
+            path = self._collection_path(name)
+            if os.path.exists(os.path.join(path, "collection.json")):
+                raise ValueError(f"Collection {name} already exists.")
+            self._collections[name] = MmapCollection(path, name, metadata, quantization=self.quantization)
+            return self._collections[name]
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> MmapCollection:
+        try:
+            return self.get_collection(name)
+        except ValueError:
+            return self.create_collection(name, metadata)
+
+    def delete_collection(self, name: str):
+        with self._lock:
+            collection = self._collections.pop(name, None)
+            if collection is not None:
+                collection.close()
+            path = self._collection_path(name)
+            if not os.path.exists(path):
+                raise ValueError(f"Collection {name} does not exist.")
+            shutil.rmtree(path)
+
+    def close(self):
+        with self._lock:
+            for collection in self._collections.values():
+                collection.close()
+            self._collections.clear()
@@ -0,0 +1,242 @@
+from collections import Counter
+from typing import Any, Dict, List, Optional
+import heapq
+import hmac
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+
+from app.core.metrics import STAGE_BREAKDOWN, route_template
+
+logger = logging.getLogger(__name__)
+
+# Header carrying the admin token that asks for a profile of one request
+PROFILE_HEADER = "x-profile"
+PROFILE_ID_HEADER = "x-profile-id"
+
+
+class StackSampler:
+    """
+    Sampling profiler for every thread of the process.
+
+    A background thread snapshots the Python stacks of all other threads every
+    ``interval_s`` and counts identical stacks. Each stack is rooted at its
+    thread name, so event loop time and thread pool time (vector store calls,
+    SQLite) show up as separate towers of the flame graph.
+    """
+
+    def __init__(self, interval_s: float):
+        self.interval_s = interval_s
+        self.samples = 0
+        self._stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval_s):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """Stacks in the collapsed format read by flamegraph.pl, speedscope and inferno."""
+        return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+
+class ProfileStore:
+    """Keeps the most recent ``keep`` profiles as collapsed-stack files in ``directory``."""
+
+    _NAME = re.compile(r"^[0-9a-f]{32}$")
+
+    def __init__(self, directory: Optional[str] = None, keep: Optional[int] = None):
+        self.directory = directory or os.getenv("PROFILE_DIR", "./profiles")
+        self.keep = keep or int(os.getenv("PROFILE_KEEP", "50"))
+
+    def _path(self, profile_id: str) -> str:
+        return os.path.join(self.directory, f"{profile_id}.collapsed")
+
+    def save(self, profile_id: str, header: Dict[str, Any], collapsed: str):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(profile_id), "w") as f:
+            # Comment lines are skipped by flame graph tools
+            for key, value in header.items():
+                f.write(f"# {key}: {value}\n")
+            f.write(collapsed)
+        for stale in self.list()[self.keep:]:
+            os.remove(self._path(stale["profile_id"]))
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Stored profiles, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in os.listdir(self.directory):
+            profile_id, extension = os.path.splitext(name)
+            if extension == ".collapsed" and self._NAME.match(profile_id):
+                path = self._path(profile_id)
+                profiles.append({"profile_id": profile_id, "created_at": os.path.getmtime(path),
+                                 "bytes": os.path.getsize(path)})
+        return sorted(profiles, key=lambda profile: profile["created_at"], reverse=True)
+
+    def read(self, profile_id: str) -> Optional[str]:
+        if not self._NAME.match(profile_id) or not os.path.exists(self._path(profile_id)):
+            return None
+        with open(self._path(profile_id)) as f:
+            return f.read()
+
+
+class SlowRequestLog:
+    """
+    The slowest ``size`` requests and ingestion jobs seen in the last
+    ``window_s`` seconds, each with its per-stage time breakdown.
+    """
+
+    def __init__(self, size: Optional[int] = None, window_s: Optional[float] = None):
+        self.size = size or int(os.getenv("SLOW_REQUEST_LOG_SIZE", "20"))
+        self.window_s = window_s or float(os.getenv("SLOW_REQUEST_WINDOW_SECONDS", "3600"))
+        # Min-heap on duration, so the fastest retained entry is evicted first
+        self._heap: List[tuple] = []
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, entry: Dict[str, Any]):
+        now = time.time()
+        with self._lock:
+            self._drop_expired(now)
+            if len(self._heap) >= self.size and seconds <= self._heap[0][0]:
+                return
+            self._counter += 1
+            heapq.heappush(self._heap, (seconds, self._counter, {**entry, "seconds": seconds, "finished_at": now}))
+            if len(self._heap) > self.size:
+                heapq.heappop(self._heap)
+
+    def _drop_expired(self, now: float):
+        kept = [item for item in self._heap if now - item[2]["finished_at"] <= self.window_s]
+        if len(kept) != len(self._heap):
+            heapq.heapify(kept)
+            self._heap = kept
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Retained entries, slowest first."""
+        with self._lock:
+            self._drop_expired(time.time())
+            return [entry for _, _, entry in sorted(self._heap, key=lambda item: item[0], reverse=True)]
+
+
+# Shared by the middleware, the ingestion workers and the debug routes of this process
+profile_store = ProfileStore()
+slow_requests = SlowRequestLog()
+# The sampler sees every thread, so only one request is profiled at a time
+_profiling = threading.Lock()
+
+
+def profiling_token() -> Optional[str]:
+    """Admin token that unlocks per-request profiles and the debug routes; None disables them."""
+    return os.getenv("PROFILING_TOKEN") or None
+
+
+def is_admin(token: Optional[str]) -> bool:
+    expected = profiling_token()
+    return expected is not None and token is not None and hmac.compare_digest(token, expected)
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware recording the stage breakdown of every request and
+    profiling the ones that ask for it.
+
+    Every request runs with a fresh stage breakdown (filled by the stage timers
+    in app.core.metrics) and is offered to the slow request log when it ends.
+    A request is profiled when it carries ``X-Profile: <PROFILING_TOKEN>`` or is
+    picked by PROFILING_SAMPLE_RATE; its response then has an ``X-Profile-Id``
+    header naming the collapsed-stack report stored once the response is sent.
+    """
+
+    def __init__(self, app, sample_rate: Optional[float] = None, interval_ms: Optional[float] = None):
+        self.app = app
+        self.sample_rate = sample_rate if sample_rate is not None else float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+        self.interval_s = (interval_ms or float(os.getenv("PROFILING_INTERVAL_MS", "5"))) / 1000
+
+    def _wants_profile(self, scope) -> bool:
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return True
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER.encode():
+                return is_admin(value.decode("latin-1"))
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        sampler = None
+        if self._wants_profile(scope) and _profiling.acquire(blocking=False):
+            sampler = StackSampler(self.interval_s)
+            sampler.start()
+        profile_id = uuid.uuid4().hex if sampler else None
+        status = [500]
+
+        async def send_with_profile(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if profile_id:
+                    message = {**message, "headers": [*message.get("headers", []),
+                                                      (PROFILE_ID_HEADER.encode(), profile_id.encode())]}
+            await send(message)
+
+        breakdown: Dict[str, float] = {}
+        token = STAGE_BREAKDOWN.set(breakdown)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            seconds = time.perf_counter() - started
+            STAGE_BREAKDOWN.reset(token)
+            entry = {
+                "kind": "request",
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route_template(scope),
+                "status": status[0],
+                "stages": breakdown,
+                "profile_id": profile_id,
+            }
+            slow_requests.record(seconds, entry)
+            if sampler is not None:
+                try:
+                    sampler.stop()
+                    profile_store.save(profile_id, {**entry, "seconds": round(seconds, 6),
+                                                    "samples": sampler.samples,
+                                                    "interval_ms": self.interval_s * 1000},
+                                       sampler.collapsed())
+                    logger.info(f"Stored profile {profile_id} of {scope['method']} {scope['path']} "
+                                f"({seconds * 1000:.1f} ms, {sampler.samples} samples)")
+                except Exception as e:
+                    logger.error(f"Error storing profile {profile_id}: {str(e)}")
+                finally:
+                    _profiling.release()
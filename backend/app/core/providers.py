@@ -0,0 +1,138 @@
+from typing import TYPE_CHECKING, List, Optional
+from langchain_core.embeddings import Embeddings
+from app.core.keyword_index import tokenize
+import asyncio
+import hashlib
+import logging
+import os
+import time
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_PROVIDERS = ("openai", "hashing")
+LLM_PROVIDERS = ("openai", "fake")
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic local embeddings for offline benchmarks and load tests.
+
+    Each term of the text (as tokenized by the keyword index) is hashed to one
+    signed dimension and the counts are L2-normalized, so texts sharing terms
+    get similar vectors. Every request sleeps ``latency_s`` plus
+    ``per_text_latency_s`` per text to model a remote provider.
+    """
+
+    def __init__(self,
+                 dimension: Optional[int] = None,
+                 latency_s: Optional[float] = None,
+                 per_text_latency_s: float = 0.0):
+        """
+        Args:
+            dimension: Vector size, defaults to EMBEDDING_DIMENSION
+            latency_s: Delay of every request, defaults to HASHING_EMBEDDING_LATENCY_MS
+            per_text_latency_s: Additional delay per embedded text
+        """
+        self.dimension = dimension or int(os.getenv("EMBEDDING_DIMENSION", "1536"))
+        if latency_s is None:
+            latency_s = float(os.getenv("HASHING_EMBEDDING_LATENCY_MS", "0")) / 1000
+        self.latency_s = latency_s
+        self.per_text_latency_s = per_text_latency_s
+        # Namespaces the embedding cache, like the model name of a remote provider
+        self.model = f"hashing-{self.dimension}"
+        self.calls = 0
+        self.texts_embedded = 0
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for term in tokenize(text):
+            digest = int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[digest % self.dimension] += 1.0 if digest >> 63 else -1.0
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            # Texts without terms still need a valid unit vector
+            vector[0], norm = 1.0, 1.0
+        return (vector / norm).tolist()
+
+    def _delay(self, texts: List[str]) -> float:
+        self.calls += 1
+        self.texts_embedded += len(texts)
+        return self.latency_s + self.per_text_latency_s * len(texts)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self._delay(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self._delay(texts))
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+def _provider(value: Optional[str], variable: str, choices) -> str:
+    provider = (value or os.getenv(variable, "openai")).lower()
+    if provider not in choices:
+        raise ValueError(f"Unknown {variable}: {provider}")
+    return provider
+
+
+def requires_openai_key() -> bool:
+    """Whether the configured providers call the OpenAI API."""
+    return (_provider(None, "EMBEDDING_PROVIDER", EMBEDDING_PROVIDERS) == "openai"
+            or _provider(None, "LLM_PROVIDER", LLM_PROVIDERS) == "openai")
+
+
+def create_embeddings(provider: Optional[str] = None, **openai_kwargs) -> Embeddings:
+    """
+    Create the embeddings client selected by EMBEDDING_PROVIDER.
+
+    "openai" (the default) returns OpenAIEmbeddings with openai_kwargs applied;
+    "hashing" returns a local HashingEmbeddings.
+    """
+    provider = _provider(provider, "EMBEDDING_PROVIDER", EMBEDDING_PROVIDERS)
+    if provider == "hashing":
+        embeddings = HashingEmbeddings()
+        logger.info(f"Using local hashing embeddings ({embeddings.dimension} dimensions, "
+                    f"{embeddings.latency_s * 1000:.0f} ms latency)")
+        return embeddings
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(
+        openai_api_key=os.getenv("OPENAI_API_KEY"),
+        model="text-embedding-ada-002",
+        **openai_kwargs
+    )
+
+
+def create_chat_model(provider: Optional[str] = None) -> "BaseChatModel":
+    """
+    Create the chat model selected by LLM_PROVIDER.
+
+    "openai" (the default) returns ChatOpenAI; "fake" returns a local
+    FakeStreamingChatModel paced by FAKE_LLM_TOKENS_PER_SECOND,
+    FAKE_LLM_FIRST_TOKEN_MS, FAKE_LLM_PREFILL_TOKENS_PER_SECOND and
+    FAKE_LLM_ANSWER_TOKENS.
+    """
+    provider = _provider(provider, "LLM_PROVIDER", LLM_PROVIDERS)
+    if provider == "fake":
+        # Chat model classes are slow to import, so neither is loaded until chosen
+        from app.core.fake_chat_model import FakeStreamingChatModel
+        llm = FakeStreamingChatModel(
+            tokens_per_second=float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "0")),
+            first_token_latency_s=float(os.getenv("FAKE_LLM_FIRST_TOKEN_MS", "0")) / 1000,
+            prefill_tokens_per_second=float(os.getenv("FAKE_LLM_PREFILL_TOKENS_PER_SECOND", "0")),
+            answer_tokens=int(os.getenv("FAKE_LLM_ANSWER_TOKENS", "64"))
+        )
+        logger.info(f"Using fake chat model ({llm.tokens_per_second:g} tokens/s)")
+        return llm
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
@@ -0,0 +1,421 @@
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
+from starlette.concurrency import run_in_threadpool
+from app.core.answer_cache import AnswerCache, normalize_question, question_terms
+from app.core.context_builder import PASSAGE_SEPARATOR, ContextBuilder
+from app.core.db_connector import DBConnector
+from app.core.embedding_processor import EmbeddingProcessor
+from app.core.keyword_index import KeywordIndex
+from app.core.metrics import LLM_FIRST_TOKEN_SECONDS, LLM_SECONDS, RETRIEVAL_SECONDS
+import asyncio
+import functools
+import hashlib
+import logging
+import os
+import time
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.messages import BaseMessage
+
+logger = logging.getLogger(__name__)
+
+# The "stuff" chat prompt of langchain's question answering chain (which RetrievalQA
+# used), defined here so answering does not import langchain.chains
+_SYSTEM_TEMPLATE = """Use the following pieces of context to answer the user's question. 
+If you don't know the answer, just say that you don't know, don't try to make up an answer.
+----------------
+{context}"""
+
+# Namespaces cached answers, so changing the prompt retires them
+PROMPT_VERSION = hashlib.sha256(_SYSTEM_TEMPLATE.encode("utf-8")).hexdigest()[:12]
+
+
+@functools.lru_cache(maxsize=None)
+def chat_prompt():
+    """The answer prompt, built on first use so importing the pipeline stays cheap."""
+    from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate, SystemMessagePromptTemplate
+    return ChatPromptTemplate.from_messages([
+        SystemMessagePromptTemplate.from_template(_SYSTEM_TEMPLATE),
+        HumanMessagePromptTemplate.from_template("{question}"),
+    ])
+
+
+@dataclass
+class RetrievalResult:
+    """
+    Chunks retrieved for one question, in rank order.
+
+    distances are the vector distances (None for chunks only found by keyword);
+    scores are BM25 scores in keyword mode and fused RRF scores in hybrid mode.
+
+    With an answer cache, generation is the document's cache generation when
+    retrieval started, and cached_answer is set when the question was answered
+    from the cache instead of retrieved.
+    """
+    ids: List[str] = field(default_factory=list)
+    documents: List[str] = field(default_factory=list)
+    metadatas: List[Dict[str, Any]] = field(default_factory=list)
+    distances: List[Optional[float]] = field(default_factory=list)
+    scores: List[float] = field(default_factory=list)
+    context_id: Optional[str] = None
+    generation: Optional[int] = None
+    cached_answer: Optional[str] = None
+
+    def to_documents(self) -> List["Document"]:
+        from langchain_core.documents import Document
+        return [
+            Document(page_content=text, metadata=metadata or {})
+            for text, metadata in zip(self.documents, self.metadatas)
+        ]
+
+    def sources(self) -> List[Dict[str, Any]]:
+        """Source citations in the shape returned by the query endpoints."""
+        return [
+            {
+                "doc": (metadata or {}).get("doc_id", ""),
+                "page": (metadata or {}).get("page", 0),
+                "text": text
+            }
+            for text, metadata in zip(self.documents, self.metadatas)
+        ]
+
+    def to_cache(self) -> Dict[str, Any]:
+        """The chunks, as stored with an exact-tier answer."""
+        return {"ids": self.ids, "documents": self.documents, "metadatas": self.metadatas,
+                "distances": self.distances, "scores": self.scores}
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists: each id scores the sum of 1 / (k + rank) over the lists it appears in."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, 1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class QueryPipeline:
+    """
+    Answers a question against the chunks of one document.
+
+    Retrieval runs in one of three modes (RETRIEVAL_MODE):
+
+    - dense: the question is embedded once and searched once in the vector store
+    - hybrid: the top ``candidates`` chunks of the vector search and of a BM25
+      search of the keyword index are fused with reciprocal-rank fusion
+    - keyword: BM25 only, so retrieval never calls the embedding API; falls
+      back to dense when no chunk contains a query term
+
+    Without a context builder the top_k retrieved chunks are "stuffed" into the
+    same prompt RetrievalQA used. With one, the builder's ``candidates`` chunks
+    are retrieved instead and condensed into passages that fit its token budget
+    (overlapping chunks merged, near-duplicates dropped, MMR selection). Either
+    way the chunks in the prompt are the sources of the response. Batches of
+    questions share one embedding request and one search per document, and
+    their answers are generated concurrently.
+
+    With an answer cache, a question asked before about the same document is
+    answered with the stored answer and sources without retrieval, and one
+    whose retrieved context was answered before skips the LLM.
+    """
+
+    MODES = ("dense", "hybrid", "keyword")
+
+    def __init__(self,
+                 embedding_processor: EmbeddingProcessor,
+                 db_connector: DBConnector,
+                 llm: "BaseChatModel",
+                 top_k: int = 3,
+                 keyword_index: Optional[KeywordIndex] = None,
+                 mode: Optional[str] = None,
+                 candidates: Optional[int] = None,
+                 rrf_k: Optional[int] = None,
+                 answer_concurrency: Optional[int] = None,
+                 context_builder: Optional[ContextBuilder] = None,
+                 answer_cache: Optional[AnswerCache] = None):
+        """
+        Args:
+            keyword_index: BM25 index of the ingested chunks, required by the hybrid and keyword modes
+            mode: Retrieval mode, defaults to RETRIEVAL_MODE
+            candidates: Depth of each ranking fused in hybrid mode, defaults to RETRIEVAL_CANDIDATES
+            rrf_k: Rank offset of reciprocal-rank fusion, defaults to RRF_K
+            answer_concurrency: LLM calls in flight per batch, defaults to BATCH_ANSWER_CONCURRENCY
+            context_builder: Condenses a larger candidate set into the prompt context
+            answer_cache: Stores answers by question and by retrieved context
+        """
+        self.embedding_processor = embedding_processor
+        self.db_connector = db_connector
+        self.llm = llm
+        self.top_k = top_k
+        self.keyword_index = keyword_index
+        self.mode = (mode or os.getenv("RETRIEVAL_MODE", "dense")).lower()
+        self.candidates = candidates or int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+        self.rrf_k = rrf_k or int(os.getenv("RRF_K", "60"))
+        self.answer_concurrency = answer_concurrency or int(os.getenv("BATCH_ANSWER_CONCURRENCY", "8"))
+        self.context_builder = context_builder
+        # Chunks each retrieval returns: the prompt's chunks, or the builder's candidates
+        self.context_size = context_builder.candidates if context_builder else top_k
+        if self.mode not in self.MODES:
+            raise ValueError(f"Unknown RETRIEVAL_MODE: {self.mode}")
+        if self.mode != "dense" and keyword_index is None:
+            raise ValueError(f"RETRIEVAL_MODE={self.mode} requires a keyword index")
+
+        self.answer_cache = answer_cache
+        model = getattr(llm, "model_name", None) or getattr(llm, "_llm_type", type(llm).__name__)
+        # Both tiers depend on the model and prompt; the exact tier also on what retrieval would return
+        self._answer_namespace = f"{model}:{PROMPT_VERSION}"
+        self._retrieval_config = f"{self.mode}:{self.context_size}:{self.candidates}:{self.rrf_k}"
+        if context_builder is not None:
+            self._retrieval_config += (f":{context_builder.token_budget}:{context_builder.mmr_lambda}"
+                                       f":{context_builder.duplicate_threshold}")
+
+    async def retrieve(self, question: str, context_id: str) -> RetrievalResult:
+        """Retrieve the chunks of one document that are most relevant to a question."""
+        result = (await self.retrieve_batch([(question, context_id)]))[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def retrieve_batch(self,
+                             questions: Sequence[Tuple[str, str]]) -> List[Union[RetrievalResult, Exception]]:
+        """
+        Retrieve chunks for many (question, context_id) pairs at once.
+
+        All questions that need a vector search are embedded in one request and
+        searched with one call per document. Results come back in input order; a
+        question that failed gets its exception instead of a result.
+        """
+        started = time.perf_counter()
+        results: List[Union[RetrievalResult, Exception, None]] = [None] * len(questions)
+        generations: List[Optional[int]] = [None] * len(questions)
+        if self.answer_cache is not None:
+            # SQLite reads, one threadpool call for the whole batch
+            cached = await run_in_threadpool(
+                lambda: [self._cached_retrieval(question, context_id) for question, context_id in questions]
+            )
+            for i, (generation, result) in enumerate(cached):
+                generations[i], results[i] = generation, result
+        pending = [i for i, result in enumerate(results) if result is None]
+
+        dense_wanted = pending
+        if self.mode == "keyword":
+            dense_wanted = []
+            for i in pending:
+                question, context_id = questions[i]
+                try:
+                    hits = await run_in_threadpool(self.keyword_index.search, context_id, question, self.context_size)
+                    if hits:
+                        results[i] = await self._fetch(context_id, hits, {})
+                        continue
+                except Exception as e:
+                    results[i] = e
+                    continue
+                logger.debug(f"No keyword match in {context_id}, falling back to dense retrieval")
+                dense_wanted.append(i)
+
+        n_results = self.candidates if self.mode == "hybrid" else self.context_size
+        dense = await self._dense_batch([questions[i] for i in dense_wanted], n_results)
+        for i, retrieval in zip(dense_wanted, dense):
+            if self.mode == "hybrid" and not isinstance(retrieval, Exception):
+                try:
+                    retrieval = await self._fuse(*questions[i], retrieval)
+                except Exception as e:
+                    retrieval = e
+            results[i] = retrieval
+        for i in pending:
+            if isinstance(results[i], RetrievalResult):
+                if self.context_builder is not None:
+                    results[i] = self._build_context(results[i])
+                results[i].context_id = questions[i][1]
+                results[i].generation = generations[i]
+        RETRIEVAL_SECONDS.observe(time.perf_counter() - started)
+        return results
+
+    def _exact_key(self, question: str, context_id: str) -> str:
+        return AnswerCache.make_key("exact", self._answer_namespace, self._retrieval_config,
+                                    context_id, normalize_question(question))
+
+    def _retrieval_key(self, question: str, retrieval: RetrievalResult) -> str:
+        # The passage texts as well as the chunk ids, since merged passages also depend on chunk offsets
+        return AnswerCache.make_key("retrieval", self._answer_namespace, question_terms(question),
+                                    *retrieval.ids, *retrieval.documents)
+
+    def _cached_retrieval(self, question: str, context_id: str) -> Tuple[int, Optional[RetrievalResult]]:
+        """The document's cache generation, and its cached answer to the question if there is one."""
+        generation = self.answer_cache.generation(context_id)
+        cached = self.answer_cache.get(self._exact_key(question, context_id))
+        if cached is None:
+            return generation, None
+        return generation, RetrievalResult(**cached["retrieval"], context_id=context_id, generation=generation,
+                                           cached_answer=cached["answer"])
+
+    def _cached_answer(self, question: str, retrieval: RetrievalResult) -> Optional[str]:
+        """The cached answer for the question, or for its retrieved context."""
+        if retrieval.cached_answer is not None or self.answer_cache is None or retrieval.generation is None:
+            return retrieval.cached_answer
+        cached = self.answer_cache.get(self._retrieval_key(question, retrieval))
+        if cached is None:
+            return None
+        # Repeats of this question can now skip retrieval as well
+        self.answer_cache.put(self._exact_key(question, retrieval.context_id), retrieval.context_id,
+                              retrieval.generation, cached["answer"], retrieval.to_cache())
+        return cached["answer"]
+
+    def _remember(self, question: str, retrieval: RetrievalResult, answer: str):
+        """Store a generated answer in both tiers of the answer cache."""
+        if self.answer_cache is None or retrieval.generation is None:
+            return
+        self.answer_cache.put(self._exact_key(question, retrieval.context_id), retrieval.context_id,
+                              retrieval.generation, answer, retrieval.to_cache())
+        self.answer_cache.put(self._retrieval_key(question, retrieval), retrieval.context_id,
+                              retrieval.generation, answer)
+
+    def _build_context(self, retrieval: RetrievalResult) -> RetrievalResult:
+        """Replace the candidates by the passages the context builder packs into its budget."""
+        passages = self.context_builder.build(retrieval.ids, retrieval.documents, retrieval.metadatas)
+        return RetrievalResult(
+            ids=[passage.ids[0] for passage in passages],
+            documents=[passage.text for passage in passages],
+            metadatas=[passage.metadata for passage in passages],
+            distances=[retrieval.distances[passage.rank] if passage.rank < len(retrieval.distances) else None
+                       for passage in passages],
+            scores=[retrieval.scores[passage.rank] if passage.rank < len(retrieval.scores) else 0.0
+                    for passage in passages]
+        )
+
+    async def _dense_batch(self, questions: Sequence[Tuple[str, str]],
+                           n_results: int) -> List[Union[RetrievalResult, Exception]]:
+        """Vector search for each question: one embedding request, one search per document."""
+        if not questions:
+            return []
+        try:
+            embeddings = await self.embedding_processor.process_queries([question for question, _ in questions])
+        except Exception as e:
+            logger.error(f"Error embedding {len(questions)} questions: {str(e)}")
+            return [e] * len(questions)
+
+        by_context: Dict[str, List[int]] = {}
+        for i, (_, context_id) in enumerate(questions):
+            by_context.setdefault(context_id, []).append(i)
+        results: List[Union[RetrievalResult, Exception, None]] = [None] * len(questions)
+        for context_id, indexes in by_context.items():
+            try:
+                found = await self.db_connector.query_documents_batch(
+                    query_embeddings=[embeddings[i] for i in indexes],
+                    doc_id=context_id,
+                    n_results=n_results
+                )
+                for i, result in zip(indexes, found):
+                    results[i] = RetrievalResult(**result)
+            except Exception as e:
+                for i in indexes:
+                    results[i] = e
+        return results
+
+    async def _fuse(self, question: str, context_id: str, dense: RetrievalResult) -> RetrievalResult:
+        """Fuse the vector candidates with the BM25 candidates of the question."""
+        hits = await run_in_threadpool(self.keyword_index.search, context_id, question, self.candidates)
+        if not hits:
+            return self._truncate(dense)
+        fused = reciprocal_rank_fusion([dense.ids, [chunk_id for chunk_id, _ in hits]],
+                                       self.rrf_k)[:self.context_size]
+        known = {
+            chunk_id: (text, metadata, distance)
+            for chunk_id, text, metadata, distance in zip(dense.ids, dense.documents, dense.metadatas, dense.distances)
+        }
+        return await self._fetch(context_id, fused, known)
+
+    def _truncate(self, retrieval: RetrievalResult) -> RetrievalResult:
+        return RetrievalResult(
+            ids=retrieval.ids[:self.context_size],
+            documents=retrieval.documents[:self.context_size],
+            metadatas=retrieval.metadatas[:self.context_size],
+            distances=retrieval.distances[:self.context_size]
+        )
+
+    async def _fetch(self,
+                     context_id: str,
+                     ranked: List[Tuple[str, float]],
+                     known: Dict[str, Tuple]) -> RetrievalResult:
+        """Build a result for ranked (chunk id, score) pairs, loading chunks the vector search did not return."""
+        missing = [chunk_id for chunk_id, _ in ranked if chunk_id not in known]
+        if missing:
+            chunks = await run_in_threadpool(self.db_connector.get_chunks, context_id, missing)
+            for chunk_id, text, metadata in zip(chunks["ids"], chunks["documents"], chunks["metadatas"]):
+                known[chunk_id] = (text, metadata, None)
+        # Chunks indexed by keyword but no longer in the vector store are dropped
+        ranked = [(chunk_id, score) for chunk_id, score in ranked if chunk_id in known]
+        return RetrievalResult(
+            ids=[chunk_id for chunk_id, _ in ranked],
+            documents=[known[chunk_id][0] for chunk_id, _ in ranked],
+            metadatas=[known[chunk_id][1] for chunk_id, _ in ranked],
+            distances=[known[chunk_id][2] for chunk_id, _ in ranked],
+            scores=[score for _, score in ranked]
+        )
+
+    def build_messages(self, question: str, retrieval: RetrievalResult) -> List["BaseMessage"]:
+        """Format the retrieved chunks and the question as chat messages."""
+        context = PASSAGE_SEPARATOR.join(retrieval.documents)
+        return chat_prompt().format_messages(context=context, question=question)
+
+    async def answer(self, question: str, retrieval: RetrievalResult) -> str:
+        """Generate an answer from already retrieved chunks, unless it is cached."""
+        try:
+            cached = await run_in_threadpool(self._cached_answer, question, retrieval)
+            if cached is not None:
+                return cached
+            started = time.perf_counter()
+            message = await self.llm.ainvoke(self.build_messages(question, retrieval))
+            # Without streaming the first token arrives with the whole answer
+            elapsed = time.perf_counter() - started
+            LLM_SECONDS.observe(elapsed)
+            LLM_FIRST_TOKEN_SECONDS.observe(elapsed)
+            await run_in_threadpool(self._remember, question, retrieval, message.content)
+            return message.content
+        except Exception as e:
+            logger.error(f"Error generating answer: {str(e)}")
+            raise
+
+    async def answer_batch(self,
+                           items: Sequence[Tuple[str, RetrievalResult]],
+                           concurrency: Optional[int] = None) -> List[Union[str, Exception]]:
+        """
+        Generate answers for (question, retrieval) pairs with at most
+        ``concurrency`` (default BATCH_ANSWER_CONCURRENCY) LLM calls in flight.
+
+        Answers come back in input order; a failed completion yields its exception.
+        """
+        semaphore = asyncio.Semaphore(concurrency or self.answer_concurrency)
+
+        async def limited(question: str, retrieval: RetrievalResult) -> str:
+            async with semaphore:
+                return await self.answer(question, retrieval)
+
+        return await asyncio.gather(*(limited(question, retrieval) for question, retrieval in items),
+                                    return_exceptions=True)
+
+    async def stream_answer(self, question: str, retrieval: RetrievalResult) -> AsyncIterator[str]:
+        """Yield answer tokens from already retrieved chunks as the LLM produces them; a cached answer comes whole."""
+        try:
+            cached = await run_in_threadpool(self._cached_answer, question, retrieval)
+            if cached is not None:
+                yield cached
+                return
+            started = time.perf_counter()
+            first_token = True
+            tokens = []
+            async for chunk in self.llm.astream(self.build_messages(question, retrieval)):
+                if chunk.content:
+                    if first_token:
+                        LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started)
+                        first_token = False
+                    tokens.append(chunk.content)
+                    yield chunk.content
+            LLM_SECONDS.observe(time.perf_counter() - started)
+            # Only a completely streamed answer is cached
+            await run_in_threadpool(self._remember, question, retrieval, "".join(tokens))
+        except Exception as e:
+            logger.error(f"Error streaming answer: {str(e)}")
+            raise
@@ -0,0 +1,229 @@
+from bisect import bisect_right
+from typing import Iterator, List, Optional, Tuple
+from typing import TYPE_CHECKING
+import logging
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkSpan:
+    """
+    A chunk described by offsets into its source text.
+
+    The chunk string is only materialized when ``text`` is accessed. ``start`` and
+    ``end`` index into ``source``; ``char_start`` and ``char_end`` are offsets in
+    the whole document, which differ from ``start``/``end`` when the document was
+    chunked incrementally.
+    """
+
+    __slots__ = ("source", "start", "end", "char_start", "char_end", "page")
+
+    def __init__(self, source: str, start: int, end: int,
+                 char_start: Optional[int] = None, char_end: Optional[int] = None,
+                 page: Optional[int] = None):
+        self.source = source
+        self.start = start
+        self.end = end
+        self.char_start = start if char_start is None else char_start
+        self.char_end = end if char_end is None else char_end
+        self.page = page
+
+    @property
+    def text(self) -> str:
+        return self.source[self.start:self.end]
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def __repr__(self) -> str:
+        return f"ChunkSpan(char_start={self.char_start}, char_end={self.char_end}, page={self.page})"
+
+
+class TextChunker:
+    """
+    Linear-time chunker that emits offset spans instead of string copies.
+
+    Each chunk is a window of at most ``chunk_size`` characters that ends just
+    before the last highest-priority separator past the previous chunk's end
+    (paragraph, then line, then word, then a hard cut), mirroring the separator
+    priority of LangChain's RecursiveCharacterTextSplitter. As in LangChain, the
+    overlap is made of whole pieces at the level the chunk was cut on: the next
+    chunk starts at the earliest occurrence of that separator inside the last
+    ``chunk_overlap`` characters, so a chunk cut between paragraphs only overlaps
+    with paragraphs short enough to fit, while a chunk cut between words
+    overlaps by whole words. Leading and trailing whitespace is trimmed from every
+    span.
+    """
+
+    def __init__(self,
+                 chunk_size: int = 1000,
+                 chunk_overlap: int = 200,
+                 separators: Optional[List[str]] = None):
+        if chunk_overlap >= chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = separators if separators is not None else ["\n\n", "\n", " ", ""]
+
+    def split_text(self, text: str) -> List[str]:
+        """Split text into chunk strings."""
+        return [span.text for span in self.iter_spans(text)]
+
+    def split_documents(self, documents: List["Document"]) -> List["Document"]:
+        """Split LangChain documents, recording each chunk's character offsets in its metadata."""
+        from langchain_core.documents import Document
+        splits = []
+        for document in documents:
+            for span in self.iter_spans(document.page_content):
+                splits.append(Document(
+                    page_content=span.text,
+                    metadata={**document.metadata, "char_start": span.char_start, "char_end": span.char_end}
+                ))
+        return splits
+
+    def iter_spans(self, text: str, page_starts: Optional[List[Tuple[int, int]]] = None) -> Iterator[ChunkSpan]:
+        """
+        Yield the chunk spans of a complete text.
+
+        Args:
+            text: The text to chunk
+            page_starts: Optional sorted (offset, page) pairs used to tag each span
+                with the page its first character belongs to
+        """
+        offsets = [offset for offset, _ in page_starts] if page_starts else None
+        for start, end in self.scan(text, 0, 0, final=True)[0]:
+            page = page_starts[bisect_right(offsets, start) - 1][1] if offsets and start >= offsets[0] else None
+            yield ChunkSpan(text, start, end, page=page)
+
+    def scan(self, text: str, start: int, floor: int, final: bool) -> Tuple[List[Tuple[int, int]], int, int]:
+        """
+        Chunk text from position start.
+
+        floor is the end of the previous chunk: the next chunk must extend past it,
+        otherwise a separator inside the overlap would produce a chunk that is
+        nothing but overlap. When final is False, scanning stops as soon as a full
+        chunk_size window is no longer available, because more text could still
+        change where the next chunk ends.
+
+        Returns:
+            The trimmed (start, end) spans, and the start and floor to resume from
+        """
+        spans = []
+        length = len(text)
+        while start < length:
+            limit = start + self.chunk_size
+            if limit >= length:
+                if not final:
+                    break
+                end = length
+                separator = None
+            else:
+                end, separator = self._break_before(text, max(start, floor), limit)
+
+            span_start, span_end = start, end
+            while span_start < span_end and text[span_start].isspace():
+                span_start += 1
+            while span_end > span_start and text[span_end - 1].isspace():
+                span_end -= 1
+            if span_start < span_end:
+                spans.append((span_start, span_end))
+
+            if end >= length:
+                start = floor = length
+                break
+            start, floor = self._overlap_start(text, start, end, separator), end
+        return spans, start, floor
+
+    def _break_before(self, text: str, floor: int, limit: int) -> Tuple[int, str]:
+        """End the chunk just before the last highest-priority separator between floor and limit."""
+        for separator in self.separators:
+            if not separator:
+                return limit, separator
+            index = text.rfind(separator, floor + 1, limit)
+            if index != -1:
+                return index, separator
+        return limit, ""
+
+    def _overlap_start(self, text: str, start: int, end: int, separator: str) -> int:
+        """Start the next chunk at the earliest cut separator within the overlap window."""
+        low = max(start + 1, end - self.chunk_overlap)
+        if low >= end:
+            return end
+        if not separator:
+            # Hard cut: overlap by characters
+            return low
+        index = text.find(separator, low, end)
+        return end if index == -1 else index
+
+
+class IncrementalChunker:
+    """
+    Feeds text to a TextChunker piece by piece.
+
+    Text is buffered until flush_size characters are pending and then scanned;
+    only the unconsumed tail of the buffer is kept. Because a chunk is only
+    emitted once its full window is available, the spans are identical to
+    chunking the concatenated text in one go.
+    """
+
+    def __init__(self, chunker: TextChunker, flush_size: Optional[int] = None):
+        self.chunker = chunker
+        self.flush_size = flush_size or chunker.chunk_size * 64
+        self._buffer = ""
+        self._buffer_offset = 0
+        self._position = 0
+        self._floor = 0
+        self._pending: List[str] = []
+        self._pending_size = 0
+        self._page_offsets: List[int] = []
+        self._pages: List[Optional[int]] = []
+
+    def feed(self, text: str, page: Optional[int] = None) -> List[ChunkSpan]:
+        """Add text (optionally tagged with its page) and return any chunks now complete."""
+        if page is not None:
+            self._page_offsets.append(self._buffer_offset + len(self._buffer) + self._pending_size)
+            self._pages.append(page)
+        self._pending.append(text)
+        self._pending_size += len(text)
+        if self._pending_size < self.flush_size:
+            return []
+        return self._scan(final=False)
+
+    def finish(self) -> List[ChunkSpan]:
+        """Return the remaining chunks once all text has been fed."""
+        return self._scan(final=True)
+
+    def _scan(self, final: bool) -> List[ChunkSpan]:
+        # Drop the consumed prefix and append the pending text
+        self._buffer = self._buffer[self._position:] + "".join(self._pending)
+        self._buffer_offset += self._position
+        self._floor -= self._position
+        self._pending = []
+        self._pending_size = 0
+
+        spans, self._position, self._floor = self.chunker.scan(self._buffer, 0, self._floor, final)
+        chunks = [
+            ChunkSpan(
+                self._buffer, start, end,
+                char_start=self._buffer_offset + start,
+                char_end=self._buffer_offset + end,
+                page=self._page_at(self._buffer_offset + start)
+            )
+            for start, end in spans
+        ]
+        self._forget_pages_before(self._buffer_offset + self._position)
+        return chunks
+
+    def _page_at(self, offset: int) -> Optional[int]:
+        index = bisect_right(self._page_offsets, offset) - 1
+        return self._pages[index] if index >= 0 else None
+
+    def _forget_pages_before(self, offset: int):
+        # Keep the page containing offset; earlier marks can no longer be referenced
+        index = bisect_right(self._page_offsets, offset) - 1
+        if index > 0:
+            del self._page_offsets[:index]
+            del self._pages[:index]
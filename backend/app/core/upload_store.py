@@ -0,0 +1,283 @@
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class UploadNotFound(Exception):
+    """Raised for an unknown or expired upload session."""
+
+
+class UploadIncomplete(Exception):
+    """Raised when an upload is finalized before all of its bytes were received."""
+
+
+class ChecksumMismatch(Exception):
+    """Raised when the assembled upload does not match the sha256 declared for it."""
+
+
+_CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+
+def parse_content_range(header: str) -> Tuple[int, int, int]:
+    """Parse ``bytes start-end/size`` into (start, end exclusive, size)."""
+    match = _CONTENT_RANGE.match(header.strip())
+    if not match:
+        raise ValueError(f"Invalid Content-Range: {header}")
+    start, last, size = (int(group) for group in match.groups())
+    if last < start:
+        raise ValueError(f"Invalid Content-Range: {header}")
+    return start, last + 1, size
+
+
+def merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Merge overlapping or adjacent [start, end) ranges."""
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class UploadStore:
+    """
+    Resumable chunked uploads spooled to disk.
+
+    An upload session declares the file's size (and optionally its sha256) up
+    front and gets a preallocated file in the upload directory. Parts are byte
+    ranges written in place as the request body streams in, so server memory
+    stays constant whatever the file size, parts may arrive in any order or
+    be retried, and a client whose connection dropped asks which ranges are
+    missing and sends only those. The received ranges are recorded in SQLite,
+    so every worker of the host sees the same sessions.
+
+    Sessions untouched for UPLOAD_TTL_SECONDS are deleted with their files.
+    """
+
+    # Bytes buffered from the request body before each write
+    WRITE_BLOCK_SIZE = 1024 * 1024
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 directory: Optional[str] = None,
+                 max_bytes: Optional[int] = None,
+                 part_size: Optional[int] = None,
+                 ttl_s: Optional[float] = None):
+        """
+        Args:
+            path: SQLite database of the sessions, defaults to UPLOAD_DB
+            directory: Where upload files are spooled, defaults to UPLOAD_SPOOL_DIR or a
+                directory inside INGESTION_SPOOL_DIR, so finalized files move to the queue by rename
+            max_bytes: Largest accepted upload, defaults to UPLOAD_MAX_BYTES
+            part_size: Part size suggested to clients, defaults to UPLOAD_PART_SIZE
+            ttl_s: Idle time after which a session expires, defaults to UPLOAD_TTL_SECONDS
+        """
+        self.path = path or os.getenv("UPLOAD_DB", "./uploads.sqlite3")
+        self.directory = directory or os.getenv("UPLOAD_SPOOL_DIR") or os.path.join(
+            os.getenv("INGESTION_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "docuquery_uploads")), "sessions"
+        )
+        self.max_bytes = max_bytes or int(os.getenv("UPLOAD_MAX_BYTES", str(1024 ** 3)))
+        self.part_size = part_size or int(os.getenv("UPLOAD_PART_SIZE", str(8 * 1024 * 1024)))
+        self.ttl_s = ttl_s or float(os.getenv("UPLOAD_TTL_SECONDS", "86400"))
+        self._lock = threading.Lock()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS uploads ("
+                " upload_id TEXT PRIMARY KEY,"
+                " filename TEXT NOT NULL,"
+                " content_type TEXT,"
+                " size INTEGER NOT NULL,"
+                " sha256 TEXT,"
+                " doc_id TEXT,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS upload_parts ("
+                " upload_id TEXT NOT NULL,"
+                " start INTEGER NOT NULL,"
+                " end INTEGER NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_upload_parts ON upload_parts(upload_id)")
+            self._conn.commit()
+        except Exception as e:
+            logger.error(f"Error opening upload store: {str(e)}")
+            raise
+
+    def file_path(self, upload_id: str) -> str:
+        return os.path.join(self.directory, f"{upload_id}.part")
+
+    def create(self,
+               filename: str,
+               content_type: Optional[str],
+               size: int,
+               sha256: Optional[str] = None,
+               doc_id: Optional[str] = None) -> Dict[str, Any]:
+        """Open an upload session with a preallocated file of the given size."""
+        if size <= 0:
+            raise ValueError("Upload size must be positive")
+        if size > self.max_bytes:
+            raise ValueError(f"Upload of {size} bytes exceeds the limit of {self.max_bytes} bytes")
+        if sha256 is not None and not re.fullmatch(r"[0-9a-f]{64}", sha256.lower()):
+            raise ValueError("sha256 must be 64 hexadecimal characters")
+        self.expire()
+
+        upload_id = f"upload_{uuid.uuid4().hex}"
+        # Sparse on most filesystems; parts fill it in place
+        with open(self.file_path(upload_id), "wb") as f:
+            f.truncate(size)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO uploads (upload_id, filename, content_type, size, sha256, doc_id, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (upload_id, filename, content_type, size, sha256.lower() if sha256 else None, doc_id, now, now)
+            )
+            self._conn.commit()
+        logger.info(f"Opened upload {upload_id} for {filename} ({size} bytes)")
+        return self.get(upload_id)
+
+    def get(self, upload_id: str) -> Dict[str, Any]:
+        """The session with its received and missing byte ranges; raises UploadNotFound."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM uploads WHERE upload_id = ?", (upload_id,)).fetchone()
+            parts = self._conn.execute(
+                "SELECT start, end FROM upload_parts WHERE upload_id = ?", (upload_id,)
+            ).fetchall()
+        if row is None:
+            raise UploadNotFound(f"Unknown upload: {upload_id}")
+        received = merge_ranges([(part["start"], part["end"]) for part in parts])
+        missing = []
+        offset = 0
+        for start, end in received:
+            if start > offset:
+                missing.append((offset, start))
+            offset = end
+        if offset < row["size"]:
+            missing.append((offset, row["size"]))
+        return {
+            **dict(row),
+            "part_size": self.part_size,
+            "bytes_received": sum(end - start for start, end in received),
+            "received": [list(item) for item in received],
+            "missing": [list(item) for item in missing],
+        }
+
+    async def write_part(self, upload_id: str, start: int, end: int, body: AsyncIterator[bytes]) -> Dict[str, Any]:
+        """
+        Write the bytes [start, end) streamed in body at their offset in the upload file.
+
+        The range is only recorded once all of its bytes were written, so an
+        interrupted part is simply missing and can be sent again.
+        """
+        upload = await run_in_threadpool(self.get, upload_id)
+        if end > upload["size"]:
+            raise ValueError(f"Range {start}-{end - 1} is beyond the upload size of {upload['size']} bytes")
+
+        try:
+            fd = os.open(self.file_path(upload_id), os.O_WRONLY)
+        except FileNotFoundError:
+            # Completed, aborted or expired since the session was read
+            raise UploadNotFound(f"Unknown upload: {upload_id}")
+        try:
+            offset = start
+            buffer = bytearray()
+            async for block in body:
+                buffer += block
+                if offset + len(buffer) > end:
+                    raise ValueError(f"Body is longer than the range {start}-{end - 1}")
+                if len(buffer) >= self.WRITE_BLOCK_SIZE:
+                    offset += await run_in_threadpool(os.pwrite, fd, bytes(buffer), offset)
+                    buffer.clear()
+            if buffer:
+                offset += await run_in_threadpool(os.pwrite, fd, bytes(buffer), offset)
+        finally:
+            os.close(fd)
+        if offset != end:
+            raise ValueError(f"Body has {offset - start} bytes, the range {start}-{end - 1} needs {end - start}")
+
+        await run_in_threadpool(self._record_part, upload_id, start, end)
+        return await run_in_threadpool(self.get, upload_id)
+
+    def _record_part(self, upload_id: str, start: int, end: int):
+        """Record a written range, unless the session ended while its bytes were being written."""
+        with self._lock:
+            touched = self._conn.execute(
+                "UPDATE uploads SET updated_at = ? WHERE upload_id = ?", (time.time(), upload_id)
+            ).rowcount
+            if touched:
+                self._conn.execute(
+                    "INSERT INTO upload_parts (upload_id, start, end) VALUES (?, ?, ?)", (upload_id, start, end)
+                )
+            self._conn.commit()
+        if not touched:
+            raise UploadNotFound(f"Unknown upload: {upload_id}")
+
+    def verify(self, upload_id: str) -> Tuple[Dict[str, Any], str]:
+        """
+        Check that an upload is complete and matches its declared sha256.
+
+        Returns:
+            The session and the sha256 of the assembled file
+
+        Raises:
+            UploadIncomplete: If byte ranges are still missing
+            ChecksumMismatch: If the file does not hash to the declared sha256
+        """
+        upload = self.get(upload_id)
+        if upload["missing"]:
+            raise UploadIncomplete(f"Upload {upload_id} is missing {upload['size'] - upload['bytes_received']} bytes")
+        digest = hashlib.sha256()
+        try:
+            with open(self.file_path(upload_id), "rb") as f:
+                while block := f.read(self.WRITE_BLOCK_SIZE):
+                    digest.update(block)
+        except FileNotFoundError:
+            # Another request completed or aborted the upload meanwhile
+            raise UploadNotFound(f"Unknown upload: {upload_id}")
+        fingerprint = digest.hexdigest()
+        if upload["sha256"] and upload["sha256"] != fingerprint:
+            raise ChecksumMismatch(f"Upload {upload_id} has sha256 {fingerprint}, expected {upload['sha256']}")
+        return upload, fingerprint
+
+    def delete(self, upload_id: str):
+        """Forget a session and remove its file, if still there."""
+        with self._lock:
+            self._conn.execute("DELETE FROM upload_parts WHERE upload_id = ?", (upload_id,))
+            self._conn.execute("DELETE FROM uploads WHERE upload_id = ?", (upload_id,))
+            self._conn.commit()
+        try:
+            os.remove(self.file_path(upload_id))
+        except FileNotFoundError:
+            pass
+
+    def expire(self) -> int:
+        """Delete sessions idle for longer than the TTL."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT upload_id FROM uploads WHERE updated_at < ?", (time.time() - self.ttl_s,)
+            ).fetchall()
+        for row in rows:
+            self.delete(row["upload_id"])
+        if rows:
+            logger.info(f"Expired {len(rows)} idle uploads")
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,4 +1,4 @@
- from typing import List, Optional
+from typing import List, Optional
 from langchain.docstore.document import Document
 from langchain.vectorstores import Chroma
 from langchain.embeddings.base import Embeddings
@@ -1,15 +1,16 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
 from app.api.routes import router  # Import the router from routes.py
-from pydantic import BaseModel
-from typing import List, Optional, Dict
-from app.core.document_loader import DocumentLoader
-from app.core.embedding_processor import EmbeddingProcessor
-from app.core.db_connector import DBConnector
+from app.core.components import Components
+from app.core.metrics import RequestMetricsMiddleware
+from app.core.profiling import ProfilingMiddleware
+from app.core.providers import requires_openai_key
 import logging
 import os
 from dotenv import load_dotenv
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 # Configure logging
 logging.basicConfig(
@@ -21,16 +22,33 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Validate required environment variables
-if not os.getenv("OPENAI_API_KEY"):
-    raise EnvironmentError("OPENAI_API_KEY environment variable is not set")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build the shared components once per worker and release them on shutdown."""
+    # Validate required environment variables; the local providers need no API key
+    if requires_openai_key() and not os.getenv("OPENAI_API_KEY"):
+        raise EnvironmentError("OPENAI_API_KEY environment variable is not set")
+    logger.info("Initializing application components")
+    components = Components()
+    components.startup()
+    await components.ingestion_queue.start()
+    app.state.components = components
+    yield
+    await components.ingestion_queue.stop()
+    components.shutdown()
 
 app = FastAPI(
     title="DocuQuery API",
     description="API for document ingestion and question answering",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
+# Stage breakdown of every request for the slow request log, and opt-in profiles
+app.add_middleware(ProfilingMiddleware)
+# In-flight gauges and latency histograms per route, served at /metrics
+app.add_middleware(RequestMetricsMiddleware)
+
 # Mount the router with prefix
 app.include_router(
     router,
@@ -38,110 +56,6 @@ app.include_router(
     tags=["v1"]
 )
 
-class Query(BaseModel):
-    """
-    Request model for document queries
-    """
-    question: str
-    context_id: Optional[str] = None
-
-class QueryResponse(BaseModel):
-    """
-    Response model for document queries
-    """
-    answer: str
-    sources: List[Dict[str, str]]
-
-# Initialize components
-document_loader = DocumentLoader()
-embedding_processor = EmbeddingProcessor()
-db_connector = DBConnector()
-
-@app.post("/ingest", response_model=Dict[str, str])
-async def ingest_document(file: UploadFile = File(...)) -> Dict[str, str]:
-    """
-    Endpoint to ingest documents and create embeddings
-    
-    Args:
-        file (UploadFile): The document to process (PDF, DOCX, or TXT)
-        
-    Returns:
-        Dict containing:
-        - collection_id: Unique identifier for the processed document
-        - status: Success message
-        
-    Raises:
-        HTTPException: For invalid files or processing errors
-    """
-    try:
-        # Process document
-        logger.info(f"Processing document: {file.filename}")
-        doc_data = document_loader.process_document(file.file, file.filename)
-        
-        # Create embeddings
-        logger.info("Creating embeddings")
-        documents = await embedding_processor.process_chunks(
-            doc_data["chunks"],
-            doc_data["metadata"]
-        )
-        
-        # Store in database
-        logger.info("Storing documents in database")
-        collection_id = await db_connector.store_documents(documents)
-        
-        return {
-            "collection_id": collection_id,
-            "status": "Document successfully processed"
-        }
-        
-    except ValueError as e:
-        logger.error(f"Validation error: {str(e)}")
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        logger.error(f"Processing error: {str(e)}")
-        raise HTTPException(status_code=500, detail="Internal server error")
-
-@app.post("/query", response_model=QueryResponse)
-async def query_document(query: Query) -> QueryResponse:
-    """
-    Endpoint to query the document based on user questions
-    
-    Args:
-        query (Query): Query model containing the question and optional context_id
-        
-    Returns:
-        QueryResponse containing:
-        - answer: Generated answer to the question
-        - sources: List of source citations
-        
-    Raises:
-        HTTPException: If context not found or processing error occurs
-    """
-    try:
-        if query.context_id:
-            # Retrieve collection
-            collection = await db_connector.get_collection(query.context_id)
-            
-            # TODO: Implement question answering logic using retrieved collection
-            # This will involve:
-            # 1. Creating embedding for the question
-            # 2. Finding relevant chunks from the collection
-            # 3. Using OpenAI to generate an answer
-            
-            return QueryResponse(
-                answer="Not implemented yet",
-                sources=[]
-            )
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail="context_id is required"
-            )
-            
-    except Exception as e:
-        logger.error(f"Query error: {str(e)}")
-        raise HTTPException(status_code=500, detail="Internal server error")
-
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request, exc):
     logger.error(f"Validation error for request {request.url}: {exc}", exc_info=True)
@@ -154,6 +68,11 @@ async def validation_exception_handler(request, exc):
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Per-stage timings, counters and gauges in the Prometheus text format."""
+    return Response(generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,114 @@
+"""Shared helpers for the benchmark scripts."""
+import hashlib
+import statistics
+import time
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+
+class LatencyEmbeddings(Embeddings):
+    """
+    Embeddings stand-in that models the latency of a remote provider.
+
+    Every call sleeps for ``latency_s`` plus ``per_text_latency_s`` for each text
+    and returns deterministic vectors derived from a hash of the text, so
+    repeated texts get identical embeddings.
+    """
+
+    def __init__(self, latency_s: float, dimension: int = 1536, per_text_latency_s: float = 0.0):
+        self.latency_s = latency_s
+        self.per_text_latency_s = per_text_latency_s
+        self.dimension = dimension
+        self.calls = 0
+        self.texts_embedded = 0
+
+    def _vector(self, text: str) -> List[float]:
+        seed = hashlib.sha256(text.encode("utf-8")).digest()
+        return [(seed[i % len(seed)] - 128) / 128.0 for i in range(self.dimension)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency_s + self.per_text_latency_s * len(texts))
+        self.calls += 1
+        self.texts_embedded += len(texts)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def percentiles(samples: List[float]) -> dict:
+    """Summarize durations in seconds as millisecond percentiles."""
+    ordered = sorted(samples)
+    return {
+        "mean_ms": statistics.mean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+    }
+
+
+_WORDS = (
+    "agreement party shall pursuant clause termination notice payment invoice "
+    "delivery warranty liability indemnify confidential obligation schedule "
+    "amendment effective date governing law jurisdiction dispute arbitration"
+).split()
+
+
+def synthetic_paragraph(seed: int, words: int = 80) -> str:
+    """Deterministic pseudo-contract prose."""
+    return " ".join(_WORDS[(seed * 7 + i * 13) % len(_WORDS)] for i in range(words)) + "."
+
+
+def make_pdf(pages: int, lines_per_page: int = 40) -> bytes:
+    """Build a minimal valid PDF with ``pages`` pages of Helvetica text."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_refs = []
+    for page in range(pages):
+        lines = [
+            f"({synthetic_paragraph(page * lines_per_page + line, 12)}) Tj T*"
+            for line in range(lines_per_page)
+        ]
+        stream = ("BT /F1 9 Tf 11 TL 40 760 Td " + " ".join(lines) + " ET").encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+    kids = " ".join(f"{ref} 0 R" for ref in page_refs).encode()
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % pages
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def make_docx(paragraphs: int) -> bytes:
+    """Build a DOCX document of ``paragraphs`` synthetic paragraphs."""
+    import io
+    import docx
+    document = docx.Document()
+    for i in range(paragraphs):
+        document.add_paragraph(synthetic_paragraph(i, 80))
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+
+def make_txt(paragraphs: int) -> bytes:
+    """Build a UTF-8 text document of ``paragraphs`` synthetic paragraphs."""
+    return "\n\n".join(synthetic_paragraph(i, 80) for i in range(paragraphs)).encode("utf-8")
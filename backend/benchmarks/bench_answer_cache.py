@@ -0,0 +1,146 @@
+"""
+Latency, embedding requests and LLM calls of repeated questions with and
+without the two-tier answer cache.
+
+The corpus is the synthetic contracts of bench_context_builder. Traffic draws
+``--queries`` questions from ``--distinct`` topic questions with Zipf
+(``--zipf``) popularity, as users ask a handful of questions constantly, and
+asks each in one of three forms:
+
+- the canonical question
+- the same with different case, spacing and punctuation (an exact-tier hit
+  once the canonical form was answered)
+- the same with polite filler ("Could you please tell me ..."), a different
+  question that retrieves the same chunks (a retrieval-tier hit)
+
+Retrieval is hybrid with the context builder, the embeddings wait
+``--embedding-latency-ms`` per request and FakeStreamingChatModel reads the
+prompt like a hosted model, so nothing calls an API.
+
+After the cached run every document is invalidated, as a re-ingestion of an
+unchanged version does, and the traffic replayed: no exact-tier answer may
+survive (``stale_exact_hits``), while retrieval-tier answers, keyed on the
+chunks' content, still skip the LLM.
+
+Run from the backend directory:
+    python -m benchmarks.bench_answer_cache --queries 300 --distinct 40
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+
+def make_traffic(args) -> list:
+    """(context_id, question) pairs; repeated questions come in different surface forms."""
+    from benchmarks.bench_context_builder import section_topic
+
+    rng = random.Random(1)
+    distinct = []
+    for _ in range(args.distinct):
+        doc, section = rng.randrange(args.documents), rng.randrange(args.sections)
+        distinct.append((f"doc_{doc}", " ".join(rng.sample(section_topic(doc, section), 6))))
+    weights = [1 / (rank + 1) ** args.zipf for rank in range(args.distinct)]
+
+    traffic = []
+    for _ in range(args.queries):
+        doc_id, words = rng.choices(distinct, weights)[0]
+        form = rng.randrange(3)
+        if form == 0:
+            question = f"What does the agreement say about {words}?"
+        elif form == 1:
+            question = f"  what does the agreement SAY about  {words.upper()}"
+        else:
+            question = f"Could you please tell me what does the agreement say about {words}?"
+        traffic.append((doc_id, question))
+    return traffic
+
+
+async def run(pipeline, embeddings, llm, traffic) -> dict:
+    embeddings.calls = 0
+    llm.calls = 0
+    latencies = []
+    for context_id, question in traffic:
+        started = time.perf_counter()
+        retrieval = await pipeline.retrieve(question, context_id)
+        await pipeline.answer(question, retrieval)
+        latencies.append(time.perf_counter() - started)
+    ordered = sorted(latencies)
+    return {
+        "latency_mean_ms": statistics.mean(latencies) * 1000,
+        "latency_p50_ms": ordered[len(ordered) // 2] * 1000,
+        "latency_p95_ms": ordered[int(len(ordered) * 0.95)] * 1000,
+        "embedding_requests": embeddings.calls,
+        "llm_calls": llm.calls,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=3)
+    parser.add_argument("--sections", type=int, default=30)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--distinct", type=int, default=40)
+    parser.add_argument("--zipf", type=float, default=1.1)
+    parser.add_argument("--embedding-latency-ms", type=float, default=30.0)
+    parser.add_argument("--first-token-ms", type=float, default=150.0)
+    parser.add_argument("--prefill-tokens-per-second", type=float, default=5000.0)
+    args = parser.parse_args()
+    # The corpus settings bench_context_builder.build reads
+    args.section_words, args.facts, args.boilerplate_every = 400, 3, 3
+
+    from app.core.answer_cache import AnswerCache, normalize_question
+    from app.core.context_builder import ContextBuilder
+    from app.core.embedding_processor import EmbeddingProcessor
+    from app.core.fake_chat_model import FakeStreamingChatModel
+    from app.core.query_pipeline import QueryPipeline
+    from benchmarks.bench_context_builder import build
+
+    traffic = make_traffic(args)
+    llm = FakeStreamingChatModel(first_token_latency_s=args.first_token_ms / 1000,
+                                 prefill_tokens_per_second=args.prefill_tokens_per_second, answer_tokens=16)
+
+    report = {"queries": args.queries, "distinct": args.distinct}
+    with tempfile.TemporaryDirectory() as path:
+        db, index, embeddings = build(path, args)
+        embeddings.latency_s = args.embedding_latency_ms / 1000
+        processor = EmbeddingProcessor(embeddings=embeddings)
+        cache = AnswerCache(os.path.join(path, "answers.sqlite3"))
+
+        def pipeline(answer_cache):
+            return QueryPipeline(processor, db, llm=llm, keyword_index=index, mode="hybrid",
+                                 context_builder=ContextBuilder(), answer_cache=answer_cache)
+
+        report["uncached"] = asyncio.run(run(pipeline(None), embeddings, llm, traffic))
+        print(json.dumps({"uncached": report["uncached"]}), flush=True)
+
+        report["cached"] = asyncio.run(run(pipeline(cache), embeddings, llm, traffic))
+        report["cached"]["cache"] = cache.stats()
+        print(json.dumps({"cached": report["cached"]}), flush=True)
+
+        before = cache.stats()
+        for doc in range(args.documents):
+            cache.invalidate(f"doc_{doc}")
+        report["after_invalidation"] = asyncio.run(run(pipeline(cache), embeddings, llm, traffic))
+        after = cache.stats()
+        # Every distinct question must miss the exact tier once, its answer from before being invalidated
+        distinct_questions = len({(context_id, normalize_question(question)) for context_id, question in traffic})
+        report["after_invalidation"]["stale_exact_hits"] = (
+            distinct_questions - (after["exact"]["misses"] - before["exact"]["misses"])
+        )
+        report["after_invalidation"]["retrieval_hits"] = after["retrieval"]["hits"] - before["retrieval"]["hits"]
+        cache.close()
+
+    baseline = report["uncached"]
+    for name in ("cached", "after_invalidation"):
+        report[name]["latency_reduction"] = 1 - report[name]["latency_mean_ms"] / baseline["latency_mean_ms"]
+        report[name]["llm_call_reduction"] = 1 - report[name]["llm_calls"] / baseline["llm_calls"]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
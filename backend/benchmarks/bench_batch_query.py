@@ -0,0 +1,95 @@
+"""
+Wall time and embedding calls of answering many questions one by one versus
+through the batch path of QueryPipeline (what /query/batch runs).
+
+Ingests ``--documents`` synthetic documents into a temporary Chroma store and
+asks ``--queries`` questions spread over them. The one-by-one run retrieves and
+answers each question in turn, as a client looping over /query does; the batch
+run embeds all questions in one request, searches once per document and
+answers with ``--concurrency`` LLM calls in flight.
+
+Embeddings sleep ``--embedding-latency-ms`` per request and the LLM stand-in
+(FakeStreamingChatModel) takes ``--llm-latency-ms`` per completion, like remote
+providers.
+
+Run from the backend directory:
+    python -m benchmarks.bench_batch_query --queries 200 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from benchmarks._support import LatencyEmbeddings, synthetic_paragraph
+
+
+async def one_by_one(pipeline, questions):
+    for question, context_id in questions:
+        retrieval = await pipeline.retrieve(question, context_id)
+        await pipeline.answer(question, retrieval)
+
+
+async def batched(pipeline, questions, concurrency):
+    retrievals = await pipeline.retrieve_batch(questions)
+    answers = await pipeline.answer_batch(list(zip([question for question, _ in questions], retrievals)),
+                                          concurrency)
+    errors = [result for result in retrievals + answers if isinstance(result, Exception)]
+    if errors:
+        raise errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=5)
+    parser.add_argument("--chunks", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--embedding-latency-ms", type=float, default=100.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=500.0)
+    args = parser.parse_args()
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+    from app.core.db_connector import DBConnector
+    from app.core.embedding_processor import EmbeddingProcessor
+    from app.core.fake_chat_model import FakeStreamingChatModel
+    from app.core.query_pipeline import QueryPipeline
+    from benchmarks.bench_document_store import make_client
+
+    embeddings = LatencyEmbeddings(0.0)
+    llm = FakeStreamingChatModel(first_token_latency_s=args.llm_latency_ms / 1000, answer_tokens=16)
+    questions = [(f"Question {i} about clause {i % 17}?", f"doc_{i % args.documents}") for i in range(args.queries)]
+    report = {"queries": args.queries, "documents": args.documents, "concurrency": args.concurrency}
+    with tempfile.TemporaryDirectory() as path:
+        db = DBConnector(client=make_client(path), embeddings=embeddings)
+        for doc in range(args.documents):
+            texts = [synthetic_paragraph(doc * args.chunks + i) for i in range(args.chunks)]
+            db.add_chunks(f"doc_{doc}", ids=[f"doc_{doc}_{i}" for i in range(args.chunks)], documents=texts,
+                          metadatas=[{"page": 1, "chunk_index": i} for i in range(args.chunks)],
+                          embeddings=embeddings.embed_documents(texts))
+        embeddings.latency_s = args.embedding_latency_ms / 1000
+
+        for name in ("one_by_one", "batch"):
+            # A fresh processor per run so neither run hits the other's cached query embeddings
+            processor = EmbeddingProcessor(embeddings=embeddings)
+            pipeline = QueryPipeline(processor, db, llm=llm, top_k=3)
+            calls = embeddings.calls
+            started = time.perf_counter()
+            if name == "one_by_one":
+                asyncio.run(one_by_one(pipeline, questions))
+            else:
+                asyncio.run(batched(pipeline, questions, args.concurrency))
+            seconds = time.perf_counter() - started
+            report[name] = {
+                "seconds": seconds,
+                "queries_per_second": args.queries / seconds,
+                "embedding_calls": embeddings.calls - calls,
+            }
+            print(json.dumps({name: report[name]}), flush=True)
+    report["speedup"] = report["one_by_one"]["seconds"] / report["batch"]["seconds"]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Throughput and allocations of the offset-based TextChunker against LangChain's
+RecursiveCharacterTextSplitter on a multi-megabyte synthetic document.
+
+Both chunkers use chunk_size=1000, chunk_overlap=200 and the separators
+"\\n\\n", "\\n", " ", "". The native chunker is measured producing spans only,
+producing and materializing them, and fed incrementally as the ingestion
+pipeline does.
+
+Run from the backend directory:
+    python -m benchmarks.bench_chunker --megabytes 8
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+import tracemalloc
+
+from benchmarks._support import synthetic_paragraph
+
+
+def build_text(megabytes: float, seed: int = 11) -> str:
+    rng = random.Random(seed)
+    target = int(megabytes * 1024 * 1024)
+    parts = []
+    size = 0
+    index = 0
+    while size < target:
+        paragraph = synthetic_paragraph(index, rng.randint(20, 400))
+        if rng.random() < 0.3:
+            # Hard-wrapped paragraphs, as extracted from PDFs and plain text
+            words = paragraph.split(" ")
+            paragraph = "\n".join(" ".join(words[i:i + 12]) for i in range(0, len(words), 12))
+        part = paragraph + rng.choice(["\n\n", "\n\n", "\n", " "])
+        parts.append(part)
+        size += len(part)
+        index += 1
+    return "".join(parts)
+
+
+def measure(func, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, min(timings), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megabytes", type=float, default=8.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from app.core.text_chunker import IncrementalChunker, TextChunker
+
+    text = build_text(args.megabytes)
+    separators = ["\n\n", "\n", " ", ""]
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000, chunk_overlap=200, length_function=len, separators=separators
+    )
+    chunker = TextChunker(chunk_size=1000, chunk_overlap=200, separators=separators)
+
+    def incremental():
+        stream = IncrementalChunker(chunker)
+        spans = []
+        for start in range(0, len(text), 64 * 1024):
+            spans.extend(stream.feed(text[start:start + 64 * 1024]))
+        spans.extend(stream.finish())
+        return spans
+
+    variants = {
+        "langchain": lambda: splitter.split_text(text),
+        "native_spans": lambda: list(chunker.iter_spans(text)),
+        "native_strings": lambda: chunker.split_text(text),
+        "native_incremental": incremental,
+    }
+
+    results = {"characters": len(text), "variants": {}}
+    for name, func in variants.items():
+        chunks, seconds, peak = measure(func, args.repeat)
+        lengths = [len(chunk) for chunk in chunks]
+        results["variants"][name] = {
+            "seconds": seconds,
+            "mb_per_second": len(text) / (1024 * 1024) / seconds,
+            "peak_allocated_mb": peak / (1024 * 1024),
+            "chunks": len(chunks),
+            "mean_chunk_chars": statistics.mean(lengths),
+            "max_chunk_chars": max(lengths),
+        }
+
+    variants = results["variants"]
+    results["speedup_strings"] = variants["langchain"]["seconds"] / variants["native_strings"]["seconds"]
+    results["speedup_incremental"] = variants["langchain"]["seconds"] / variants["native_incremental"]["seconds"]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
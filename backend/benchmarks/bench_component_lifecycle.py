@@ -0,0 +1,79 @@
+"""
+Per-request component overhead: building DBConnector/EmbeddingProcessor on every
+request versus reusing the lifespan-managed Components container.
+
+The embeddings client is replaced by a stand-in whose ``embed_query`` sleeps for
+``--probe-latency-ms`` to model the network dimension probe.
+
+Run from the backend directory:
+    python -m benchmarks.bench_component_lifecycle --requests 50
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks._support import LatencyEmbeddings, percentiles
+
+
+def bench_per_request(requests: int, latency_s: float) -> dict:
+    """Old behaviour: new connector, dimension probe and collection round-trips per request."""
+    from app.core.db_connector import DBConnector
+    from app.core.embedding_processor import EmbeddingProcessor
+
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        embeddings = LatencyEmbeddings(latency_s)
+        db = DBConnector(collection_name="bench_doc", embeddings=embeddings)
+        db.verify_embedding_dimension()
+        db.get_or_create_collection("docuquery")
+        EmbeddingProcessor(embeddings=embeddings)
+        db.get_collection("bench_doc")
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def bench_shared(requests: int, latency_s: float) -> dict:
+    """New behaviour: components built once, routes only resolve dependencies."""
+    from app.core.components import Components
+
+    components = Components()
+    components.embeddings = LatencyEmbeddings(latency_s)
+    components.db_connector.embeddings = components.embeddings
+    components.startup()
+    components.db_connector.get_or_create_collection("bench_doc")
+
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        db = components.db_connector
+        _ = components.embedding_processor
+        db.get_collection("bench_doc")
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--probe-latency-ms", type=float, default=150.0)
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    with tempfile.TemporaryDirectory() as persist_dir:
+        os.environ["PERSIST_DIRECTORY"] = persist_dir
+        os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(persist_dir, "embedding_cache.sqlite3")
+        latency_s = args.probe_latency_ms / 1000
+        results = {
+            "requests": args.requests,
+            "probe_latency_ms": args.probe_latency_ms,
+            "per_request": bench_per_request(args.requests, latency_s),
+            "shared": bench_shared(args.requests, latency_s),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Prompt tokens, fact coverage and answer latency of stuffing the top-k chunks
+versus the context builder at several token budgets.
+
+Ingests ``--documents`` synthetic contracts, chunked like the DocumentLoader
+does (1000 characters with 200 of overlap). Each document is a run of
+sections of ``--section-words`` words drawn mostly from a section-specific
+vocabulary, so the chunks relevant to a section are neighbours that overlap,
+and each section carries ``--facts`` fact codes spread over its length. A
+standard notices clause, long enough to fill a chunk of its own, repeats
+after every ``--boilerplate-every`` sections, as in real contracts.
+
+Questions either use words of one section ("topic") or ask about notices
+("boilerplate"). Coverage is the fraction of the section's fact codes (or of
+the clause) present in the prompt context. Retrieval is hybrid with the local
+hashing embeddings, so no API is called.
+
+Answers come from FakeStreamingChatModel, which reads the prompt at
+``--prefill-tokens-per-second`` after ``--first-token-ms``, so answer latency
+grows with the prompt like a hosted model's time to first token.
+
+Run from the backend directory:
+    python -m benchmarks.bench_context_builder --queries 60 --budgets 400,600,750,1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+BOILERPLATE = (
+    "Notices under this agreement shall be in writing and delivered by hand, courier or registered mail to the "
+    "addresses set out above, and take effect on receipt. A party may change its address for notices by notice "
+    "to the other party. Notices sent by email are valid only when confirmed by registered mail within five "
+    "business days. No waiver of any breach of this agreement is a waiver of any other breach, and no delay in "
+    "exercising a right is a waiver of it. If any provision is held invalid, the remaining provisions continue "
+    "in full force. This agreement is the entire agreement between the parties and supersedes all prior "
+    "agreements, representations and understandings relating to its subject matter. Amendments must be in "
+    "writing and signed by both parties."
+)
+BOILERPLATE_FACT = "confirmed by registered mail within five business days"
+BOILERPLATE_QUESTION = "How must notices sent by email be confirmed, and when do notices take effect?"
+
+_SYLLABLES = ["ba", "ce", "di", "fo", "gu", "ha", "ke", "li", "mo", "nu", "pa", "re", "si", "to", "vu", "za"]
+
+
+def _word(rng: random.Random) -> str:
+    return "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+# A few thousand distinct words, so unrelated sections share few terms as in real prose
+_VOCABULARY = sorted({_word(random.Random(seed)) for seed in range(6000)})
+
+
+def section_topic(doc: int, section: int) -> list:
+    return random.Random(doc * 1000 + section).sample(_VOCABULARY, 40)
+
+
+def fact(doc: int, section: int, k: int) -> str:
+    return f"FC-{doc}-{section}-{k}"
+
+
+def section_text(doc: int, section: int, args) -> str:
+    rng = random.Random(doc * 100000 + section)
+    topic = section_topic(doc, section)
+    words = [rng.choice(topic) if rng.random() < 0.5 else rng.choice(_VOCABULARY) for _ in range(args.section_words)]
+    for k in range(args.facts):
+        words[(k * 2 + 1) * args.section_words // (args.facts * 2)] = f"code {fact(doc, section, k)}"
+    return " ".join(words) + "."
+
+
+def document_text(doc: int, args) -> str:
+    paragraphs = []
+    for section in range(args.sections):
+        paragraphs.append(section_text(doc, section, args))
+        if args.boilerplate_every and section % args.boilerplate_every == args.boilerplate_every - 1:
+            paragraphs.append(BOILERPLATE)
+    return "\n\n".join(paragraphs)
+
+
+def build(path: str, args):
+    from app.core.db_connector import DBConnector
+    from app.core.ingestion_queue import IngestionQueue
+    from app.core.keyword_index import KeywordDocument, KeywordIndex
+    from app.core.providers import HashingEmbeddings
+    from app.core.text_chunker import TextChunker
+    from benchmarks.bench_document_store import make_client
+
+    embeddings = HashingEmbeddings(dimension=256, latency_s=0.0)
+    db = DBConnector(client=make_client(path), embeddings=embeddings, dimension=256)
+    index = KeywordIndex(os.path.join(path, "keywords.sqlite3"))
+    chunker = TextChunker(chunk_size=1000, chunk_overlap=200)
+    for doc in range(args.documents):
+        doc_id = f"doc_{doc}"
+        spans = list(chunker.iter_spans(document_text(doc, args)))
+        texts = [span.text for span in spans]
+        ids = IngestionQueue.chunk_ids(doc_id, texts, {})
+        db.add_chunks(doc_id, ids=ids, documents=texts,
+                      metadatas=[{"page": 1, "chunk_index": i, "char_start": span.char_start,
+                                  "char_end": span.char_end} for i, span in enumerate(spans)],
+                      embeddings=embeddings.embed_documents(texts))
+        keywords = KeywordDocument(doc_id)
+        for chunk_id, chunk_text in zip(ids, texts):
+            keywords.add(chunk_id, chunk_text)
+        index.replace_document(keywords)
+    return db, index, embeddings
+
+
+def make_questions(args) -> list:
+    """(kind, doc_id, question, facts) tuples; every fourth question is about the notices clause."""
+    rng = random.Random(0)
+    questions = []
+    for i in range(args.queries):
+        doc = rng.randrange(args.documents)
+        if i % 4 == 3:
+            questions.append(("boilerplate", f"doc_{doc}", BOILERPLATE_QUESTION, [BOILERPLATE_FACT]))
+            continue
+        section = rng.randrange(args.sections)
+        words = rng.sample(section_topic(doc, section), 6)
+        questions.append(("topic", f"doc_{doc}", f"What does the agreement say about {' '.join(words)}?",
+                          [fact(doc, section, k) for k in range(args.facts)]))
+    return questions
+
+
+async def run(name: str, pipeline, questions) -> dict:
+    from app.core.embedding_scheduler import TokenCounter
+
+    counter = TokenCounter()
+    tokens, latencies, passages = [], [], []
+    coverage = {"topic": [], "boilerplate": []}
+    for kind, doc_id, question, facts in questions:
+        retrieval = await pipeline.retrieve(question, doc_id)
+        messages = pipeline.build_messages(question, retrieval)
+        tokens.append(sum(counter.count(str(message.content)) for message in messages))
+        passages.append(len(retrieval.documents))
+        context = "\n\n".join(retrieval.documents)
+        coverage[kind].append(sum(f in context for f in facts) / len(facts))
+        started = time.perf_counter()
+        await pipeline.answer(question, retrieval)
+        latencies.append(time.perf_counter() - started)
+    report = {
+        "prompt_tokens_mean": statistics.mean(tokens),
+        "passages_mean": statistics.mean(passages),
+        "coverage_topic": statistics.mean(coverage["topic"]),
+        "coverage_boilerplate": statistics.mean(coverage["boilerplate"]),
+        "answer_latency_mean_ms": statistics.mean(latencies) * 1000,
+    }
+    print(json.dumps({name: report}), flush=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=3)
+    parser.add_argument("--sections", type=int, default=60)
+    parser.add_argument("--section-words", type=int, default=400)
+    parser.add_argument("--facts", type=int, default=3)
+    parser.add_argument("--boilerplate-every", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=60)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--candidates", type=int, default=10)
+    parser.add_argument("--budgets", default="400,600,750,1000")
+    parser.add_argument("--mmr-lambda", type=float, default=None, help="Defaults to CONTEXT_MMR_LAMBDA")
+    parser.add_argument("--first-token-ms", type=float, default=50.0)
+    parser.add_argument("--prefill-tokens-per-second", type=float, default=5000.0)
+    args = parser.parse_args()
+
+    from app.core.context_builder import ContextBuilder
+    from app.core.embedding_processor import EmbeddingProcessor
+    from app.core.fake_chat_model import FakeStreamingChatModel
+    from app.core.query_pipeline import QueryPipeline
+
+    questions = make_questions(args)
+    llm = FakeStreamingChatModel(first_token_latency_s=args.first_token_ms / 1000,
+                                 prefill_tokens_per_second=args.prefill_tokens_per_second, answer_tokens=16)
+
+    report = {"queries": args.queries, "top_k": args.top_k, "candidates": args.candidates}
+    with tempfile.TemporaryDirectory() as path:
+        db, index, embeddings = build(path, args)
+        processor = EmbeddingProcessor(embeddings=embeddings)
+        configs = [(f"stuff_top_{args.top_k}", None)] + [
+            (f"builder_{budget}", ContextBuilder(token_budget=int(budget), candidates=args.candidates,
+                                                       mmr_lambda=args.mmr_lambda))
+            for budget in args.budgets.split(",")
+        ]
+        for name, builder in configs:
+            pipeline = QueryPipeline(processor, db, llm=llm, top_k=args.top_k, keyword_index=index,
+                                     mode="hybrid", context_builder=builder)
+            report[name] = asyncio.run(run(name, pipeline, questions))
+
+    baseline = report[configs[0][0]]
+    for name, _ in configs[1:]:
+        report[name]["prompt_token_reduction"] = 1 - report[name]["prompt_tokens_mean"] / baseline["prompt_tokens_mean"]
+        report[name]["answer_latency_reduction"] = (1 - report[name]["answer_latency_mean_ms"]
+                                                    / baseline["answer_latency_mean_ms"])
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Ingest throughput and per-document query latency of the Chroma storage layouts:
+
+- per_document: one collection per document (the previous layout, without the
+  client.reset() that wiped the store on every ingest)
+- shared: every chunk in one collection, queries filtered on doc_id
+- sharded: chunks spread over ``--shards`` collections by a hash of doc_id
+
+Each layout ingests ``--documents`` documents of ``--chunks`` random vectors into
+its own temporary persistent store, then runs ``--queries`` top-3 queries
+against random documents.
+
+Run from the backend directory:
+    python -m benchmarks.bench_document_store --documents 10000 --chunks 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks._support import percentiles
+
+
+def directory_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names
+    )
+
+
+def make_client(path: str):
+    from chromadb import Client
+    from chromadb.config import Settings
+    return Client(settings=Settings(
+        anonymized_telemetry=False, allow_reset=False, is_persistent=True, persist_directory=path
+    ))
+
+
+def random_vectors(rng: np.random.Generator, count: int, dimension: int) -> list:
+    vectors = rng.standard_normal((count, dimension)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.tolist()
+
+
+class PerDocumentStore:
+    def __init__(self, client):
+        self.client = client
+        self.collections = {}
+
+    def add(self, doc_id, ids, documents, metadatas, embeddings):
+        collection = self.client.create_collection(name=doc_id, metadata={"dimension": 1536, "space": "cosine"})
+        self.collections[doc_id] = collection
+        collection.add(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+
+    async def query(self, embedding, doc_id):
+        return self.collections[doc_id].query(query_embeddings=[embedding], n_results=3)
+
+
+class ConnectorStore:
+    def __init__(self, client, shards: int):
+        from app.core.db_connector import DBConnector
+        self.db = DBConnector(client=client, embeddings=object(), shards=shards)
+
+    def add(self, doc_id, ids, documents, metadatas, embeddings):
+        self.db.add_chunks(doc_id, ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+
+    async def query(self, embedding, doc_id):
+        return await self.db.query_documents(embedding, doc_id, n_results=3)
+
+
+def run_layout(name: str, args) -> dict:
+    rng = np.random.default_rng(3)
+    picker = random.Random(5)
+    with tempfile.TemporaryDirectory() as path:
+        client = make_client(path)
+        store = PerDocumentStore(client) if name == "per_document" else ConnectorStore(
+            client, args.shards if name == "sharded" else 1
+        )
+
+        doc_ids = [f"doc_{i:06d}" for i in range(args.documents)]
+        start = time.perf_counter()
+        for doc_id in doc_ids:
+            store.add(
+                doc_id,
+                ids=[f"{doc_id}_{c}" for c in range(args.chunks)],
+                documents=[f"{doc_id} chunk {c}" for c in range(args.chunks)],
+                metadatas=[{"doc_id": doc_id, "page": 1, "chunk_index": c} for c in range(args.chunks)],
+                embeddings=random_vectors(rng, args.chunks, args.dimension)
+            )
+        ingest_seconds = time.perf_counter() - start
+
+        queries = [(random_vectors(rng, 1, args.dimension)[0], picker.choice(doc_ids)) for _ in range(args.queries)]
+
+        async def query_all():
+            timings = []
+            for embedding, doc_id in queries:
+                started = time.perf_counter()
+                result = await store.query(embedding, doc_id)
+                timings.append(time.perf_counter() - started)
+                ids = result["ids"][0] if name == "per_document" else result["ids"]
+                assert ids and all(i.startswith(doc_id) for i in ids), (doc_id, ids)
+            return timings
+
+        timings = asyncio.run(query_all())
+        return {
+            "ingest_seconds": ingest_seconds,
+            "documents_per_second": args.documents / ingest_seconds,
+            "query": percentiles(timings),
+            "disk_mb": directory_size(path) / (1024 * 1024),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=10000)
+    parser.add_argument("--chunks", type=int, default=5)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--layouts", nargs="+", default=["per_document", "shared", "sharded"])
+    args = parser.parse_args()
+
+    results = {"documents": args.documents, "chunks_per_document": args.chunks, "dimension": args.dimension}
+    for name in args.layouts:
+        results[name] = run_layout(name, args)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Embedding latency and provider traffic for a re-ingestion workload with and
+without the content-addressed EmbeddingCache.
+
+The workload ingests ``--documents`` synthetic documents, then re-ingests each of
+them with ``--edit-ratio`` of their chunks changed, and finally asks a fixed set
+of questions twice.
+
+Run from the backend directory:
+    python -m benchmarks.bench_embedding_cache --documents 20 --chunks 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks._support import LatencyEmbeddings
+
+
+def build_workload(documents: int, chunks: int, edit_ratio: float, seed: int = 7):
+    rng = random.Random(seed)
+    originals = [
+        [f"document {d} chunk {c} " + " ".join(str(rng.random()) for _ in range(20)) for c in range(chunks)]
+        for d in range(documents)
+    ]
+    revisions = []
+    for doc in originals:
+        revised = list(doc)
+        for c in rng.sample(range(chunks), int(chunks * edit_ratio)):
+            revised[c] = revised[c] + " (amended)"
+        revisions.append(revised)
+    questions = [f"question {q} about the agreement" for q in range(20)]
+    return originals + revisions, questions + questions
+
+
+async def run(processor, uploads, questions) -> float:
+    start = time.perf_counter()
+    for chunks in uploads:
+        await processor.process_chunks(chunks)
+    for question in questions:
+        await processor.process_query(question)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--chunks", type=int, default=200)
+    parser.add_argument("--edit-ratio", type=float, default=0.1)
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    from app.core.embedding_cache import EmbeddingCache
+    from app.core.embedding_processor import EmbeddingProcessor
+
+    uploads, questions = build_workload(args.documents, args.chunks, args.edit_ratio)
+    latency_s = args.latency_ms / 1000
+    results = {"uploads": len(uploads), "queries": len(questions)}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["PERSIST_DIRECTORY"] = tmp
+        for name, cache in (
+            ("uncached", None),
+            ("cached", EmbeddingCache(path=os.path.join(tmp, "cache.sqlite3"))),
+        ):
+            embeddings = LatencyEmbeddings(latency_s)
+            processor = EmbeddingProcessor(embeddings=embeddings, cache=cache)
+            elapsed = asyncio.run(run(processor, uploads, questions))
+            results[name] = {
+                "seconds": elapsed,
+                "provider_calls": embeddings.calls,
+                "texts_embedded": embeddings.texts_embedded,
+                **({"cache": cache.stats()} if cache else {}),
+            }
+
+    results["latency_reduction"] = 1 - results["cached"]["seconds"] / results["uncached"]["seconds"]
+    results["texts_saved"] = 1 - results["cached"]["texts_embedded"] / results["uncached"]["texts_embedded"]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Ingestion-sized embedding workload against the fake embedding server, comparing
+one synchronous embed_documents call (the previous behaviour, with the OpenAI
+client's own retries) with the EmbeddingScheduler.
+
+The server injects ``--throttle-rate`` random 429s and, optionally, a
+tokens-per-minute limit. Results are checked against the vectors the server
+derives from each text, so reordering or dropped batches are reported.
+
+Run from the backend directory:
+    python -m benchmarks.bench_embedding_scheduler --chunks 2000 --throttle-rate 0.1
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+import openai
+from langchain_core.embeddings import Embeddings
+
+from benchmarks._support import synthetic_paragraph
+from benchmarks.fake_embedding_server import start_server
+
+
+class OpenAIClientEmbeddings(Embeddings):
+    """
+    Embeddings over the raw OpenAI clients.
+
+    OpenAIEmbeddings tokenizes inputs with tiktoken, which needs to download its
+    encoding; sending plain strings also lets the server derive the expected vectors.
+    """
+
+    def __init__(self, base_url: str, max_retries: int, model: str = "text-embedding-ada-002"):
+        self.model = model
+        self.client = openai.OpenAI(api_key="benchmark", base_url=base_url, max_retries=max_retries)
+        self.async_client = openai.AsyncOpenAI(api_key="benchmark", base_url=base_url, max_retries=max_retries)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        # OpenAIEmbeddings sends at most chunk_size=1000 inputs per request
+        for start in range(0, len(texts), 1000):
+            response = self.client.embeddings.create(input=texts[start:start + 1000], model=self.model)
+            vectors.extend(item.embedding for item in response.data)
+        return vectors
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        response = await self.async_client.embeddings.create(input=texts, model=self.model)
+        return [item.embedding for item in response.data]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    parser.add_argument("--latency-per-1k-tokens-ms", type=float, default=20.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.1)
+    parser.add_argument("--tokens-per-minute", type=int, default=0)
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    parser.add_argument("--batch-tokens", type=int, default=20000)
+    args = parser.parse_args()
+
+    from app.core.embedding_scheduler import EmbeddingScheduler
+
+    texts = [f"chunk {i}: " + synthetic_paragraph(i, 120) for i in range(args.chunks)]
+    results = {"chunks": len(texts)}
+
+    def run(name, func):
+        server = start_server(
+            latency_s=args.latency_ms / 1000,
+            throttle_rate=args.throttle_rate,
+            tokens_per_minute=args.tokens_per_minute,
+            latency_per_1k_tokens_s=args.latency_per_1k_tokens_ms / 1000
+        )
+        base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+        start = time.perf_counter()
+        try:
+            vectors, extra = func(base_url)
+            outcome = {"succeeded": True}
+            outcome["in_order"] = all(
+                vector == server.vector(text).tolist() for text, vector in zip(texts, vectors)
+            ) and len(vectors) == len(texts)
+        except Exception as e:
+            extra = {}
+            outcome = {"succeeded": False, "error": f"{type(e).__name__}: {e}"[:200]}
+        outcome["seconds"] = time.perf_counter() - start
+        results[name] = {**outcome, **extra, "server": dict(server.stats)}
+        server.shutdown()
+        server.server_close()
+
+    def sequential(base_url):
+        return OpenAIClientEmbeddings(base_url, max_retries=2).embed_documents(texts), {}
+
+    def scheduled(base_url):
+        scheduler = EmbeddingScheduler(
+            OpenAIClientEmbeddings(base_url, max_retries=0),
+            max_batch_tokens=args.batch_tokens,
+            max_in_flight=args.max_in_flight,
+            tokens_per_minute=args.tokens_per_minute or None,
+            max_retries=8,
+            base_delay=0.25
+        )
+        vectors = asyncio.run(scheduler.embed(texts))
+        return vectors, {"batches": len(scheduler.batches(texts)), "retries": scheduler.retries}
+
+    run("sequential", sequential)
+    run("scheduler", scheduled)
+    if results["sequential"]["succeeded"] and results["scheduler"]["succeeded"]:
+        results["speedup"] = results["sequential"]["seconds"] / results["scheduler"]["seconds"]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Latency, embedding calls and identifier hit rate of the retrieval modes.
+
+Ingests ``--documents`` synthetic contracts whose paragraphs carry a clause
+number and a part ID into a temporary Chroma store and keyword index, then
+asks ``--queries`` questions that name one part ID ("What does part PX-4057
+cover?"). A query is a hit when a retrieved chunk contains that ID.
+
+Query embeddings come from LatencyEmbeddings, which sleeps ``--latency-ms`` per
+call like a remote provider. Its vectors are text hashes without semantics, so
+the dense hit rate is a floor; the point of comparison is that BM25 finds exact
+identifiers and that keyword mode never waits on the embedding API.
+
+Run from the backend directory:
+    python -m benchmarks.bench_hybrid_retrieval --documents 20 --paragraphs 300
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks._support import LatencyEmbeddings, percentiles, synthetic_paragraph
+
+
+def paragraph(doc: int, i: int) -> str:
+    return f"Clause {i // 10 + 1}.{i % 10 + 1}. Part PX-{doc * 10000 + i}. " + synthetic_paragraph(doc * 1000 + i, 80)
+
+
+def build(path: str, embeddings: LatencyEmbeddings, args):
+    from app.core.db_connector import DBConnector
+    from app.core.ingestion_queue import IngestionQueue
+    from app.core.keyword_index import KeywordDocument, KeywordIndex
+    from app.core.text_chunker import TextChunker
+    from benchmarks.bench_document_store import make_client
+
+    db = DBConnector(client=make_client(path), embeddings=embeddings)
+    index = KeywordIndex(os.path.join(path, "keywords.sqlite3"))
+    chunker = TextChunker(chunk_size=1000, chunk_overlap=200)
+    index_seconds = 0.0
+    for doc in range(args.documents):
+        doc_id = f"doc_{doc}"
+        texts = chunker.split_text("\n\n".join(paragraph(doc, i) for i in range(args.paragraphs)))
+        ids = IngestionQueue.chunk_ids(doc_id, texts, {})
+        db.add_chunks(doc_id, ids=ids, documents=texts,
+                      metadatas=[{"page": 1, "chunk_index": i} for i in range(len(texts))],
+                      embeddings=embeddings.embed_documents(texts))
+        started = time.perf_counter()
+        keywords = KeywordDocument(doc_id)
+        for chunk_id, text in zip(ids, texts):
+            keywords.add(chunk_id, text)
+        index.replace_document(keywords)
+        index_seconds += time.perf_counter() - started
+    return db, index, index_seconds
+
+
+async def run_mode(mode: str, db, index, embeddings: LatencyEmbeddings, questions, args) -> dict:
+    from app.core.embedding_processor import EmbeddingProcessor
+    from app.core.query_pipeline import QueryPipeline
+
+    processor = EmbeddingProcessor(embeddings=embeddings)
+    pipeline = QueryPipeline(processor, db, llm=None, top_k=args.k, keyword_index=index, mode=mode)
+    embeddings.latency_s = args.latency_ms / 1000
+    calls = embeddings.calls
+    timings, hits = [], 0
+    for doc_id, part, question in questions:
+        started = time.perf_counter()
+        retrieval = await pipeline.retrieve(question, doc_id)
+        timings.append(time.perf_counter() - started)
+        hits += any(f"{part}." in text for text in retrieval.documents)
+    embeddings.latency_s = 0.0
+    return {
+        "query": percentiles(timings),
+        "hit_rate": hits / len(questions),
+        "embedding_calls_per_query": (embeddings.calls - calls) / len(questions),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--paragraphs", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    parser.add_argument("--modes", nargs="+", default=["dense", "hybrid", "keyword"])
+    args = parser.parse_args()
+
+    picker = random.Random(5)
+    questions = []
+    for _ in range(args.queries):
+        doc, i = picker.randrange(args.documents), picker.randrange(args.paragraphs)
+        part = f"PX-{doc * 10000 + i}"
+        questions.append((f"doc_{doc}", part, f"What does part {part} cover?"))
+
+    embeddings = LatencyEmbeddings(0.0)
+    with tempfile.TemporaryDirectory() as path:
+        db, index, index_seconds = build(path, embeddings, args)
+        report = {
+            "documents": args.documents,
+            "paragraphs_per_document": args.paragraphs,
+            "k": args.k,
+            "index_seconds": index_seconds,
+            "index_mb": os.path.getsize(os.path.join(path, "keywords.sqlite3")) / (1024 * 1024),
+        }
+        for mode in args.modes:
+            report[mode] = asyncio.run(run_mode(mode, db, index, embeddings, questions, args))
+        index.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
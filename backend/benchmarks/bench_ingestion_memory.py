@@ -0,0 +1,142 @@
+"""
+Peak memory of ingesting a large synthetic PDF with the streaming pipeline
+(IngestionQueue + DocumentLoader.iter_chunks) versus the previous buffered flow
+that materialized the full text, every chunk and every embedding at once.
+
+Each mode runs in its own subprocess so RSS measurements do not leak between
+them. Vector writes go to a discarding stand-in by default (``--store none``)
+to isolate the pipeline; ``--store chroma`` writes to a temporary embedded
+Chroma instance instead.
+
+Run from the backend directory:
+    python -m benchmarks.bench_ingestion_memory --pages 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks._support import LatencyEmbeddings, make_pdf
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+class _DiscardingCollection:
+    def add(self, **kwargs):
+        pass
+
+
+class _DiscardingDB:
+    def reset_collection(self, collection_id=None):
+        return _DiscardingCollection()
+
+
+def _run_mode(mode: str, pdf_path: str, store: str, batch_size: int) -> dict:
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    from app.core.document_loader import DocumentLoader
+    from app.core.embedding_processor import EmbeddingProcessor
+    from app.core.ingestion_queue import IngestionQueue
+    from app.core.job_store import JobStore
+
+    tmp = tempfile.mkdtemp()
+    os.environ["PERSIST_DIRECTORY"] = tmp
+    embeddings = LatencyEmbeddings(0.0)
+    loader = DocumentLoader()
+    processor = EmbeddingProcessor(embeddings=embeddings)
+    if store == "chroma":
+        from app.core.db_connector import DBConnector
+        db = DBConnector(embeddings=embeddings)
+    else:
+        db = _DiscardingDB()
+
+    samples = []
+    stop = threading.Event()
+
+    def sampler():
+        while not stop.is_set():
+            samples.append(_rss_mb())
+            time.sleep(0.05)
+
+    async def buffered():
+        result = await loader.load_path(pdf_path, "bench.pdf", "application/pdf")
+        chunks = result["chunks"]
+        vectors = await processor.process_chunks(chunks)
+        db.reset_collection("bench").add(
+            documents=chunks,
+            metadatas=[{"doc_id": "bench", "page": i} for i in range(len(chunks))],
+            ids=[f"bench_{i}" for i in range(len(chunks))],
+            embeddings=vectors
+        )
+        return len(chunks)
+
+    async def streaming():
+        job_store = JobStore(path=os.path.join(tmp, "jobs.sqlite3"))
+        queue = IngestionQueue(job_store, loader, processor, db, batch_size=batch_size)
+        job = job_store.create("bench", "bench.pdf", "application/pdf")
+        await queue._run(job["job_id"], pdf_path)
+        job = job_store.get(job["job_id"])
+        if job["status"] != "completed":
+            raise RuntimeError(job["error"])
+        return job["chunks_stored"]
+
+    baseline = _rss_mb()
+    thread = threading.Thread(target=sampler, daemon=True)
+    thread.start()
+    start = time.perf_counter()
+    chunks = asyncio.run(buffered() if mode == "buffered" else streaming())
+    elapsed = time.perf_counter() - start
+    stop.set()
+    thread.join()
+    loader.close()
+
+    return {
+        "seconds": elapsed,
+        "chunks": chunks,
+        "baseline_rss_mb": baseline,
+        "peak_rss_mb": max(samples),
+        "rss_growth_mb": max(samples) - baseline,
+        # RSS at each quarter of the run, to show whether memory grows with progress
+        "rss_quartiles_mb": [samples[min(len(samples) - 1, len(samples) * q // 4)] for q in range(1, 5)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--store", choices=["none", "chroma"], default="none")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--mode", choices=["buffered", "streaming"], help=argparse.SUPPRESS)
+    parser.add_argument("--pdf", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(_run_mode(args.mode, args.pdf, args.store, args.batch_size)))
+        return
+
+    results = {"pages": args.pages, "store": args.store, "batch_size": args.batch_size}
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as pdf:
+        pdf.write(make_pdf(args.pages))
+        pdf.flush()
+        for mode in ("buffered", "streaming"):
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_ingestion_memory", "--mode", mode, "--pdf", pdf.name,
+                 "--store", args.store, "--batch-size", str(args.batch_size)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            results[mode] = json.loads(output.strip().splitlines()[-1])
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
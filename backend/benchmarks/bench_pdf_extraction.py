@@ -0,0 +1,70 @@
+"""
+PDF extraction throughput of DocumentLoader for different process pool sizes,
+and how much the event loop stalls while a document is being extracted.
+
+Event-loop lag is measured by a ticker coroutine that wakes every 10 ms while
+``load_pdf`` runs; a large maximum lag means concurrent requests on the same
+worker would have been frozen.
+
+Run from the backend directory:
+    python -m benchmarks.bench_pdf_extraction --pages 500 --workers 1 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from benchmarks._support import make_pdf
+
+
+async def _measure(loader, path: str) -> dict:
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            before = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - before - 0.01)
+
+    ticker_task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    chunks = await loader.load_pdf(path)
+    elapsed = time.perf_counter() - start
+    done.set()
+    await ticker_task
+    return {
+        "seconds": elapsed,
+        "chunks": len(chunks),
+        "loop_lag_max_ms": max(lags, default=0.0) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--pages-per-task", type=int, default=20)
+    args = parser.parse_args()
+
+    from app.core.document_loader import DocumentLoader
+
+    results = {"pages": args.pages, "runs": {}}
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as pdf:
+        pdf.write(make_pdf(args.pages))
+        pdf.flush()
+        for workers in args.workers:
+            loader = DocumentLoader(max_workers=workers, pages_per_task=args.pages_per_task)
+            # Warm the pool so process start-up is not billed to the first run
+            asyncio.run(loader.load_pdf(pdf.name))
+            run = asyncio.run(_measure(loader, pdf.name))
+            run["pages_per_second"] = args.pages / run["seconds"]
+            results["runs"][str(workers)] = run
+            loader.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Recall, latency and memory of the quantized storage modes of the mmap vector store.
+
+Builds one MmapCollection of ``--size`` clustered unit vectors (``--clusters``
+centers plus noise, closer to real embeddings than uniform noise) and
+``--queries`` queries drawn near stored vectors. Each storage mode in
+``--modes`` is then searched for every rerank factor in ``--rerank-factors``,
+in a fresh spawned process so the resident memory it reports only counts the
+pages that mode's searches touched. Recall@k is measured against the exact
+float32 results ("none").
+
+Run from the backend directory:
+    python -m benchmarks.bench_quantization --size 200000 --dimension 1536
+"""
+import argparse
+import json
+import multiprocessing
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks._support import percentiles
+from benchmarks.bench_document_store import directory_size
+
+
+def resident_mb() -> float:
+    """Resident set size of this process from /proc, in megabytes."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def clustered_vectors(rng: np.random.Generator, centers: np.ndarray, count: int, noise: float) -> np.ndarray:
+    vectors = centers[rng.integers(len(centers), size=count)]
+    vectors = vectors + noise * rng.standard_normal(vectors.shape).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build(path: str, args) -> np.ndarray:
+    """Store the collection at path and return the query vectors."""
+    from app.core.mmap_vector_store import MmapCollection
+    rng = np.random.default_rng(17)
+    centers = rng.standard_normal((args.clusters, args.dimension)).astype(np.float32)
+    collection = MmapCollection(path, "bench", {"dimension": args.dimension}, quantization="none")
+    for offset in range(0, args.size, args.batch):
+        count = min(args.batch, args.size - offset)
+        collection.add(
+            ids=[f"chunk_{i}" for i in range(offset, offset + count)],
+            embeddings=clustered_vectors(rng, centers, count, args.noise),
+            metadatas=[{"doc_id": f"doc_{i // 50}"} for i in range(offset, offset + count)]
+        )
+    collection.close()
+    anchors = rng.standard_normal((args.queries, args.dimension)).astype(np.float32)
+    return clustered_vectors(rng, centers, args.queries, args.noise) + 0.1 * anchors
+
+
+def search(path: str, mode: str, rerank_factor: int, queries: np.ndarray, k: int) -> dict:
+    """Open the collection in the given mode and time top-k queries; runs in a child process."""
+    from app.core.mmap_vector_store import MmapCollection
+    baseline = resident_mb()
+    started = time.perf_counter()
+    collection = MmapCollection(path, "bench", quantization=mode, rerank_factor=rerank_factor)
+    open_seconds = time.perf_counter() - started
+    opened = resident_mb()
+
+    timings, ids = [], []
+    for query in queries:
+        started = time.perf_counter()
+        result = collection.query(query_embeddings=[query.tolist()], n_results=k, include=["distances"])
+        timings.append(time.perf_counter() - started)
+        ids.append(result["ids"][0])
+    searched = resident_mb()
+    stats = collection.stats()
+    collection.close()
+    return {
+        "open_seconds": open_seconds,
+        "query": percentiles(timings),
+        "search_mb": stats["search_bytes"] / (1024 * 1024),
+        "full_precision_mb": stats["full_precision_bytes"] / (1024 * 1024),
+        "rss_opened_mb": opened - baseline,
+        "rss_after_queries_mb": searched - baseline,
+        "ids": ids,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=200000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=2000)
+    parser.add_argument("--noise", type=float, default=0.6)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=10000)
+    parser.add_argument("--modes", nargs="+", default=["none", "float16", "int8"])
+    parser.add_argument("--rerank-factors", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    source = f"{root}/source"
+    try:
+        queries = build(source, args)
+        report = {"size": args.size, "dimension": args.dimension, "k": args.k, "results": {}}
+        context = multiprocessing.get_context("spawn")
+        truth = None
+        for mode in ["none"] + [mode for mode in args.modes if mode != "none"]:
+            # Quantize once outside the measured process; each mode gets its own copy
+            path = f"{root}/{mode}"
+            shutil.copytree(source, path)
+            started = time.perf_counter()
+            search(path, mode, 1, queries[:1], args.k)
+            quantize_seconds = time.perf_counter() - started
+            disk_mb = directory_size(path) / (1024 * 1024)
+
+            for factor in ([1] if mode == "none" else args.rerank_factors):
+                with context.Pool(1) as pool:
+                    run = pool.apply(search, (path, mode, factor, queries, args.k))
+                ids = run.pop("ids")
+                if truth is None:
+                    truth = ids
+                run["recall_at_k"] = sum(len(set(a) & set(b)) for a, b in zip(ids, truth)) / (len(truth) * args.k)
+                run["quantize_seconds"] = quantize_seconds
+                run["disk_mb"] = disk_mb
+                name = mode if mode == "none" else f"{mode}_rerank{factor}"
+                report["results"][name] = run
+                print(json.dumps({name: run}), flush=True)
+            shutil.rmtree(path)
+        print(json.dumps(report, indent=2))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Time to ingest an edited revision of a large document:
+
+- full: the revision is uploaded as a new document, without an embedding cache
+  (the behaviour before fingerprinting and chunk-level dedup)
+- full_cached: the same, with the EmbeddingCache warmed by the first version
+- incremental: the revision is uploaded with the doc_id of the first version,
+  so only changed chunks are embedded and written
+- identical: the unchanged first version is uploaded again
+
+Run from the backend directory:
+    python -m benchmarks.bench_reingestion --paragraphs 2000 --edits 5
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import tempfile
+import time
+
+from starlette.datastructures import Headers, UploadFile
+
+from benchmarks._support import LatencyEmbeddings, synthetic_paragraph
+
+
+def build_versions(paragraphs: int, edits: int, seed: int = 13):
+    rng = random.Random(seed)
+    first = [f"Clause {i}. " + synthetic_paragraph(i, rng.randint(40, 140)) for i in range(paragraphs)]
+    second = list(first)
+    for i in rng.sample(range(paragraphs), edits):
+        second[i] = second[i] + " This clause was amended."
+    return "\n\n".join(first).encode("utf-8"), "\n\n".join(second).encode("utf-8")
+
+
+def upload(name: str, body: bytes) -> UploadFile:
+    return UploadFile(io.BytesIO(body), filename=name, headers=Headers({"content-type": "text/plain"}))
+
+
+async def wait(queue, job_id: str) -> dict:
+    while True:
+        job = queue.job_store.get(job_id)
+        if job["status"] in ("completed", "failed"):
+            return job
+        await asyncio.sleep(0.01)
+
+
+async def scenario(mode: str, first: bytes, second: bytes, args) -> dict:
+    from app.core.db_connector import DBConnector
+    from app.core.document_loader import DocumentLoader
+    from app.core.embedding_cache import EmbeddingCache
+    from app.core.embedding_processor import EmbeddingProcessor
+    from app.core.ingestion_queue import IngestionQueue
+    from app.core.job_store import JobStore
+    from benchmarks.bench_document_store import make_client
+
+    with tempfile.TemporaryDirectory() as path:
+        os.environ["INGESTION_SPOOL_DIR"] = os.path.join(path, "spool")
+        client = make_client(path)
+        embeddings = LatencyEmbeddings(args.latency_ms / 1000, per_text_latency_s=args.per_text_ms / 1000)
+        cache = EmbeddingCache(path=os.path.join(path, "cache.sqlite3")) if mode == "full_cached" else None
+        queue = IngestionQueue(
+            job_store=JobStore(path=os.path.join(path, "jobs.sqlite3")),
+            document_loader=DocumentLoader(),
+            embedding_processor=EmbeddingProcessor(embeddings=embeddings, cache=cache),
+            db_connector=DBConnector(client=client, embeddings=embeddings),
+            workers=1
+        )
+        await queue.start()
+        try:
+            job = await queue.submit(upload("contract.txt", first))
+            job = await wait(queue, job["job_id"])
+            embedded_before = embeddings.texts_embedded
+
+            started = time.perf_counter()
+            if mode == "identical":
+                job = await queue.submit(upload("contract.txt", first))
+            elif mode == "incremental":
+                job = await queue.submit(upload("contract.txt", second), doc_id=job["doc_id"])
+            else:
+                job = await queue.submit(upload("contract.txt", second))
+            job = await wait(queue, job["job_id"])
+            seconds = time.perf_counter() - started
+
+            return {
+                "seconds": seconds,
+                "status": job["status"],
+                "chunks_total": job["chunks_total"],
+                "chunks_reused": job["chunks_reused"],
+                "texts_embedded": embeddings.texts_embedded - embedded_before,
+                "stored_chunks": queue.db_connector.count_document_chunks(job["doc_id"]),
+            }
+        finally:
+            await queue.stop()
+            queue.document_loader.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paragraphs", type=int, default=2000)
+    parser.add_argument("--edits", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--per-text-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    first, second = build_versions(args.paragraphs, args.edits)
+    results = {"bytes": len(second), "edits": args.edits}
+    for mode in ("full", "full_cached", "incremental", "identical"):
+        results[mode] = asyncio.run(scenario(mode, first, second, args))
+    results["speedup_incremental"] = results["full"]["seconds"] / results["incremental"]["seconds"]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
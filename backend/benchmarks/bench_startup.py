@@ -0,0 +1,95 @@
+"""
+Cold start of a backend worker: importing app.main and running its lifespan.
+
+Each run is a fresh interpreter. The import is measured with
+``python -X importtime`` (cumulative microseconds of app.main, plus the
+slowest modules it pulls in); the worker run imports the app and enters its
+lifespan through TestClient, which builds the Components and starts the
+ingestion workers, against a temporary data directory with the local
+hashing embeddings and fake chat model, so no network is needed.
+
+``--budget-ms`` makes the script exit 1 when the fastest import of app.main
+takes longer, so it can guard against a module-level import creeping back in.
+
+Run from the backend directory:
+    python -m benchmarks.bench_startup --repeat 5 --budget-ms 1500
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+_WORKER = """
+import json, time
+started = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(app):
+    ready = time.perf_counter()
+print(json.dumps({"import_s": imported - started, "lifespan_s": ready - imported}))
+"""
+
+
+def import_times(env) -> dict:
+    """Cumulative import time in microseconds of every module imported by app.main."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"],
+                            env=env, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        try:
+            times[name.strip()] = int(cumulative)
+        except ValueError:
+            continue  # the header line
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest modules to report")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail when importing app.main takes longer")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as path:
+        env = {
+            **os.environ,
+            "EMBEDDING_PROVIDER": "hashing",
+            "LLM_PROVIDER": "fake",
+            "CHROMA_PERSIST_DIR": os.path.join(path, "chroma"),
+            "VECTOR_STORE_PATH": os.path.join(path, "vectors"),
+            "EMBEDDING_CACHE_PATH": os.path.join(path, "embedding_cache.sqlite3"),
+            "INGESTION_JOB_DB": os.path.join(path, "jobs.sqlite3"),
+            "KEYWORD_INDEX_PATH": os.path.join(path, "keyword_index.sqlite3"),
+        }
+        imports = [import_times(env) for _ in range(args.repeat)]
+        workers = []
+        for _ in range(args.repeat):
+            result = subprocess.run([sys.executable, "-c", _WORKER], env=env, capture_output=True, text=True,
+                                    check=True)
+            workers.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    fastest = min(imports, key=lambda times: times["app.main"])
+    slowest_modules = sorted(((us, name) for name, us in fastest.items() if name != "app.main"), reverse=True)
+    import_ms = fastest["app.main"] / 1000
+    report = {
+        "repeat": args.repeat,
+        "import_app_main_ms": import_ms,
+        "slowest_modules_ms": {name: us / 1000 for us, name in slowest_modules[:args.top]},
+        "worker_import_ms": min(worker["import_s"] for worker in workers) * 1000,
+        "worker_lifespan_ms": min(worker["lifespan_s"] for worker in workers) * 1000,
+        "budget_ms": args.budget_ms,
+    }
+    print(json.dumps(report, indent=2))
+    if args.budget_ms is not None and import_ms > args.budget_ms:
+        print(f"Importing app.main took {import_ms:.0f} ms, over the {args.budget_ms:.0f} ms budget", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Insert throughput, query latency and recall of the vector store backends:
+
+- chroma: embedded persistent Chroma collection (HNSW index)
+- mmap: MmapVectorClient collection (memory-mapped float32 matrix, exact top-k)
+
+For every size in ``--sizes`` each backend stores that many random unit vectors,
+grouped into documents of ``--chunks`` vectors, in a fresh temporary store. It
+then runs ``--queries`` top-``--k`` queries over the whole collection and the
+same number filtered on one document's doc_id, as DBConnector.query_documents
+does. Recall is measured against the exact top-k of the mmap backend. Chroma is
+skipped above ``--chroma-max`` vectors, where building its index takes too long.
+
+Run from the backend directory:
+    python -m benchmarks.bench_vector_backends --sizes 1000 100000 --dimension 1536
+    python -m benchmarks.bench_vector_backends --sizes 1000000 --dimension 384 --chroma-max 0
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks._support import percentiles
+from benchmarks.bench_document_store import directory_size, make_client
+
+
+def make_collection(backend: str, path: str, dimension: int):
+    if backend == "mmap":
+        from app.core.mmap_vector_store import MmapVectorClient
+        client = MmapVectorClient(path)
+    else:
+        client = make_client(path)
+    return client, client.create_collection(name="bench", metadata={"dimension": dimension, "space": "cosine"})
+
+
+def batch_vectors(size: int, dimension: int, batch: int):
+    """Yield (offset, vectors) batches, identical for every backend."""
+    rng = np.random.default_rng(7)
+    for offset in range(0, size, batch):
+        vectors = rng.standard_normal((min(batch, size - offset), dimension)).astype(np.float32)
+        # Unit vectors rank the same under cosine and L2, whatever space the collection uses
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        yield offset, vectors
+
+
+def run_backend(backend: str, size: int, queries: np.ndarray, doc_picks: list, args) -> dict:
+    with tempfile.TemporaryDirectory() as path:
+        client, collection = make_collection(backend, path, args.dimension)
+        start = time.perf_counter()
+        for offset, vectors in batch_vectors(size, args.dimension, args.batch):
+            positions = range(offset, offset + len(vectors))
+            collection.add(
+                ids=[f"chunk_{i}" for i in positions],
+                documents=[f"chunk {i}" for i in positions],
+                metadatas=[{"doc_id": f"doc_{i // args.chunks}", "chunk_index": i % args.chunks} for i in positions],
+                embeddings=vectors if backend == "mmap" else vectors.tolist()
+            )
+        insert_seconds = time.perf_counter() - start
+
+        results = {"insert_seconds": insert_seconds, "vectors_per_second": size / insert_seconds}
+        for mode in ("unfiltered", "filtered"):
+            timings, ids = [], []
+            for query, doc_id in zip(queries, doc_picks):
+                started = time.perf_counter()
+                result = collection.query(
+                    query_embeddings=[query.tolist()],
+                    n_results=args.k,
+                    where={"doc_id": doc_id} if mode == "filtered" else None,
+                    include=["metadatas", "documents", "distances"]
+                )
+                timings.append(time.perf_counter() - started)
+                ids.append(result["ids"][0])
+            results[mode] = {"query": percentiles(timings), "ids": ids}
+        results["disk_mb"] = directory_size(path) / (1024 * 1024)
+        if hasattr(client, "close"):
+            client.close()
+        return results
+
+
+def recall(ids: list, truth: list) -> float:
+    return sum(len(set(found) & set(expected)) for found, expected in zip(ids, truth)) / sum(map(len, truth))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--chunks", type=int, default=50, help="vectors per document")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=5000)
+    parser.add_argument("--chroma-max", type=int, default=100000)
+    parser.add_argument("--backends", nargs="+", default=["mmap", "chroma"])
+    args = parser.parse_args()
+
+    report = {"dimension": args.dimension, "k": args.k, "chunks_per_document": args.chunks, "sizes": {}}
+    for size in args.sizes:
+        rng = np.random.default_rng(11)
+        picker = random.Random(13)
+        queries = rng.standard_normal((args.queries, args.dimension)).astype(np.float32)
+        doc_picks = [f"doc_{picker.randrange((size + args.chunks - 1) // args.chunks)}" for _ in range(args.queries)]
+
+        runs = {}
+        # mmap runs first: its exact results are the ground truth for recall
+        for backend in sorted(args.backends, key=lambda name: name != "mmap"):
+            if backend == "chroma" and size > args.chroma_max:
+                continue
+            runs[backend] = run_backend(backend, size, queries, doc_picks, args)
+
+        summary = {}
+        for backend, run in runs.items():
+            summary[backend] = {key: value for key, value in run.items() if key not in ("unfiltered", "filtered")}
+            for mode in ("unfiltered", "filtered"):
+                summary[backend][mode] = run[mode]["query"]
+                if "mmap" in runs:
+                    summary[backend][mode]["recall_at_k"] = recall(run[mode]["ids"], runs["mmap"][mode]["ids"])
+        report["sizes"][size] = summary
+        print(json.dumps({size: summary}), flush=True)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
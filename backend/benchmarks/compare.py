@@ -0,0 +1,64 @@
+"""
+Compare two benchmark suite results and flag regressions.
+
+Prints every metric present in both files with its relative change, oriented
+so that a negative change is always worse. Exits with status 1 when any metric
+got worse by more than ``--threshold`` (a fraction, 0.1 = 10%), so it can gate
+a CI job. Single runs on a shared box vary by 10-15%, hence the 20% default.
+
+Run from the backend directory:
+    python -m benchmarks.compare base.json head.json --threshold 0.2
+"""
+import argparse
+import json
+import sys
+
+
+def compare(base: dict, head: dict, threshold: float):
+    """Return (rows, regressions) for the metrics both results share."""
+    rows, regressions = [], []
+    for name in sorted(set(base["metrics"]) & set(head["metrics"])):
+        before, after = base["metrics"][name], head["metrics"][name]
+        if before["value"] == 0:
+            continue
+        change = (after["value"] - before["value"]) / before["value"]
+        if before["better"] == "lower":
+            change = -change
+        row = {"metric": name, "base": before["value"], "head": after["value"], "unit": after["unit"],
+               "change": change}
+        rows.append(row)
+        if change < -threshold:
+            regressions.append(row)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--json", action="store_true", help="Print the comparison as JSON")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+    if base.get("config") != head.get("config"):
+        print("warning: the two runs used different configurations", file=sys.stderr)
+
+    rows, regressions = compare(base, head, args.threshold)
+    if args.json:
+        print(json.dumps({"base": base.get("commit"), "head": head.get("commit"), "threshold": args.threshold,
+                          "metrics": rows, "regressions": [row["metric"] for row in regressions]}, indent=2))
+    else:
+        print(f"{'metric':32} {'base':>12} {'head':>12} {'unit':>9} {'change':>8}")
+        for row in rows:
+            flag = "  REGRESSION" if row in regressions else ""
+            print(f"{row['metric']:32} {row['base']:12.2f} {row['head']:12.2f} {row['unit']:>9} "
+                  f"{row['change']:+8.1%}{flag}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Local stand-in for the OpenAI embeddings endpoint that injects latency and 429s.
+
+Serves POST /v1/embeddings with deterministic vectors (float or base64, as the
+client asks), sleeping ``--latency-ms`` per request plus
+``--latency-per-1k-tokens-ms`` for every thousand input tokens. Requests are throttled with
+HTTP 429 either at random (``--throttle-rate``) or when a request needs more
+tokens than remain of ``--tokens-per-minute``, which replenishes continuously
+like the provider's limits. GET /stats returns request
+counters.
+
+Run from the backend directory and point the backend at it:
+    python -m benchmarks.fake_embedding_server --port 8089 --latency-ms 150 --throttle-rate 0.1
+    OPENAI_API_BASE=http://127.0.0.1:8089/v1 OPENAI_API_KEY=fake uvicorn app.main:app
+"""
+import argparse
+import array
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+
+class FakeEmbeddingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency_s: float, throttle_rate: float, tokens_per_minute: int,
+                 dimension: int, latency_per_1k_tokens_s: float = 0.0, seed: int = 0):
+        super().__init__(address, _Handler)
+        self.latency_s = latency_s
+        self.latency_per_1k_tokens_s = latency_per_1k_tokens_s
+        self.throttle_rate = throttle_rate
+        self.tokens_per_minute = tokens_per_minute
+        self.dimension = dimension
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.budget = float(tokens_per_minute)
+        self.updated = time.monotonic()
+        self.stats = {"requests": 0, "throttled": 0, "inputs": 0, "tokens": 0}
+
+    def admit(self, tokens: int) -> bool:
+        """Record a request and decide whether it is throttled."""
+        with self.lock:
+            self.stats["requests"] += 1
+            now = time.monotonic()
+            self.budget = min(
+                self.tokens_per_minute, self.budget + (now - self.updated) * self.tokens_per_minute / 60
+            )
+            self.updated = now
+            if self.random.random() < self.throttle_rate or (self.tokens_per_minute and tokens > self.budget):
+                self.stats["throttled"] += 1
+                return False
+            self.budget -= tokens
+            self.stats["tokens"] += tokens
+            return True
+
+    def vector(self, item) -> array.array:
+        seed = hashlib.sha256(json.dumps(item).encode("utf-8")).digest()
+        return array.array("f", ((seed[i % len(seed)] - 128) / 128.0 for i in range(self.dimension)))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeEmbeddingServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: dict, headers: Tuple[Tuple[str, str], ...] = ()):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            with self.server.lock:
+                self._send(200, dict(self.server.stats))
+        else:
+            self._send(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/embeddings"):
+            self._send(404, {"error": {"message": "Not found"}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        inputs = request["input"]
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        # Inputs are strings or, when the client tokenizes, lists of token ids
+        tokens = sum(len(item) // 4 + 1 if isinstance(item, str) else len(item) for item in inputs)
+
+        time.sleep(self.server.latency_s + self.server.latency_per_1k_tokens_s * tokens / 1000)
+        if not self.server.admit(tokens):
+            self._send(429, {"error": {
+                "message": "Rate limit reached for requests",
+                "type": "requests",
+                "code": "rate_limit_exceeded"
+            }})
+            return
+
+        with self.server.lock:
+            self.server.stats["inputs"] += len(inputs)
+        as_base64 = request.get("encoding_format") == "base64"
+        data = []
+        for index, item in enumerate(inputs):
+            vector = self.server.vector(item)
+            embedding = base64.b64encode(vector.tobytes()).decode("ascii") if as_base64 else vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        self._send(200, {
+            "object": "list",
+            "data": data,
+            "model": request.get("model", "text-embedding-ada-002"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        })
+
+
+def start_server(port: int = 0, latency_s: float = 0.1, throttle_rate: float = 0.0,
+                 tokens_per_minute: int = 0, dimension: int = 1536,
+                 latency_per_1k_tokens_s: float = 0.0) -> FakeEmbeddingServer:
+    """Start the server on a background thread; its base URL is http://127.0.0.1:<port>/v1."""
+    server = FakeEmbeddingServer(
+        ("127.0.0.1", port), latency_s, throttle_rate, tokens_per_minute, dimension, latency_per_1k_tokens_s
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    parser.add_argument("--latency-per-1k-tokens-ms", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.1)
+    parser.add_argument("--tokens-per-minute", type=int, default=0)
+    parser.add_argument("--dimension", type=int, default=1536)
+    args = parser.parse_args()
+
+    server = FakeEmbeddingServer(
+        ("127.0.0.1", args.port), args.latency_ms / 1000, args.throttle_rate, args.tokens_per_minute,
+        args.dimension, args.latency_per_1k_tokens_ms / 1000
+    )
+    print(f"Fake embedding server on http://127.0.0.1:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
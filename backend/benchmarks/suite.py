@@ -0,0 +1,248 @@
+"""
+Benchmark suite for the ingestion and query hot paths.
+
+Runs every stage against synthetic corpora and local stand-in providers
+(hashing embeddings, fake chat model), so it needs no network or API key:
+
+- loader.<format>: DocumentLoader.process_file on a PDF, DOCX and TXT upload
+- chunker: TextChunker.split_text on the text of the TXT corpus
+- embedding: EmbeddingProcessor.process_chunks through the EmbeddingScheduler,
+  with ``--embedding-latency-ms`` per provider request
+- vector_write: DBConnector.add_chunks into a temporary Chroma store
+- query: POST /api/v1/query end to end through the FastAPI app
+
+``--scale`` multiplies the corpus sizes. Each stage runs ``--repeat`` times and
+reports its fastest run, which is the least disturbed by other load on the box. Results are a flat map of metric name to value, unit and
+whether higher or lower is better, written to ``--output`` together with the
+git commit, so that two runs can be compared with benchmarks.compare.
+
+Run from the backend directory:
+    python -m benchmarks.suite --scale 1 --output bench-results.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks._support import make_docx, make_pdf, make_txt, percentiles
+
+FORMATS = {
+    "pdf": ("corpus.pdf", "application/pdf"),
+    "docx": ("corpus.docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+    "txt": ("corpus.txt", "text/plain"),
+}
+
+
+def metric(value: float, unit: str, better: str) -> dict:
+    return {"value": value, "unit": unit, "better": better}
+
+
+def best_run(repeat: int, run) -> dict:
+    """Run a stage repeat times and return the fastest run's seconds and the last run's result."""
+    timings, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = run()
+        timings.append(time.perf_counter() - started)
+    return {"seconds": min(timings), "result": result}
+
+
+def corpora(scale: float) -> dict:
+    return {
+        "pdf": make_pdf(max(1, int(100 * scale))),
+        "docx": make_docx(max(1, int(1000 * scale))),
+        "txt": make_txt(max(1, int(5000 * scale))),
+    }
+
+
+def bench_loader(files: dict, repeat: int) -> dict:
+    from starlette.datastructures import Headers, UploadFile
+    from app.core.document_loader import DocumentLoader
+
+    loader = DocumentLoader()
+    metrics = {}
+    try:
+        for name, data in files.items():
+            filename, content_type = FORMATS[name]
+
+            def run():
+                upload = UploadFile(io.BytesIO(data), filename=filename,
+                                    headers=Headers({"content-type": content_type}))
+                return asyncio.run(loader.process_file(upload))
+
+            run()  # start the extraction processes outside the measurement
+            measured = best_run(repeat, run)
+            chunks = measured["result"]["metadata"]["chunk_count"]
+            metrics[f"loader.{name}.mb_per_s"] = metric(len(data) / 1e6 / measured["seconds"], "MB/s", "higher")
+            metrics[f"loader.{name}.chunks_per_s"] = metric(chunks / measured["seconds"], "chunks/s", "higher")
+    finally:
+        loader.close()
+    return metrics
+
+
+def bench_chunker(text: str, repeat: int) -> dict:
+    from app.core.text_chunker import TextChunker
+    chunker = TextChunker(chunk_size=1000, chunk_overlap=200)
+    measured = best_run(repeat, lambda: chunker.split_text(text))
+    return {
+        "chunker.mb_per_s": metric(len(text.encode("utf-8")) / 1e6 / measured["seconds"], "MB/s", "higher"),
+        "chunker.chunks_per_s": metric(len(measured["result"]) / measured["seconds"], "chunks/s", "higher"),
+    }
+
+
+def bench_embedding(chunks: list, latency_ms: float, repeat: int) -> dict:
+    from app.core.embedding_processor import EmbeddingProcessor
+    from app.core.providers import HashingEmbeddings
+
+    embeddings = HashingEmbeddings(latency_s=latency_ms / 1000)
+
+    def run():
+        # A fresh processor per event loop, without a cache, so every run embeds every chunk
+        processor = EmbeddingProcessor(embeddings=embeddings)
+        return asyncio.run(processor.process_chunks(chunks))
+
+    measured = best_run(repeat, run)
+    return {
+        "embedding.chunks_per_s": metric(len(chunks) / measured["seconds"], "chunks/s", "higher"),
+        "embedding.requests_per_run": metric(embeddings.calls / repeat, "requests", "lower"),
+    }
+
+
+def bench_vector_write(chunks: list, repeat: int) -> dict:
+    from app.core.db_connector import DBConnector
+    from app.core.providers import HashingEmbeddings
+    from benchmarks.bench_document_store import make_client
+
+    embeddings = HashingEmbeddings(latency_s=0.0)
+    vectors = embeddings.embed_documents(chunks)
+    metadatas = [{"page": 1, "chunk_index": i} for i in range(len(chunks))]
+    with tempfile.TemporaryDirectory() as path:
+        db = DBConnector(client=make_client(path), embeddings=embeddings)
+        runs = iter(range(repeat))
+
+        def run():
+            doc_id = f"doc_{next(runs)}"
+            db.add_chunks(doc_id, ids=[f"{doc_id}_{i}" for i in range(len(chunks))], documents=chunks,
+                          metadatas=metadatas, embeddings=vectors)
+
+        measured = best_run(repeat, run)
+    return {"vector_write.chunks_per_s": metric(len(chunks) / measured["seconds"], "chunks/s", "higher")}
+
+
+def bench_query(files: dict, queries: int) -> dict:
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as client:
+        response = client.post("/api/v1/ingest", files={"file": (FORMATS["txt"][0], files["txt"], FORMATS["txt"][1])})
+        response.raise_for_status()
+        job = response.json()
+        while True:
+            status = client.get(f"/api/v1/jobs/{job['job_id']}").json()
+            if status["status"] in ("completed", "failed"):
+                break
+            time.sleep(0.05)
+        if status["status"] != "completed":
+            raise RuntimeError(f"Ingestion failed: {status['error']}")
+
+        timings = []
+        for i in range(queries):
+            started = time.perf_counter()
+            response = client.post("/api/v1/query", json={
+                "text": f"What does clause {i} say about payment {i % 13}?",
+                "context_id": job["doc_id"]
+            })
+            timings.append(time.perf_counter() - started)
+            response.raise_for_status()
+    summary = percentiles(timings)
+    return {
+        f"query.{name}": metric(summary[f"{name}_ms"], "ms", "lower") for name in ("p50", "p95", "p99")
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--embedding-latency-ms", type=float, default=20.0)
+    parser.add_argument("--stages", nargs="+", default=["loader", "chunker", "embedding", "vector_write", "query"])
+    parser.add_argument("--output", help="Write the results to this file as well as stdout")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    # Local providers and throwaway stores for every stage, including the app
+    os.environ.update(
+        EMBEDDING_PROVIDER="hashing",
+        LLM_PROVIDER="fake",
+        HASHING_EMBEDDING_LATENCY_MS=str(args.embedding_latency_ms),
+        PERSIST_DIRECTORY=os.path.join(workdir, "chroma"),
+        EMBEDDING_CACHE_PATH=os.path.join(workdir, "embedding_cache.sqlite3"),
+        INGESTION_JOB_DB=os.path.join(workdir, "jobs.sqlite3"),
+        INGESTION_SPOOL_DIR=os.path.join(workdir, "spool"),
+        KEYWORD_INDEX_PATH=os.path.join(workdir, "keyword_index.sqlite3"),
+        ANSWER_CACHE_PATH=os.path.join(workdir, "answer_cache.sqlite3"),
+        VECTOR_STORE_PATH=os.path.join(workdir, "vector_store"),
+    )
+
+    files = corpora(args.scale)
+    text = files["txt"].decode("utf-8")
+    chunks = None
+    metrics = {}
+    for stage in args.stages:
+        started = time.perf_counter()
+        if stage == "loader":
+            metrics.update(bench_loader(files, args.repeat))
+        elif stage == "chunker":
+            metrics.update(bench_chunker(text, args.repeat))
+        elif stage in ("embedding", "vector_write"):
+            if chunks is None:
+                from app.core.text_chunker import TextChunker
+                chunks = TextChunker(chunk_size=1000, chunk_overlap=200).split_text(text)
+            if stage == "embedding":
+                metrics.update(bench_embedding(chunks, args.embedding_latency_ms, args.repeat))
+            else:
+                metrics.update(bench_vector_write(chunks, args.repeat))
+        elif stage == "query":
+            metrics.update(bench_query(files, args.queries))
+        else:
+            raise ValueError(f"Unknown stage: {stage}")
+        print(f"{stage} finished in {time.perf_counter() - started:.1f}s", file=sys.stderr, flush=True)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {
+            "scale": args.scale,
+            "repeat": args.repeat,
+            "queries": args.queries,
+            "embedding_latency_ms": args.embedding_latency_ms,
+            "corpus_bytes": {name: len(data) for name, data in files.items()},
+        },
+        "metrics": metrics,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+from typing import Any, Dict, List
+from app.core.db_connector import DBConnector
+
+import pytest
+
+
+class FakeVectorStore:
+    """The DBConnector methods ingestion uses, backed by a dict; ``fail_reads`` makes that many reads raise."""
+
+    def __init__(self):
+        self.chunks: Dict[str, Dict[str, Any]] = {}
+        self.fail_reads = 0
+
+    def document_chunk_metadata(self, doc_id: str) -> Dict[str, Dict[str, Any]]:
+        if self.fail_reads:
+            self.fail_reads -= 1
+            raise ConnectionError("vector store unavailable")
+        return {chunk_id: dict(chunk["metadata"]) for chunk_id, chunk in self.chunks.items()
+                if chunk["metadata"]["doc_id"] == doc_id}
+
+    def add_chunks(self, doc_id: str, ids: List[str], documents: List[str],
+                   metadatas: List[Dict[str, Any]], embeddings: List[List[float]], staged: bool = False):
+        tag = DBConnector.staging_id(doc_id) if staged else doc_id
+        for chunk_id, text, metadata in zip(ids, documents, metadatas):
+            self.chunks[chunk_id] = {"text": text, "metadata": {**metadata, "doc_id": tag}}
+
+    def publish_chunks(self, doc_id: str, staged_ids: List[str], moved_ids: List[str],
+                       moved_metadatas: List[Dict[str, Any]], removed_ids: List[str]):
+        for chunk_id in staged_ids:
+            self.chunks[chunk_id]["metadata"]["doc_id"] = doc_id
+        self.update_chunk_metadata(doc_id, moved_ids, moved_metadatas)
+        self.delete_chunks(doc_id, removed_ids)
+
+    def discard_staged(self, doc_id: str) -> int:
+        return self.delete_chunks(doc_id, list(self.document_chunk_metadata(DBConnector.staging_id(doc_id))))
+
+    def update_chunk_metadata(self, doc_id: str, ids: List[str], metadatas: List[Dict[str, Any]]):
+        for chunk_id, metadata in zip(ids, metadatas):
+            self.chunks[chunk_id]["metadata"] = {**metadata, "doc_id": doc_id}
+
+    def delete_chunks(self, doc_id: str, ids: List[str]) -> int:
+        for chunk_id in ids:
+            self.chunks.pop(chunk_id, None)
+        return len(ids)
+
+    def count_document_chunks(self, doc_id: str) -> int:
+        return sum(1 for chunk in self.chunks.values() if chunk["metadata"]["doc_id"] == doc_id)
+
+
+class FakeEmbeddingProcessor:
+    """Embeds every text as a one-dimensional vector of its length."""
+
+    def __init__(self):
+        self.texts_embedded = 0
+
+    async def process_chunks(self, chunks: List[str]) -> List[List[float]]:
+        self.texts_embedded += len(chunks)
+        return [[float(len(text))] for text in chunks]
+
+
+@pytest.fixture
+def vector_store() -> FakeVectorStore:
+    return FakeVectorStore()
+
+
+@pytest.fixture
+def embedding_processor() -> FakeEmbeddingProcessor:
+    return FakeEmbeddingProcessor()
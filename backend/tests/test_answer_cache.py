@@ -0,0 +1,70 @@
+from app.core.answer_cache import AnswerCache, normalize_question, question_terms
+
+import pytest
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"), ttl_s=3600, max_entries=100)
+    yield cache
+    cache.close()
+
+
+def test_questions_are_normalized():
+    assert normalize_question("  What is the  NOTICE period?? ") == "what is the notice period"
+    assert question_terms("Can you tell me the notice period?") == question_terms("notice period")
+
+
+def test_get_returns_what_put_stored(cache):
+    key = AnswerCache.make_key("exact", "model", "doc", "question")
+    assert cache.get(key) is None
+    assert cache.put(key, "doc", cache.generation("doc"), "answer", {"ids": ["c0"]})
+    assert cache.get(key) == {"answer": "answer", "retrieval": {"ids": ["c0"]}}
+    assert cache.stats()["exact"] == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_invalidate_drops_exact_answers_and_rejects_answers_from_before(cache):
+    exact = AnswerCache.make_key("exact", "doc", "question")
+    retrieval = AnswerCache.make_key("retrieval", "question", "c0")
+    generation = cache.generation("doc")
+    cache.put(exact, "doc", generation, "old answer")
+    cache.put(retrieval, "doc", generation, "old answer")
+
+    assert cache.invalidate("doc") == 1
+    assert cache.get(exact) is None
+    assert cache.get(retrieval)["answer"] == "old answer"
+    # An answer generated before the invalidation is not stored under the new version
+    assert not cache.put(exact, "doc", generation, "stale answer")
+    assert cache.get(exact) is None
+    assert cache.put(exact, "doc", cache.generation("doc"), "new answer")
+
+    cache.invalidate("doc", retrieval=True)
+    assert cache.get(exact) is None and cache.get(retrieval) is None
+
+
+def test_invalidation_by_another_worker_is_seen(tmp_path):
+    path = str(tmp_path / "answers.sqlite3")
+    reader, writer = AnswerCache(path), AnswerCache(path)
+    try:
+        key = AnswerCache.make_key("exact", "doc", "question")
+        generation = reader.generation("doc")
+        writer.invalidate("doc")
+        assert not reader.put(key, "doc", generation, "answer")
+        assert reader.get(key) is None
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_least_recently_used_answers_are_evicted(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"), max_entries=2)
+    try:
+        keys = [AnswerCache.make_key("exact", str(i)) for i in range(3)]
+        cache.put(keys[0], "doc", 0, "0")
+        cache.put(keys[1], "doc", 0, "1")
+        assert cache.get(keys[0]) is not None
+        cache.put(keys[2], "doc", 0, "2")
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+    finally:
+        cache.close()
@@ -0,0 +1,105 @@
+from app.core.chroma_http import ChromaHttpClient, ChromaServerError, RetryTransport
+import json
+
+import httpx
+import pytest
+
+
+class FlakyServer:
+    """Mock transport handler failing the first ``failures`` requests with ``error`` (an exception or a status)."""
+
+    def __init__(self, error, failures: int = 1):
+        self.error = error
+        self.failures = failures
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if len(self.requests) <= self.failures:
+            if isinstance(self.error, int):
+                return httpx.Response(self.error)
+            raise self.error("failed", request=request)
+        return httpx.Response(200, json={"ok": True})
+
+
+def session(server, retries: int = 3) -> httpx.Client:
+    return httpx.Client(transport=RetryTransport(httpx.MockTransport(server), retries, backoff_s=0))
+
+
+@pytest.mark.parametrize("method", ["GET", "POST"])
+def test_connect_errors_are_retried_for_every_method(method):
+    server = FlakyServer(httpx.ConnectError, failures=2)
+    assert session(server).request(method, "http://chroma/x").json() == {"ok": True}
+    assert len(server.requests) == 3
+
+
+@pytest.mark.parametrize("error", [httpx.RemoteProtocolError, 503])
+def test_dropped_or_unavailable_requests_are_retried_only_when_idempotent(error):
+    server = FlakyServer(error)
+    assert session(server).get("http://chroma/x").status_code == 200
+    assert len(server.requests) == 2
+
+    server = FlakyServer(error)
+    assert session(server).post("http://chroma/x", extensions={"idempotent": True}).status_code == 200
+    assert len(server.requests) == 2
+
+    server = FlakyServer(error)
+    if isinstance(error, int):
+        assert session(server).post("http://chroma/x").status_code == error
+    else:
+        with pytest.raises(error):
+            session(server).post("http://chroma/x")
+    assert len(server.requests) == 1
+
+
+def test_read_timeouts_are_not_retried():
+    server = FlakyServer(httpx.ReadTimeout)
+    with pytest.raises(httpx.ReadTimeout):
+        session(server).get("http://chroma/x")
+    assert len(server.requests) == 1
+
+
+def test_retries_give_up_after_the_limit():
+    server = FlakyServer(503, failures=10)
+    assert session(server, retries=2).get("http://chroma/x").status_code == 503
+    assert len(server.requests) == 3
+
+    server = FlakyServer(httpx.ConnectError, failures=10)
+    with pytest.raises(httpx.ConnectError):
+        session(server, retries=2).get("http://chroma/x")
+    assert len(server.requests) == 3
+
+
+def test_collection_writes_by_id_are_retried_but_adds_are_not():
+    requests = []
+
+    def server(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.url.path.endswith("/collections/docs"):
+            return httpx.Response(200, json={"id": "c1", "name": "docs", "metadata": None})
+        if len(requests) == 2:
+            raise httpx.RemoteProtocolError("connection dropped", request=request)
+        return httpx.Response(200, json={})
+
+    client = ChromaHttpClient(session(server), "http://chroma")
+    collection = client.get_collection("docs")
+    collection.upsert(ids=["a"], embeddings=[[1.0, 0.0]], documents=["text"], metadatas=[{"doc_id": "d"}])
+    assert [request.url.path for request in requests[1:]] == [
+        "/api/v2/tenants/default_tenant/databases/default_database/collections/c1/upsert"
+    ] * 2
+    assert json.loads(requests[-1].content)["ids"] == ["a"]
+
+    requests.clear()
+    requests.append(None)
+    with pytest.raises(httpx.RemoteProtocolError):
+        collection.add(ids=["b"], embeddings=[[0.0, 1.0]])
+    assert len(requests) == 2
+
+
+def test_server_errors_are_raised_with_their_message():
+    def server(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(400, json={"error": "InvalidCollection", "message": "Collection nope does not exist."})
+
+    client = ChromaHttpClient(session(server), "http://chroma")
+    with pytest.raises(ChromaServerError, match="InvalidCollection: Collection nope does not exist"):
+        client.get_collection("nope")
@@ -0,0 +1,55 @@
+from app.core.context_builder import ContextBuilder, merge_passages
+
+
+class WordCounter:
+    """Counts a token per word, so budgets are easy to reason about."""
+
+    def count(self, text: str) -> int:
+        return len(text.split())
+
+
+def chunk(doc_id: str, text: str, start: int):
+    return {"doc_id": doc_id, "char_start": start, "char_end": start + len(text)}
+
+
+def test_merge_passages_joins_overlapping_neighbours_once():
+    text = "alpha beta gamma delta epsilon zeta eta theta"
+    first, second = text[:22], text[16:]
+    passages = merge_passages(["c1", "c0"], [second, first],
+                              [chunk("d", second, 16), chunk("d", first, 0)], [0, 1])
+    assert len(passages) == 1
+    assert passages[0].text == text
+    assert passages[0].ids == ["c0", "c1"]
+    assert passages[0].rank == 0
+    assert passages[0].metadata["char_start"] == 0 and passages[0].metadata["char_end"] == len(text)
+
+
+def test_merge_passages_keeps_other_documents_and_chunks_without_offsets_apart():
+    passages = merge_passages(
+        ["a", "b", "c"], ["one two", "one two", "three"],
+        [chunk("d1", "one two", 0), chunk("d2", "one two", 0), {"doc_id": "d1"}], [2, 0, 1]
+    )
+    assert [passage.ids for passage in passages] == [["b"], ["c"], ["a"]]
+
+
+def test_builder_stays_within_the_token_budget_but_keeps_the_best_chunk():
+    documents = [f"topic{i} " + " ".join(f"w{i}_{j}" for j in range(9)) for i in range(6)]
+    metadatas = [chunk("d", text, i * 1000) for i, text in enumerate(documents)]
+    ids = [f"c{i}" for i in range(6)]
+
+    builder = ContextBuilder(token_budget=25, candidates=6, mmr_lambda=1.0, token_counter=WordCounter())
+    passages = builder.build(ids, documents, metadatas)
+    assert [passage.ids for passage in passages] == [["c0"], ["c1"]]
+    assert builder.tokens(passages) <= 25
+
+    tiny = ContextBuilder(token_budget=1, candidates=6, mmr_lambda=1.0, token_counter=WordCounter())
+    assert [passage.ids for passage in tiny.build(ids, documents, metadatas)] == [["c0"]]
+
+
+def test_builder_drops_near_duplicates():
+    documents = ["the notice period is thirty days", "The notice period is thirty days.",
+                 "payment is due on delivery"]
+    metadatas = [chunk("d", text, i * 1000) for i, text in enumerate(documents)]
+    builder = ContextBuilder(token_budget=100, candidates=3, token_counter=WordCounter())
+    passages = builder.build(["c0", "c1", "c2"], documents, metadatas)
+    assert [passage.ids for passage in passages] == [["c0"], ["c2"]]
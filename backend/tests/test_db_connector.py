@@ -0,0 +1,53 @@
+from app.core.db_connector import DBConnector
+import uuid
+
+import pytest
+
+chromadb = pytest.importorskip("chromadb")
+
+
+@pytest.fixture
+def client(tmp_path):
+    from chromadb.config import Settings
+    return chromadb.PersistentClient(path=str(tmp_path / "chroma"), settings=Settings(anonymized_telemetry=False))
+
+
+def test_legacy_per_document_collections_move_into_the_shared_collection(client):
+    doc_id = f"doc_{uuid.uuid4().hex}"
+    legacy = client.create_collection(doc_id)
+    ids = [f"{doc_id}_{i}" for i in range(5)]
+    legacy.add(ids=ids, documents=[f"page text {i}" for i in range(5)],
+               metadatas=[{"doc_id": doc_id, "page": i} for i in range(5)],
+               embeddings=[[float(i), 1.0, 0.0, 0.0] for i in range(5)])
+    client.create_collection("notes")
+
+    db = DBConnector(client=client, embeddings=object(), dimension=4)
+    indexed = {}
+    assert db.migrate_legacy_collections(on_document=lambda *args: indexed.update({args[0]: args[1:]}),
+                                         batch_size=2) == [doc_id]
+
+    assert sorted(client.list_collections()) == ["docuquery", "notes"]
+    chunks = db.get_chunks(doc_id, ids)
+    assert chunks["ids"] == ids
+    assert [metadata["chunk_index"] for metadata in chunks["metadatas"]] == list(range(5))
+    assert [metadata["page"] for metadata in chunks["metadatas"]] == list(range(5))
+    assert indexed[doc_id] == (ids, [f"page text {i}" for i in range(5)])
+    # Nothing left to migrate on the next start
+    assert db.migrate_legacy_collections() == []
+
+
+def test_publish_swaps_a_staged_version_in(client):
+    db = DBConnector(client=client, embeddings=object(), dimension=4)
+    doc_id = f"doc_{uuid.uuid4().hex}"
+    db.add_chunks(doc_id, ["kept", "moved", "removed"], ["kept", "moved", "removed"],
+                  [{"chunk_index": i, "page": 1} for i in range(3)], [[1.0, float(i), 0.0, 0.0] for i in range(3)])
+    db.add_chunks(doc_id, ["added"], ["added"], [{"chunk_index": 2, "page": 2}], [[0.0, 1.0, 0.0, 0.0]],
+                  staged=True)
+    assert sorted(db.document_chunk_ids(doc_id)) == ["kept", "moved", "removed"]
+
+    db.publish_chunks(doc_id, ["added"], ["moved"], [{"chunk_index": 1, "page": 3}], ["removed"])
+    chunks = db.get_chunks(doc_id, ["kept", "moved", "added", "removed"])
+    assert chunks["ids"] == ["kept", "moved", "added"]
+    assert [(metadata["chunk_index"], metadata["page"]) for metadata in chunks["metadatas"]] == [(0, 1), (1, 3), (2, 2)]
+    assert db.discard_staged(doc_id) == 0
+    assert db.shard_for(doc_id).count() == 3
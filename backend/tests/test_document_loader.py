@@ -0,0 +1,64 @@
+from app.core.document_loader import DocumentLoader
+import asyncio
+import io
+
+import pytest
+
+
+def sample_text() -> str:
+    return "\n\n".join(f"Clause {i}: the party shall pay the fee within thirty days." for i in range(400))
+
+
+@pytest.fixture
+def loader():
+    loader = DocumentLoader(chunk_size=200, chunk_overlap=50, max_workers=1)
+    # Small blocks so a document spans many of them
+    loader.TXT_BLOCK_SIZE = 97
+    loader.flush_size = 300
+    yield loader
+    loader.close()
+
+
+def load_txt(loader: DocumentLoader, data: bytes):
+    return asyncio.run(loader.load_txt(io.BytesIO(data)))
+
+
+def test_txt_chunks_match_one_shot_chunking(loader):
+    text = sample_text()
+    assert load_txt(loader, text.encode("utf-8")) == loader.chunker.split_text(text)
+
+
+def test_utf8_characters_split_across_blocks(loader):
+    text = sample_text().replace("fee", "frais ü€")
+    data = text.encode("utf-8")
+    assert len(data) > len(text)
+    assert load_txt(loader, data) == loader.chunker.split_text(text)
+
+
+def test_latin1_file_is_read_once(loader):
+    text = sample_text().replace("Clause 350", "Clause 350 café")
+    data = text.encode("latin-1")
+    reads = []
+
+    class CountingFile(io.BytesIO):
+        def read(self, size=-1):
+            block = super().read(size)
+            reads.append(len(block))
+            return block
+
+    assert asyncio.run(loader.load_txt(CountingFile(data))) == loader.chunker.split_text(text)
+    assert sum(reads) == len(data)
+
+
+def test_iter_chunks_of_a_txt_path(loader, tmp_path):
+    text = sample_text()
+    path = tmp_path / "notes.txt"
+    path.write_bytes(text.encode("latin-1"))
+
+    async def collect():
+        return [chunk async for chunk in loader.iter_chunks(str(path), "notes.txt")]
+
+    chunks = asyncio.run(collect())
+    assert [chunk.text for chunk in chunks] == loader.chunker.split_text(text)
+    for chunk in chunks:
+        assert text[chunk.char_start:chunk.char_end] == chunk.text
@@ -0,0 +1,116 @@
+from app.core import embedding_cache
+from app.core.embedding_cache import EmbeddingCache
+import sqlite3
+
+import pytest
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Advance the cache's notion of time by one second per call, so last-used order is deterministic."""
+    now = [1000.0]
+
+    def tick():
+        now[0] += 1
+        return now[0]
+    monkeypatch.setattr(embedding_cache.time, "time", tick)
+    return now
+
+
+@pytest.fixture
+def open_cache(tmp_path, clock):
+    caches = []
+
+    def open_cache(**kwargs) -> EmbeddingCache:
+        kwargs.setdefault("memory_entries", 100)
+        kwargs.setdefault("max_entries", 100)
+        cache = EmbeddingCache(path=str(tmp_path / "cache.sqlite3"), **kwargs)
+        caches.append(cache)
+        return cache
+    yield open_cache
+    for cache in caches:
+        cache.close()
+
+
+def last_used(cache: EmbeddingCache, model: str, text: str) -> float:
+    row = sqlite3.connect(cache.path).execute(
+        "SELECT last_used FROM embeddings WHERE key = ?", (EmbeddingCache.make_key(model, text),)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def test_hits_come_from_memory_and_from_disk(open_cache):
+    cache = open_cache()
+    cache.put_many("m", ["a", "b"], [[1.0, 2.0], [3.0, 4.0]])
+    assert cache.get_many("m", ["a", "c", "b", "a"]) == [[1.0, 2.0], None, [3.0, 4.0], [1.0, 2.0]]
+    cache.close()
+
+    reopened = open_cache()
+    assert reopened.stats()["memory_entries"] == 0
+    assert reopened.get_many("m", ["b", "a"]) == [[3.0, 4.0], [1.0, 2.0]]
+    assert reopened.stats()["memory_entries"] == 2
+    stats = reopened.stats()
+    assert (stats["hits"], stats["misses"], stats["disk_entries"]) == (2, 0, 2)
+
+
+def test_entries_are_keyed_by_model(open_cache):
+    cache = open_cache()
+    cache.put_many("small", ["a"], [[1.0]])
+    assert cache.get_many("large", ["a"]) == [None]
+    assert cache.stats()["misses"] == 1
+
+
+def test_memory_keeps_the_most_recently_used_entries(open_cache):
+    cache = open_cache(memory_entries=2)
+    cache.put_many("m", ["a", "b"], [[1.0], [2.0]])
+    cache.get_many("m", ["a"])
+    cache.put_many("m", ["c"], [[3.0]])
+    assert list(cache._memory) == [EmbeddingCache.make_key("m", text) for text in ["a", "c"]]
+    # Entries dropped from memory are still served from disk
+    assert cache.get_many("m", ["b"]) == [[2.0]]
+
+
+def test_disk_evicts_the_least_recently_used_rows(open_cache):
+    cache = open_cache(memory_entries=1, max_entries=3)
+    cache.put_many("m", ["a", "b", "c"], [[1.0], [2.0], [3.0]])
+    cache._memory.clear()
+    # Reading "a" from disk makes it more recent than "b" and "c" once the touch is written
+    assert cache.get_many("m", ["a"]) == [[1.0]]
+    cache.put_many("m", ["d", "e"], [[4.0], [5.0]])
+
+    assert cache.stats()["disk_entries"] == 3
+    cache._memory.clear()
+    assert cache.get_many("m", ["a", "b", "c", "d", "e"]) == [[1.0], None, None, [4.0], [5.0]]
+
+
+def test_lookups_defer_last_used_updates(open_cache, monkeypatch):
+    cache = open_cache(memory_entries=1)
+    cache.put_many("m", ["a", "b"], [[1.0], [2.0]])
+    stored = last_used(cache, "m", "a")
+    cache._memory.clear()
+
+    cache.get_many("m", ["a"])
+    assert last_used(cache, "m", "a") == stored
+    # The next write carries the pending touch along
+    cache.put_many("m", ["c"], [[3.0]])
+    assert last_used(cache, "m", "a") > stored
+
+    # Enough pending touches are written without waiting for a write
+    monkeypatch.setattr(EmbeddingCache, "TOUCH_BATCH", 2)
+    stored = last_used(cache, "m", "b")
+    cache._memory.clear()
+    cache.get_many("m", ["b"])
+    assert last_used(cache, "m", "b") == stored
+    cache._memory.clear()
+    cache.get_many("m", ["b", "c"])
+    assert last_used(cache, "m", "b") > stored
+
+
+def test_close_writes_pending_touches(open_cache):
+    cache = open_cache(memory_entries=1)
+    cache.put_many("m", ["a", "b"], [[1.0], [2.0]])
+    stored = last_used(cache, "m", "a")
+    cache._memory.clear()
+    cache.get_many("m", ["a"])
+    cache.close()
+    assert last_used(cache, "m", "a") > stored
@@ -0,0 +1,116 @@
+from app.core.embedding_scheduler import THREADED_COUNT_CHARS, EmbeddingScheduler
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+
+def rate_limit_error(retry_after=None, code=None) -> openai.RateLimitError:
+    headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+    response = httpx.Response(429, headers=headers,
+                              request=httpx.Request("POST", "https://api.openai.com/v1/embeddings"))
+    return openai.RateLimitError("rate limited", response=response, body={"code": code} if code else None)
+
+
+class ScriptedEmbeddings:
+    """Embeds each text as [len(text)]; ``failures`` maps a batch's first text to errors to raise first."""
+
+    def __init__(self, failures=None, delay=0.0):
+        self.failures = {text: list(errors) for text, errors in (failures or {}).items()}
+        self.delay = delay
+        self.batches = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def aembed_documents(self, texts):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            # Later batches finish first, so results must be put back in input order
+            await asyncio.sleep(self.delay / (len(self.batches) + 1))
+            errors = self.failures.get(texts[0])
+            if errors:
+                raise errors.pop(0)
+            self.batches.append(list(texts))
+            return [[float(len(text))] for text in texts]
+        finally:
+            self.in_flight -= 1
+
+
+def scheduler(embeddings, **kwargs) -> EmbeddingScheduler:
+    options = dict(max_batch_tokens=100, max_batch_size=4, max_in_flight=4,
+                   tokens_per_minute=10_000_000, max_retries=3, base_delay=0.001, max_delay=0.01)
+    options.update(kwargs)
+    return EmbeddingScheduler(embeddings, **options)
+
+
+def test_batches_pack_texts_in_order_within_the_token_and_size_budgets():
+    instance = scheduler(ScriptedEmbeddings())
+    texts = ["word " * 30] * 3 + list("abcde") + ["x " * 500, "y"]
+    batches = instance.batches(texts)
+    counts = [instance.token_counter.count(text) for text in texts]
+    assert [start for start, _, _ in batches] == [0] + [end for _, end, _ in batches[:-1]]
+    assert batches[-1][1] == len(texts)
+    for start, end, tokens in batches:
+        assert tokens == sum(counts[start:end])
+        assert end - start <= 4
+        # Only a single text over the budget gets a batch above it
+        assert tokens <= 100 or end - start == 1
+        # Each batch is as large as the budgets allow
+        if end < len(texts):
+            assert end - start == 4 or tokens + counts[end] > 100
+
+
+def test_results_come_back_in_input_order_within_the_concurrency_limit():
+    embeddings = ScriptedEmbeddings(delay=0.02)
+    texts = [f"text {'x' * i}" for i in range(30)]
+    vectors = asyncio.run(scheduler(embeddings, max_in_flight=2).embed(texts))
+    assert vectors == [[float(len(text))] for text in texts]
+    assert len(embeddings.batches) == 8
+    assert embeddings.max_in_flight == 2
+
+
+def test_large_inputs_are_counted_in_the_threadpool_with_the_same_batches():
+    texts = ["clause " * 50] * (THREADED_COUNT_CHARS // 350 + 1)
+    assert sum(map(len, texts)) >= THREADED_COUNT_CHARS
+    embeddings = ScriptedEmbeddings()
+    instance = scheduler(embeddings, max_batch_tokens=1000, max_batch_size=64)
+    vectors = asyncio.run(instance.embed(texts))
+    assert len(vectors) == len(texts)
+    assert [len(batch) for batch in embeddings.batches] == [end - start for start, end, _ in instance.batches(texts)]
+
+
+def test_throttled_batches_are_retried_after_retry_after():
+    embeddings = ScriptedEmbeddings(failures={"first": [rate_limit_error(0.2), rate_limit_error()]})
+    instance = scheduler(embeddings)
+    started = time.perf_counter()
+    assert asyncio.run(instance.embed(["first", "second"])) == [[5.0], [6.0]]
+    assert time.perf_counter() - started >= 0.2
+    assert instance.retries == 2
+
+
+def test_backoff_does_not_hold_a_concurrency_slot():
+    embeddings = ScriptedEmbeddings(failures={"slow": [rate_limit_error(0.3)]})
+    instance = scheduler(embeddings, max_batch_size=1, max_in_flight=1)
+    asyncio.run(instance.embed(["slow", "fast", "faster"]))
+    # The other batches ran while the throttled one waited out its Retry-After
+    assert embeddings.batches == [["fast"], ["faster"], ["slow"]]
+
+
+@pytest.mark.parametrize("error", [ValueError("bad input"), rate_limit_error(code="insufficient_quota")])
+def test_errors_that_waiting_cannot_fix_are_raised_without_retrying(error):
+    embeddings = ScriptedEmbeddings(failures={"text": [error]})
+    instance = scheduler(embeddings)
+    with pytest.raises(type(error)):
+        asyncio.run(instance.embed(["text"]))
+    assert instance.retries == 0
+
+
+def test_retries_give_up_after_max_retries():
+    embeddings = ScriptedEmbeddings(failures={"text": [rate_limit_error() for _ in range(3)]})
+    instance = scheduler(embeddings, max_retries=2)
+    with pytest.raises(openai.RateLimitError):
+        asyncio.run(instance.embed(["text"]))
+    assert instance.retries == 2
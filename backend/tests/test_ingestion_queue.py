@@ -0,0 +1,283 @@
+from app.core.document_loader import DocumentLoader
+from app.core.ingestion_queue import DocumentBusy, IngestionQueue, IngestionQueueFull
+from app.core.job_store import JobStore
+from app.core.keyword_index import KeywordIndex
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+TEXT = "".join(f"Section {i}. The supplier delivers part PX-{i} within {i} days of the order.\n\n"
+               for i in range(60))
+
+
+@pytest.fixture
+def job_store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def make_queue(tmp_path, monkeypatch, job_store, vector_store, embedding_processor):
+    monkeypatch.setenv("INGESTION_SPOOL_DIR", str(tmp_path / "spool"))
+
+    def make_queue(**kwargs) -> IngestionQueue:
+        return IngestionQueue(job_store, DocumentLoader(), embedding_processor, vector_store, **kwargs)
+    return make_queue
+
+
+def write(tmp_path, name: str, text: str) -> str:
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+async def submit(queue: IngestionQueue, path: str, doc_id=None):
+    with open(path, "rb") as f:
+        fingerprint = hashlib.sha256(f.read()).hexdigest()
+    return await queue.submit_spooled(path, fingerprint, os.path.basename(path), "text/plain", doc_id)
+
+
+async def drain(queue: IngestionQueue):
+    await asyncio.wait_for(queue._queue.join(), 10)
+
+
+def test_new_version_only_embeds_changed_chunks(tmp_path, make_queue, job_store, vector_store,
+                                                embedding_processor):
+    keyword_index = KeywordIndex(str(tmp_path / "keywords.sqlite3"))
+    queue = make_queue(workers=1, batch_size=8, keyword_index=keyword_index)
+
+    async def scenario():
+        await queue.start()
+        try:
+            first = await submit(queue, write(tmp_path, "v1.txt", TEXT))
+            await drain(queue)
+            assert job_store.get(first["job_id"])["status"] == "completed"
+            stored = vector_store.count_document_chunks(first["doc_id"])
+            embedded = embedding_processor.texts_embedded
+            assert stored > 1 and embedded == stored
+
+            # Same file again: answered with the existing job
+            duplicate = await submit(queue, write(tmp_path, "again.txt", TEXT))
+            assert duplicate["duplicate"] and duplicate["job_id"] == first["job_id"]
+
+            changed = TEXT.replace("Section 59.", "Final section.")
+            second = await submit(queue, write(tmp_path, "v2.txt", changed), doc_id=first["doc_id"])
+            await drain(queue)
+            job = job_store.get(second["job_id"])
+            assert job["status"] == "completed"
+            assert job["chunks_reused"] == stored - 1
+            assert embedding_processor.texts_embedded == embedded + 1
+            assert vector_store.count_document_chunks(first["doc_id"]) == stored
+            assert keyword_index.search(first["doc_id"], "final", k=5)
+            assert not any("Section 59." in chunk["text"] for chunk in vector_store.chunks.values())
+        finally:
+            await queue.stop()
+            keyword_index.close()
+
+    asyncio.run(scenario())
+
+
+def test_queries_see_one_whole_version_while_a_new_one_is_stored(tmp_path, make_queue, job_store, vector_store,
+                                                                 embedding_processor):
+    queue = make_queue(workers=1, batch_size=2)
+    changed = TEXT.replace("The supplier", "The vendor")
+    visible = []
+    process_chunks = embedding_processor.process_chunks
+
+    async def observe(chunks):
+        # What a query of the document would see while the new version is embedded
+        visible.append(sorted(chunk["text"] for chunk in vector_store.chunks.values()
+                              if chunk["metadata"]["doc_id"] == doc_id))
+        return await process_chunks(chunks)
+
+    async def scenario():
+        nonlocal doc_id
+        await queue.start()
+        try:
+            first = await submit(queue, write(tmp_path, "v1.txt", TEXT))
+            await drain(queue)
+            doc_id = first["doc_id"]
+            before = sorted(chunk["text"] for chunk in vector_store.chunks.values())
+
+            embedding_processor.process_chunks = observe
+            second = await submit(queue, write(tmp_path, "v2.txt", changed), doc_id=doc_id)
+            await drain(queue)
+            assert job_store.get(second["job_id"])["status"] == "completed"
+            assert len(visible) > 1 and all(texts == before for texts in visible)
+            assert all("vendor" in chunk["text"] for chunk in vector_store.chunks.values())
+            assert all(chunk["metadata"]["doc_id"] == doc_id for chunk in vector_store.chunks.values())
+        finally:
+            await queue.stop()
+
+    doc_id = None
+    asyncio.run(scenario())
+
+
+def test_failed_version_leaves_the_previous_one_and_no_staged_chunks(tmp_path, make_queue, job_store,
+                                                                     vector_store, embedding_processor):
+    queue = make_queue(workers=1, batch_size=2)
+    process_chunks = embedding_processor.process_chunks
+
+    async def fail_late(chunks):
+        # The first batch is staged, the second fails
+        if embedding_processor.texts_embedded:
+            raise RuntimeError("embedding provider down")
+        return await process_chunks(chunks)
+
+    async def scenario():
+        await queue.start()
+        try:
+            first = await submit(queue, write(tmp_path, "v1.txt", TEXT))
+            await drain(queue)
+            before = {chunk_id: dict(chunk) for chunk_id, chunk in vector_store.chunks.items()}
+
+            embedding_processor.texts_embedded = 0
+            embedding_processor.process_chunks = fail_late
+            second = await submit(queue, write(tmp_path, "v2.txt", TEXT.replace("days", "weeks")),
+                                  doc_id=first["doc_id"])
+            await drain(queue)
+            assert "embedding provider down" in job_store.get(second["job_id"])["error"]
+            assert vector_store.chunks == before
+
+            # Chunks staged by a job that died without cleaning up are dropped by the next one
+            vector_store.add_chunks(first["doc_id"], ["orphan"], ["orphan"], [{}], [[1.0]], staged=True)
+            embedding_processor.process_chunks = process_chunks
+            third = await submit(queue, write(tmp_path, "v3.txt", TEXT + "appendix"), doc_id=first["doc_id"])
+            await drain(queue)
+            assert job_store.get(third["job_id"])["status"] == "completed"
+            assert "orphan" not in vector_store.chunks
+        finally:
+            await queue.stop()
+
+    asyncio.run(scenario())
+
+
+def test_vector_store_error_at_job_start_fails_the_job(tmp_path, make_queue, job_store, vector_store):
+    queue = make_queue(workers=1)
+    vector_store.fail_reads = 3
+
+    async def scenario():
+        await queue.start()
+        try:
+            failed = [await submit(queue, write(tmp_path, f"f{i}.txt", f"{TEXT}{i}")) for i in range(3)]
+            await drain(queue)
+            for job in failed:
+                job = job_store.get(job["job_id"])
+                assert job["status"] == "failed"
+                assert "vector store unavailable" in job["error"]
+
+            # The worker is still running
+            ok = await submit(queue, write(tmp_path, "ok.txt", TEXT))
+            await drain(queue)
+            assert job_store.get(ok["job_id"])["status"] == "completed"
+        finally:
+            await queue.stop()
+
+    asyncio.run(scenario())
+
+
+def test_worker_survives_unexpected_errors(tmp_path, make_queue, job_store):
+    queue = make_queue(workers=1)
+    run = queue._run
+    calls = []
+
+    async def flaky_run(job_id, path):
+        calls.append(job_id)
+        if len(calls) == 1:
+            raise RuntimeError("job store unavailable")
+        await run(job_id, path)
+
+    queue._run = flaky_run
+
+    async def scenario():
+        await queue.start()
+        try:
+            first = await submit(queue, write(tmp_path, "a.txt", TEXT))
+            second = await submit(queue, write(tmp_path, "b.txt", TEXT + "more"))
+            await drain(queue)
+            assert calls == [first["job_id"], second["job_id"]]
+            assert job_store.get(second["job_id"])["status"] == "completed"
+            assert not any(os.listdir(queue.spool_dir))
+        finally:
+            await queue.stop()
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_new_versions_of_a_document_get_one_job(tmp_path, make_queue, job_store):
+    queue = make_queue(workers=1)
+
+    async def scenario():
+        await queue.start()
+        try:
+            first = await submit(queue, write(tmp_path, "v1.txt", TEXT))
+            await drain(queue)
+            # Keep the accepted version queued so the race is only decided by the job store
+            await queue.stop()
+
+            paths = [write(tmp_path, f"v{i}.txt", f"{TEXT}version {i}") for i in (2, 3)]
+            results = await asyncio.gather(*(submit(queue, path, doc_id=first["doc_id"]) for path in paths),
+                                           return_exceptions=True)
+            accepted = [result for result in results if isinstance(result, dict)]
+            rejected = [result for result in results if isinstance(result, DocumentBusy)]
+            assert len(accepted) == 1 and len(rejected) == 1
+            # The rejected file is left where it was, so the upload can be retried
+            assert [os.path.exists(path) for path in paths].count(True) == 1
+
+            current = job_store.current_for_document(first["doc_id"])
+            assert current["job_id"] == accepted[0]["job_id"] and current["status"] == "queued"
+            with pytest.raises(DocumentBusy):
+                await submit(queue, write(tmp_path, "v4.txt", f"{TEXT}version 4"), doc_id=first["doc_id"])
+        finally:
+            await queue.stop()
+
+    asyncio.run(scenario())
+
+
+def test_submit_rejects_unknown_documents_and_a_full_queue(tmp_path, make_queue):
+    queue = make_queue(workers=1, max_pending=1)
+
+    async def scenario():
+        await queue.start()
+        await queue.stop()
+        path = write(tmp_path, "a.txt", TEXT)
+        with pytest.raises(ValueError):
+            await submit(queue, path, doc_id="doc_unknown")
+        assert os.path.exists(path)
+
+        await submit(queue, path)
+        full = write(tmp_path, "b.txt", TEXT + "more")
+        with pytest.raises(IngestionQueueFull):
+            await submit(queue, full)
+        assert os.path.exists(full)
+
+    asyncio.run(scenario())
+
+
+def test_job_store_create_if_idle(job_store):
+    job = job_store.create_if_idle("doc", "a.txt", "text/plain")
+    assert job["status"] == "queued"
+    assert job_store.create_if_idle("doc", "b.txt", "text/plain") is None
+    job_store.update(job["job_id"], status="running")
+    assert job_store.create_if_idle("doc", "b.txt", "text/plain") is None
+    job_store.update(job["job_id"], status="completed")
+    assert job_store.create_if_idle("doc", "b.txt", "text/plain")["doc_id"] == "doc"
+
+
+def test_find_by_fingerprint_only_matches_current_versions(job_store):
+    first = job_store.create("doc", "a.txt", "text/plain", "aaa")
+    job_store.update(first["job_id"], status="completed")
+    assert job_store.find_by_fingerprint("aaa")["job_id"] == first["job_id"]
+
+    failed = job_store.create("doc", "b.txt", "text/plain", "bbb")
+    job_store.update(failed["job_id"], status="failed")
+    assert job_store.find_by_fingerprint("bbb") is None
+    assert job_store.find_by_fingerprint("aaa")["job_id"] == first["job_id"]
+
+    second = job_store.create("doc", "c.txt", "text/plain", "ccc")
+    assert job_store.find_by_fingerprint("aaa") is None
+    assert job_store.find_by_fingerprint("ccc", doc_id="doc")["job_id"] == second["job_id"]
+    assert job_store.find_by_fingerprint("ccc", doc_id="other") is None
@@ -0,0 +1,94 @@
+from app.core.keyword_index import KeywordDocument, KeywordIndex, tokenize
+import sqlite3
+
+import pytest
+
+
+def document(doc_id: str, texts) -> KeywordDocument:
+    keywords = KeywordDocument(doc_id)
+    for i, text in enumerate(texts):
+        keywords.add(f"{doc_id}_{i}", text)
+    return keywords
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = KeywordIndex(str(tmp_path / "keywords.sqlite3"))
+    yield index
+    index.close()
+
+
+def test_tokenize_keeps_compound_tokens_and_their_parts():
+    assert list(tokenize("See clause 12.3 for PX-4471 and the Notice")) == [
+        "see", "clause", "12.3", "12", "3", "px-4471", "px", "4471", "notice"
+    ]
+
+
+def test_search_ranks_chunks_by_bm25(index):
+    index.replace_document(document("doc", [
+        "the payment is due within thirty days",
+        "payment payment terms and late payment fees",
+        "the warranty covers defects",
+    ]))
+    hits = index.search("doc", "late payment", k=5)
+    assert [chunk_id for chunk_id, _ in hits] == ["doc_1", "doc_0"]
+    assert hits[0][1] > hits[1][1] > 0
+
+
+def test_search_returns_at_most_k_and_stays_within_the_document(index):
+    index.replace_document(document("a", ["alpha"] * 10))
+    index.replace_document(document("b", ["alpha beta"]))
+    assert len(index.search("a", "alpha", k=3)) == 3
+    assert [chunk_id for chunk_id, _ in index.search("b", "alpha", k=3)] == ["b_0"]
+    assert index.search("a", "missing", k=3) == []
+    assert index.search("unknown", "alpha", k=3) == []
+
+
+def test_replace_and_delete_document(index):
+    index.replace_document(document("doc", ["old text"]))
+    index.replace_document(document("doc", ["new text", "more new text"]))
+    assert index.search("doc", "old", k=5) == []
+    assert {chunk_id for chunk_id, _ in index.search("doc", "new", k=5)} == {"doc_0", "doc_1"}
+    assert index.delete_document("doc")
+    assert not index.has_document("doc")
+    assert index.search("doc", "new", k=5) == []
+    assert not index.delete_document("doc")
+
+
+@pytest.mark.parametrize("chunks", [10, 2])
+def test_search_sees_versions_written_by_another_instance(tmp_path, chunks):
+    """Workers share the file: a header cached by one must not outlive a re-index by another."""
+    path = str(tmp_path / "keywords.sqlite3")
+    writer, reader = KeywordIndex(path), KeywordIndex(path)
+    try:
+        writer.replace_document(document("doc", [f"alpha v1 {i}" for i in range(3)]))
+        assert len(reader.search("doc", "alpha", k=20)) == 3
+
+        new_version = KeywordDocument("doc")
+        for i in range(chunks):
+            new_version.add(f"doc_v2_{i}", f"alpha v2 {i}")
+        writer.replace_document(new_version)
+        hits = reader.search("doc", "alpha", k=20)
+        assert sorted(chunk_id for chunk_id, _ in hits) == sorted(f"doc_v2_{i}" for i in range(chunks))
+
+        writer.delete_document("doc")
+        assert reader.search("doc", "alpha", k=20) == []
+        assert not reader.has_document("doc")
+    finally:
+        writer.close()
+        reader.close()
+
+
+def test_opens_an_index_created_before_versions(tmp_path):
+    path = str(tmp_path / "keywords.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE documents (doc_id TEXT PRIMARY KEY, chunk_ids TEXT NOT NULL, lengths BLOB NOT NULL)")
+    conn.commit()
+    conn.close()
+
+    index = KeywordIndex(path)
+    try:
+        index.replace_document(document("doc", ["alpha"]))
+        assert [chunk_id for chunk_id, _ in index.search("doc", "alpha", k=1)] == ["doc_0"]
+    finally:
+        index.close()
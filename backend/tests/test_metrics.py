@@ -0,0 +1,65 @@
+from app.core.metrics import STAGE_BREAKDOWN, RequestMetricsMiddleware, StageTimer
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+import pytest
+
+TEST_STAGE = StageTimer("test_stage")
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_middleware(RequestMetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: str):
+        if item_id == "missing":
+            raise HTTPException(status_code=404, detail="Item not found")
+        # The gauge counts this request while it is being handled
+        return {"in_progress": sample("docuquery_http_requests_in_progress", method="GET", route="/items/{item_id}")}
+
+    with TestClient(app) as client:
+        yield client
+
+
+def test_requests_are_labelled_with_their_route_template(client):
+    found = sample("docuquery_http_request_seconds_count", method="GET", route="/items/{item_id}", status="200")
+    missing = sample("docuquery_http_request_seconds_count", method="GET", route="/items/{item_id}", status="404")
+    unmatched = sample("docuquery_http_request_seconds_count", method="GET", route="unmatched", status="404")
+
+    assert client.get("/items/a").json() == {"in_progress": 1.0}
+    client.get("/items/b")
+    client.get("/items/missing")
+    client.get("/nowhere/at/all")
+
+    assert sample("docuquery_http_request_seconds_count",
+                  method="GET", route="/items/{item_id}", status="200") == found + 2
+    assert sample("docuquery_http_request_seconds_count",
+                  method="GET", route="/items/{item_id}", status="404") == missing + 1
+    assert sample("docuquery_http_request_seconds_count",
+                  method="GET", route="unmatched", status="404") == unmatched + 1
+    assert sample("docuquery_http_requests_in_progress", method="GET", route="/items/{item_id}") == 0
+
+
+def test_stage_timers_feed_the_histogram_and_the_traced_breakdown():
+    before = sample("docuquery_stage_seconds_count", stage="test_stage")
+    TEST_STAGE.observe(0.5)
+    assert sample("docuquery_stage_seconds_count", stage="test_stage") == before + 1
+
+    breakdown = {}
+    token = STAGE_BREAKDOWN.set(breakdown)
+    try:
+        TEST_STAGE.observe(0.25)
+        TEST_STAGE.observe(0.5)
+    finally:
+        STAGE_BREAKDOWN.reset(token)
+    assert breakdown == {"test_stage": 0.75}
+    # Outside a traced request or job only the histogram is updated
+    TEST_STAGE.observe(1.0)
+    assert breakdown == {"test_stage": 0.75}
@@ -0,0 +1,54 @@
+from tests.test_mmap_vector_store import exact_top_k, fill, open_collection, vectors  # noqa: F401
+import numpy as np
+import pytest
+
+
+@pytest.mark.parametrize("quantization", ["float16", "int8"])
+def test_quantized_query_matches_exact_cosine_top_k(open_collection, quantization):
+    collection = open_collection(quantization=quantization, rerank_factor=4)
+    data = fill(collection)
+    queries = vectors(5, seed=1)
+    results = collection.query(query_embeddings=queries.tolist(), n_results=5)
+    for column, query in enumerate(queries):
+        ids, distances = exact_top_k(data, query, 5)
+        # Quantized scans only shortlist; the re-ranking with float32 vectors restores the exact order
+        assert results["ids"][column] == ids
+        assert np.allclose(results["distances"][column], distances, atol=1e-5)
+
+
+def test_quantized_search_scans_fewer_bytes(open_collection):
+    collection = open_collection(quantization="int8")
+    fill(collection)
+    stats = collection.stats()
+    assert stats["search_bytes"] < stats["full_precision_bytes"] / 3
+
+
+def test_reranked_distances_are_full_precision(open_collection):
+    # Without a wider shortlist the int8 order may differ, but every returned distance is re-scored exactly
+    collection = open_collection(quantization="int8", rerank_factor=1)
+    data = fill(collection)
+    normalized = data / np.linalg.norm(data, axis=1, keepdims=True)
+    for query in vectors(10, seed=3):
+        results = collection.query(query_embeddings=[query.tolist()], n_results=5)
+        rows = [int(chunk_id[1:]) for chunk_id in results["ids"][0]]
+        exact = 1.0 - normalized[rows] @ (query / np.linalg.norm(query))
+        assert np.allclose(results["distances"][0], exact, atol=1e-5)
+        assert results["distances"][0] == sorted(results["distances"][0])
+
+
+def test_quantized_search_applies_where_filters(open_collection):
+    collection = open_collection(quantization="int8", rerank_factor=4)
+    data = fill(collection)
+    query = vectors(1, seed=2)[0]
+    results = collection.query(query_embeddings=[query.tolist()], n_results=3, where={"doc_id": "doc3"})
+    assert results["ids"][0] == exact_top_k(data, query, 3, rows=range(3, 400, 4))[0]
+
+
+def test_reopening_with_another_quantization_requantizes(tmp_path, open_collection):
+    collection = open_collection(quantization="none")
+    data = fill(collection)
+    collection.close()
+    reopened = open_collection(quantization="int8")
+    assert reopened.stats()["quantization"] == "int8"
+    query = vectors(1, seed=6)[0]
+    assert reopened.query(query_embeddings=[query.tolist()], n_results=5)["ids"][0] == exact_top_k(data, query, 5)[0]
@@ -0,0 +1,157 @@
+from app.core.mmap_vector_store import MmapCollection, MmapVectorClient
+import os
+
+import numpy as np
+import pytest
+
+DIMENSION = 32
+
+
+def vectors(count: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=(count, DIMENSION)).astype(np.float32)
+
+
+def fill(collection: MmapCollection, count: int = 400, seed: int = 0) -> np.ndarray:
+    data = vectors(count, seed)
+    collection.add(ids=[f"c{i}" for i in range(count)], embeddings=data.tolist(),
+                   documents=[f"text {i}" for i in range(count)],
+                   metadatas=[{"doc_id": f"doc{i % 4}", "chunk_index": i} for i in range(count)])
+    return data
+
+
+def exact_top_k(data: np.ndarray, query: np.ndarray, k: int, rows=None):
+    rows = np.arange(len(data)) if rows is None else np.asarray(rows)
+    normalized = data[rows] / np.linalg.norm(data[rows], axis=1, keepdims=True)
+    scores = normalized @ (query / np.linalg.norm(query))
+    best = np.argsort(-scores, kind="stable")[:k]
+    return [f"c{row}" for row in rows[best]], 1.0 - scores[best]
+
+
+@pytest.fixture
+def open_collection(tmp_path):
+    opened = []
+
+    def open_collection(**kwargs) -> MmapCollection:
+        collection = MmapCollection(str(tmp_path / "collection"), "chunks", {"dimension": DIMENSION}, **kwargs)
+        opened.append(collection)
+        return collection
+    yield open_collection
+    for collection in opened:
+        try:
+            collection.close()
+        except Exception:
+            pass
+
+
+def test_query_matches_exact_cosine_top_k(open_collection):
+    collection = open_collection()
+    data = fill(collection)
+    queries = vectors(5, seed=1)
+    results = collection.query(query_embeddings=queries.tolist(), n_results=5)
+    for column, query in enumerate(queries):
+        ids, distances = exact_top_k(data, query, 5)
+        assert results["ids"][column] == ids
+        assert np.allclose(results["distances"][column], distances, atol=1e-5)
+        assert results["documents"][column] == [f"text {chunk_id[1:]}" for chunk_id in ids]
+
+
+def test_where_filters_restrict_the_search(open_collection):
+    collection = open_collection()
+    data = fill(collection)
+    query = vectors(1, seed=2)[0]
+    results = collection.query(query_embeddings=[query.tolist()], n_results=3, where={"doc_id": "doc1"})
+    assert results["ids"][0] == exact_top_k(data, query, 3, rows=range(1, 400, 4))[0]
+    got = collection.get(where={"$and": [{"doc_id": "doc2"}, {"chunk_index": 6}]}, include=["metadatas"])
+    assert got["ids"] == ["c6"] and got["metadatas"] == [{"doc_id": "doc2", "chunk_index": 6}]
+
+
+@pytest.mark.parametrize("quantization", ["none", "int8"])
+def test_deletes_compact_the_files_and_keep_results(tmp_path, open_collection, quantization):
+    collection = open_collection(quantization=quantization, compact_ratio=0.3)
+    data = fill(collection)
+    collection.delete(where={"doc_id": "doc0"})
+    assert collection.dead_fraction() == 0.25
+    collection.delete(ids=[f"c{i}" for i in range(1, 200, 4)])
+    # Half the rows are gone, more than the compaction threshold
+    assert collection.stats()["rows"] == collection.count() == 250
+    assert collection.dead_fraction() == 0.0
+
+    kept = [i for i in range(400) if i % 4 != 0 and not (i < 200 and i % 4 == 1)]
+    query = vectors(1, seed=3)[0]
+    expected = exact_top_k(data, query, 5, rows=kept)[0]
+    assert collection.query(query_embeddings=[query.tolist()], n_results=5)["ids"][0] == expected
+
+    # Only the current generation of the vector files is left, and it survives a reopen
+    collection.close()
+    files = sorted(name for name in os.listdir(tmp_path / "collection") if name.split(".")[0] in ("vectors", "scales"))
+    assert all(name.rsplit(".", 1)[-1].isdigit() for name in files)
+    reopened = open_collection(quantization=quantization)
+    assert reopened.count() == 250
+    assert reopened.query(query_embeddings=[query.tolist()], n_results=5)["ids"][0] == expected
+
+
+class FailingCommit:
+    """A sidecar connection whose commits fail, as on a full disk; everything else is passed through."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def commit(self):
+        raise OSError("disk full")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.conn.rollback()
+        if exc_type is None:
+            self.commit()
+        return False
+
+
+def test_a_failed_compaction_keeps_the_old_files_and_rows(tmp_path, open_collection):
+    collection = open_collection(compact_ratio=0.99)
+    data = fill(collection)
+    collection.delete(where={"doc_id": "doc0"})
+    before = sorted(os.listdir(tmp_path / "collection"))
+    collection._conn = FailingCommit(collection._conn)
+    with pytest.raises(OSError):
+        collection.compact()
+    collection._conn = collection._conn.conn
+    assert sorted(os.listdir(tmp_path / "collection")) == before
+
+    query = vectors(1, seed=4)[0]
+    expected = exact_top_k(data, query, 5, rows=[i for i in range(400) if i % 4])[0]
+    assert collection.query(query_embeddings=[query.tolist()], n_results=5)["ids"][0] == expected
+    collection.close()
+    assert open_collection().query(query_embeddings=[query.tolist()], n_results=5)["ids"][0] == expected
+
+
+def test_files_of_an_uncommitted_compaction_are_removed_on_open(tmp_path, open_collection):
+    collection = open_collection()
+    data = fill(collection)
+    collection.close()
+    # A compaction that crashed before its sidecar commit left the next generation behind
+    for name in ("vectors.f32.1", "vectors.i8.1"):
+        (tmp_path / "collection" / name).write_bytes(b"\0" * 4096)
+
+    reopened = open_collection()
+    assert not any(name.endswith(".1") for name in os.listdir(tmp_path / "collection"))
+    query = vectors(1, seed=5)[0]
+    assert reopened.query(query_embeddings=[query.tolist()], n_results=3)["ids"][0] == exact_top_k(data, query, 3)[0]
+
+
+def test_client_manages_collections(tmp_path):
+    client = MmapVectorClient(str(tmp_path / "store"))
+    collection = client.get_or_create_collection("docs", {"dimension": DIMENSION})
+    assert client.get_or_create_collection("docs") is collection
+    assert client.list_collections() == ["docs"]
+    with pytest.raises(ValueError):
+        client.create_collection("docs")
+    client.delete_collection("docs")
+    assert client.list_collections() == []
+    with pytest.raises(ValueError):
+        client.get_collection("docs")
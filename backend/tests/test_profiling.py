@@ -0,0 +1,86 @@
+from app.core import profiling
+from app.core.metrics import StageTimer
+from app.core.profiling import PROFILE_ID_HEADER, ProfileStore, ProfilingMiddleware, SlowRequestLog
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import time
+
+import pytest
+
+TEST_STAGE = StageTimer("test_stage")
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    store = ProfileStore(directory=str(tmp_path / "profiles"), keep=2)
+    log = SlowRequestLog(size=10, window_s=3600)
+    monkeypatch.setattr(profiling, "profile_store", store)
+    monkeypatch.setattr(profiling, "slow_requests", log)
+    monkeypatch.setenv("PROFILING_TOKEN", "secret")
+    return store, log
+
+
+@pytest.fixture
+def client(stores):
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware, sample_rate=0, interval_ms=1)
+
+    @app.get("/work/{name}")
+    def busy_handler(name: str):
+        started = time.perf_counter()
+        while time.perf_counter() - started < 0.05:
+            pass
+        TEST_STAGE.observe(0.05)
+        return {"name": name}
+
+    with TestClient(app) as client:
+        yield client
+
+
+def test_every_request_reaches_the_slow_log_with_its_stages(client, stores):
+    _, log = stores
+    response = client.get("/work/a")
+    assert PROFILE_ID_HEADER not in response.headers
+
+    [entry] = log.entries()
+    assert entry["route"] == "/work/{name}" and entry["path"] == "/work/a"
+    assert entry["status"] == 200 and entry["profile_id"] is None
+    assert entry["stages"] == {"test_stage": 0.05}
+    assert entry["seconds"] >= 0.05
+
+
+def test_requests_with_the_admin_token_are_profiled(client, stores):
+    store, log = stores
+    assert PROFILE_ID_HEADER not in client.get("/work/a", headers={"X-Profile": "guess"}).headers
+
+    response = client.get("/work/b", headers={"X-Profile": "secret"})
+    profile_id = response.headers[PROFILE_ID_HEADER]
+    assert [profile["profile_id"] for profile in store.list()] == [profile_id]
+    collapsed = store.read(profile_id)
+    assert "# path: /work/b" in collapsed
+    assert "busy_handler" in collapsed
+    assert {entry["path"]: entry["profile_id"] for entry in log.entries()} == {"/work/a": None, "/work/b": profile_id}
+
+
+def test_the_profile_store_keeps_the_newest_profiles(stores):
+    store, _ = stores
+    for i in range(3):
+        store.save(f"{i:032x}", {"path": f"/{i}"}, "main;work 1\n")
+        time.sleep(0.01)
+    assert [profile["profile_id"] for profile in store.list()] == [f"{2:032x}", f"{1:032x}"]
+    assert store.read(f"{0:032x}") is None
+    assert store.read("../../etc/passwd") is None
+
+
+def test_the_slow_log_keeps_the_slowest_recent_entries(monkeypatch):
+    log = SlowRequestLog(size=2, window_s=60)
+    now = [1000.0]
+    monkeypatch.setattr(profiling.time, "time", lambda: now[0])
+    for seconds in (0.3, 0.1, 0.5, 0.2):
+        log.record(seconds, {"path": f"/{seconds}"})
+    assert [entry["seconds"] for entry in log.entries()] == [0.5, 0.3]
+
+    now[0] += 61
+    assert log.entries() == []
+    log.record(0.05, {"path": "/fast"})
+    assert [entry["path"] for entry in log.entries()] == ["/fast"]
@@ -0,0 +1,158 @@
+from typing import Any, Dict, List
+from app.core.keyword_index import KeywordDocument, KeywordIndex
+from app.core.query_pipeline import QueryPipeline, RetrievalResult, reciprocal_rank_fusion
+import asyncio
+
+import pytest
+
+CHUNKS = {
+    "doc": ["the supplier ships within ten days", "payment is due on delivery",
+            "warranty covers parts for two years", "invoices quote PX-4471 for spare parts"],
+    "other": ["the tenant pays rent monthly", "the landlord repairs the roof"],
+}
+
+
+class FakeQueryEmbeddings:
+    """Embeds a question as its index in the batch, recording every request."""
+
+    def __init__(self):
+        self.requests: List[List[str]] = []
+
+    async def process_queries(self, questions: List[str]) -> List[List[float]]:
+        self.requests.append(list(questions))
+        return [[float(i)] for i in range(len(questions))]
+
+
+class FakeSearch:
+    """Vector search returning a document's chunks in reverse order, so dense and BM25 rankings differ."""
+
+    def __init__(self):
+        self.searches: List[tuple] = []
+        self.fetched: List[List[str]] = []
+        self.failing = set()
+
+    def chunk(self, chunk_id: str):
+        doc_id, index = chunk_id.rsplit("_", 1)
+        return CHUNKS[doc_id][int(index)], {"doc_id": doc_id, "chunk_index": int(index)}
+
+    async def query_documents_batch(self, query_embeddings, doc_id: str, n_results: int) -> List[Dict[str, Any]]:
+        self.searches.append((doc_id, len(query_embeddings), n_results))
+        if doc_id in self.failing:
+            raise ConnectionError("vector store unavailable")
+        if doc_id not in CHUNKS:
+            return [{"ids": [], "documents": [], "metadatas": [], "distances": []} for _ in query_embeddings]
+        ids = [f"{doc_id}_{i}" for i in reversed(range(len(CHUNKS[doc_id])))][:n_results]
+        return [{
+            "ids": ids,
+            "documents": [self.chunk(chunk_id)[0] for chunk_id in ids],
+            "metadatas": [self.chunk(chunk_id)[1] for chunk_id in ids],
+            "distances": [0.1 * (rank + 1) for rank in range(len(ids))],
+        } for _ in query_embeddings]
+
+    def get_chunks(self, doc_id: str, ids: List[str]) -> Dict[str, List[Any]]:
+        self.fetched.append(list(ids))
+        return {"ids": ids, "documents": [self.chunk(chunk_id)[0] for chunk_id in ids],
+                "metadatas": [self.chunk(chunk_id)[1] for chunk_id in ids]}
+
+
+@pytest.fixture
+def keyword_index(tmp_path):
+    index = KeywordIndex(str(tmp_path / "keywords.sqlite3"))
+    for doc_id, texts in CHUNKS.items():
+        keywords = KeywordDocument(doc_id)
+        for i, text in enumerate(texts):
+            keywords.add(f"{doc_id}_{i}", text)
+        index.replace_document(keywords)
+    yield index
+    index.close()
+
+
+@pytest.fixture
+def make_pipeline(keyword_index):
+    embeddings, search = FakeQueryEmbeddings(), FakeSearch()
+
+    def make_pipeline(mode: str, **kwargs) -> QueryPipeline:
+        kwargs.setdefault("candidates", 4)
+        pipeline = QueryPipeline(embeddings, search, llm=object(), top_k=2, keyword_index=keyword_index,
+                                 mode=mode, **kwargs)
+        pipeline.embeddings, pipeline.search = embeddings, search
+        return pipeline
+    return make_pipeline
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a", "d"]], k=60)
+    assert [chunk_id for chunk_id, _ in fused] == ["a", "c", "b", "d"]
+    assert fused[0][1] == 1 / 61 + 1 / 62
+
+
+def test_reciprocal_rank_fusion_of_one_ranking_keeps_its_order():
+    fused = reciprocal_rank_fusion([["x", "y", "z"]], k=1)
+    assert fused == [("x", 1 / 2), ("y", 1 / 3), ("z", 1 / 4)]
+
+
+def test_invalid_modes_are_rejected(keyword_index):
+    with pytest.raises(ValueError):
+        QueryPipeline(FakeQueryEmbeddings(), FakeSearch(), llm=object(), mode="sparse")
+    with pytest.raises(ValueError):
+        QueryPipeline(FakeQueryEmbeddings(), FakeSearch(), llm=object(), mode="hybrid")
+
+
+def test_dense_batch_embeds_once_and_searches_once_per_document(make_pipeline):
+    pipeline = make_pipeline("dense")
+    pipeline.search.failing.add("broken")
+    questions = [("when is payment due?", "doc"), ("who repairs?", "other"),
+                 ("what is covered?", "doc"), ("anything?", "broken")]
+    results = asyncio.run(pipeline.retrieve_batch(questions))
+
+    assert pipeline.embeddings.requests == [[question for question, _ in questions]]
+    assert sorted(pipeline.search.searches) == [("broken", 1, 2), ("doc", 2, 2), ("other", 1, 2)]
+    assert [result.ids for result in results[:3]] == [["doc_3", "doc_2"], ["other_1", "other_0"],
+                                                      ["doc_3", "doc_2"]]
+    assert all(result.context_id == context_id for result, (_, context_id) in zip(results, questions[:3]))
+    # A failed search only fails the questions about that document
+    assert isinstance(results[3], ConnectionError)
+
+
+def test_keyword_mode_skips_the_embedding_request(make_pipeline):
+    pipeline = make_pipeline("keyword")
+    result = asyncio.run(pipeline.retrieve("payment on delivery", "doc"))
+    assert result.ids[0] == "doc_1"
+    assert result.distances[0] is None and result.scores[0] > 0
+    assert pipeline.embeddings.requests == []
+
+    # No chunk contains a query term: dense retrieval answers instead
+    result = asyncio.run(pipeline.retrieve("zebra", "doc"))
+    assert result.ids == ["doc_3", "doc_2"]
+    assert pipeline.embeddings.requests == [["zebra"]]
+
+
+def test_hybrid_mode_fuses_dense_and_keyword_rankings(make_pipeline):
+    pipeline = make_pipeline("hybrid", rrf_k=60)
+    result = asyncio.run(pipeline.retrieve("supplier ships", "doc"))
+    # doc_0 is last in the dense ranking but first by BM25, doc_3 first by dense only
+    dense = ["doc_3", "doc_2", "doc_1", "doc_0"]
+    keyword = [chunk_id for chunk_id, _ in pipeline.keyword_index.search("doc", "supplier ships", 4)]
+    assert result.ids == [chunk_id for chunk_id, _ in reciprocal_rank_fusion([dense, keyword], 60)][:2]
+    assert pipeline.search.searches == [("doc", 1, 4)]
+    # Fused chunks come from the vector search results, nothing is fetched again
+    assert pipeline.search.fetched == []
+    assert isinstance(result, RetrievalResult) and len(result.scores) == 2
+
+
+def test_hybrid_mode_fetches_chunks_only_found_by_keyword(make_pipeline):
+    pipeline = make_pipeline("hybrid", candidates=2, rrf_k=60)
+    result = asyncio.run(pipeline.retrieve("supplier ships", "doc"))
+    # The vector search only returns doc_3 and doc_2; doc_0 tops the BM25 ranking as doc_3 tops the dense one
+    assert set(result.ids) == {"doc_0", "doc_3"}
+    assert pipeline.search.fetched == [["doc_0"]]
+    assert result.documents[result.ids.index("doc_0")] == CHUNKS["doc"][0]
+    assert result.distances[result.ids.index("doc_0")] is None
+    assert result.distances[result.ids.index("doc_3")] == 0.1
+
+
+def test_hybrid_mode_without_keyword_matches_keeps_the_dense_order(make_pipeline):
+    pipeline = make_pipeline("hybrid")
+    result = asyncio.run(pipeline.retrieve("zebra", "doc"))
+    assert result.ids == ["doc_3", "doc_2"]
+    assert result.distances == [0.1, 0.2]
@@ -0,0 +1,126 @@
+from app.api.dependencies import get_db_connector, get_document_loader, get_job_store, get_upload_store
+from app.api.routes import router
+from app.core.document_loader import DocumentLoader
+from app.core.job_store import JobStore
+from app.core.upload_store import UploadStore
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import os
+
+import pytest
+
+
+@pytest.fixture
+def job_store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def upload_store(tmp_path):
+    store = UploadStore(path=str(tmp_path / "uploads.sqlite3"), directory=str(tmp_path / "sessions"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def client(job_store, upload_store, vector_store):
+    app = FastAPI()
+    app.include_router(router, prefix="/api/v1")
+    app.dependency_overrides[get_job_store] = lambda: job_store
+    app.dependency_overrides[get_upload_store] = lambda: upload_store
+    app.dependency_overrides[get_db_connector] = lambda: vector_store
+    app.dependency_overrides[get_document_loader] = DocumentLoader
+    with TestClient(app) as client:
+        yield client
+
+
+def ingested(job_store, vector_store, doc_id="doc", chunks=3):
+    job = job_store.create(doc_id, "v1.txt", "text/plain")
+    job_store.update(job["job_id"], status="completed", stage="completed", pages_parsed=2)
+    vector_store.add_chunks(doc_id, [f"{doc_id}_{i}" for i in range(chunks)], ["text"] * chunks,
+                            [{"chunk_index": i} for i in range(chunks)], [[1.0]] * chunks)
+    return job
+
+
+def test_get_job(client, job_store):
+    job = job_store.create("doc", "a.txt", "text/plain")
+    response = client.get(f"/api/v1/jobs/{job['job_id']}")
+    assert response.status_code == 200
+    assert response.json()["status"] == "queued" and "owner" not in response.json()
+    assert client.get("/api/v1/jobs/job_missing").status_code == 404
+
+
+def test_document_status_follows_the_latest_job(client, job_store, vector_store):
+    first = ingested(job_store, vector_store)
+    status = client.get("/api/v1/documents/doc").json()
+    assert status["status"] == "success" and status["job_id"] == first["job_id"]
+    assert status["chunk_count"] == 3 and "failed_revision" not in status
+
+    second = job_store.create("doc", "v2.txt", "text/plain")
+    job_store.update(second["job_id"], status="running", stage="embedding")
+    status = client.get("/api/v1/documents/doc").json()
+    assert status["status"] == "processing" and status["stage"] == "embedding"
+    assert client.get("/api/v1/documents/unknown").status_code == 404
+
+
+def test_a_failed_revision_leaves_the_previous_version_ready(client, job_store, vector_store):
+    first = ingested(job_store, vector_store)
+    second = job_store.create("doc", "v2.txt", "text/plain")
+    job_store.update(second["job_id"], status="failed", stage="embedding", error="rate limited")
+
+    status = client.get("/api/v1/documents/doc").json()
+    assert status["status"] == "success"
+    assert status["job_id"] == first["job_id"] and status["filename"] == "v1.txt"
+    assert status["failed_revision"]["job_id"] == second["job_id"]
+    assert status["failed_revision"]["error"] == "rate limited"
+
+
+def test_a_failed_first_version_is_reported_as_failed(client, job_store):
+    job = job_store.create("doc", "v1.txt", "text/plain")
+    job_store.update(job["job_id"], status="failed", stage="parsing", error="not a PDF")
+    status = client.get("/api/v1/documents/doc").json()
+    assert status["status"] == "failed" and status["error"] == "not a PDF"
+
+
+def test_upload_lifecycle(client, upload_store):
+    data = b"0123456789" * 100
+    upload = client.post("/api/v1/uploads", json={"filename": "a.txt", "content_type": "text/plain",
+                                                   "size": len(data)})
+    assert upload.status_code == 201
+    upload_id = upload.json()["upload_id"]
+    part = client.put(f"/api/v1/uploads/{upload_id}", content=data[:400],
+                      headers={"Content-Range": f"bytes 0-399/{len(data)}"})
+    assert part.status_code == 200 and part.json()["missing"] == [[400, len(data)]]
+    assert client.get(f"/api/v1/uploads/{upload_id}").json()["bytes_received"] == 400
+    assert client.delete(f"/api/v1/uploads/{upload_id}").status_code == 204
+    assert client.get(f"/api/v1/uploads/{upload_id}").status_code == 404
+    assert client.delete(f"/api/v1/uploads/{upload_id}").status_code == 404
+
+
+def test_a_part_racing_the_end_of_its_upload_is_not_found(client, upload_store):
+    data = b"0123456789" * 100
+    upload_id = upload_store.create("a.txt", "text/plain", len(data))["upload_id"]
+
+    def body():
+        yield data[:200]
+        # The upload is completed (its file moved to the queue) while this part streams in
+        upload_store.delete(upload_id)
+        yield data[200:400]
+
+    response = client.put(f"/api/v1/uploads/{upload_id}", content=body(),
+                          headers={"Content-Range": f"bytes 0-399/{len(data)}"})
+    assert response.status_code == 404
+    # Nothing is recorded for the forgotten session
+    assert not upload_store._conn.execute("SELECT 1 FROM upload_parts WHERE upload_id = ?", (upload_id,)).fetchall()
+
+
+def test_a_part_for_an_upload_whose_file_was_moved_is_not_found(client, upload_store):
+    data = b"0123456789" * 100
+    upload_id = upload_store.create("a.txt", "text/plain", len(data))["upload_id"]
+    # /complete moves the file to the ingestion queue before it forgets the session
+    os.remove(upload_store.file_path(upload_id))
+    response = client.put(f"/api/v1/uploads/{upload_id}", content=data[:400],
+                          headers={"Content-Range": f"bytes 0-399/{len(data)}"})
+    assert response.status_code == 404
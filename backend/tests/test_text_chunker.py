@@ -0,0 +1,94 @@
+from app.core.text_chunker import IncrementalChunker, TextChunker
+import random
+
+import pytest
+
+
+def sample_text(paragraphs: int = 40, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words = "payment notice period warranty clause party agreement term renewal liability".split()
+    return "\n\n".join(
+        "\n".join(" ".join(rng.choices(words, k=rng.randint(3, 25))) for _ in range(rng.randint(1, 4)))
+        for _ in range(paragraphs)
+    )
+
+
+def spans(chunks):
+    return [(chunk.char_start, chunk.char_end, chunk.text) for chunk in chunks]
+
+
+def test_chunk_offsets_index_the_source_text():
+    text = sample_text()
+    chunker = TextChunker(chunk_size=200, chunk_overlap=50)
+    chunks = list(chunker.iter_spans(text))
+    assert len(chunks) > 5
+    for chunk in chunks:
+        assert chunk.text == text[chunk.char_start:chunk.char_end]
+        assert 0 < len(chunk.text) <= 200
+        assert chunk.text == chunk.text.strip()
+
+
+def test_chunks_advance_and_cover_the_text():
+    text = sample_text()
+    chunks = list(TextChunker(chunk_size=200, chunk_overlap=50).iter_spans(text))
+    assert chunks[0].char_start == 0
+    assert chunks[-1].char_end == len(text.rstrip())
+    for previous, chunk in zip(chunks, chunks[1:]):
+        # A short chunk may lie entirely inside the next chunk's overlap
+        assert previous.char_start <= chunk.char_start
+        assert previous.char_end < chunk.char_end
+        # Nothing between two chunks is skipped except whitespace
+        assert not text[previous.char_end:chunk.char_start].strip()
+
+
+def test_text_without_separators_is_cut_hard_with_character_overlap():
+    text = "x" * 250
+    chunks = list(TextChunker(chunk_size=100, chunk_overlap=20, separators=[" ", ""]).iter_spans(text))
+    assert [(chunk.char_start, chunk.char_end) for chunk in chunks] == [(0, 100), (80, 180), (160, 250)]
+
+
+def test_page_starts_tag_each_chunk_with_its_first_page():
+    text = "first page words " * 20 + "second page words " * 20
+    second = len("first page words " * 20)
+    chunks = list(TextChunker(chunk_size=100, chunk_overlap=0).iter_spans(text, [(0, 1), (second, 2)]))
+    for chunk in chunks:
+        assert chunk.page == (1 if chunk.char_start < second else 2)
+
+
+def test_overlap_must_be_smaller_than_chunk_size():
+    with pytest.raises(ValueError):
+        TextChunker(chunk_size=100, chunk_overlap=100)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_incremental_chunking_matches_chunking_the_whole_text(seed):
+    text = sample_text(seed=seed)
+    chunker = TextChunker(chunk_size=150, chunk_overlap=40)
+    incremental = IncrementalChunker(chunker, flush_size=300)
+    rng = random.Random(seed)
+    chunks = []
+    position = 0
+    while position < len(text):
+        step = rng.randint(1, 120)
+        chunks += incremental.feed(text[position:position + step])
+        position += step
+    chunks += incremental.finish()
+    assert spans(chunks) == spans(chunker.iter_spans(text))
+
+
+def test_incremental_chunks_carry_the_page_they_start_on():
+    chunker = TextChunker(chunk_size=120, chunk_overlap=30)
+    incremental = IncrementalChunker(chunker, flush_size=200)
+    pages = [sample_text(paragraphs=6, seed=page) + "\n\n" for page in range(1, 6)]
+    chunks = []
+    for page, text in enumerate(pages, 1):
+        chunks += incremental.feed(text, page=page)
+    chunks += incremental.finish()
+
+    page_starts, offset = [], 0
+    for page, text in enumerate(pages, 1):
+        page_starts.append((offset, page))
+        offset += len(text)
+    whole = list(chunker.iter_spans("".join(pages), page_starts))
+    assert spans(chunks) == spans(whole)
+    assert [chunk.page for chunk in chunks] == [chunk.page for chunk in whole]
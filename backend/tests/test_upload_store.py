@@ -0,0 +1,143 @@
+from app.core.document_loader import DocumentLoader
+from app.core.ingestion_queue import DocumentBusy, IngestionQueue
+from app.core.job_store import JobStore
+from app.core.upload_store import (
+    ChecksumMismatch, UploadIncomplete, UploadStore, merge_ranges, parse_content_range
+)
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+DATA = b"The warranty lasts two years. Payment is due in thirty days.\n" * 500
+
+
+async def body(data: bytes, block: int = 1000):
+    for start in range(0, len(data), block):
+        yield data[start:start + block]
+
+
+def send(store: UploadStore, upload_id: str, start: int, end: int, data: bytes = DATA):
+    return asyncio.run(store.write_part(upload_id, start, end, body(data[start:end])))
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = UploadStore(path=str(tmp_path / "uploads.sqlite3"), directory=str(tmp_path / "sessions"))
+    yield store
+    store.close()
+
+
+def test_parse_content_range():
+    assert parse_content_range("bytes 0-99/1000") == (0, 100, 1000)
+    assert parse_content_range(" bytes 900-999/1000 ") == (900, 1000, 1000)
+    for header in ("bytes 10-5/100", "bytes=0-99/100", "0-99/100", "bytes 0-/100"):
+        with pytest.raises(ValueError):
+            parse_content_range(header)
+
+
+def test_merge_ranges():
+    assert merge_ranges([(50, 60), (0, 10), (10, 20), (15, 30)]) == [(0, 30), (50, 60)]
+    assert merge_ranges([]) == []
+
+
+def test_create_rejects_invalid_sessions(store):
+    with pytest.raises(ValueError):
+        store.create("a.txt", "text/plain", 0)
+    with pytest.raises(ValueError):
+        store.create("a.txt", "text/plain", store.max_bytes + 1)
+    with pytest.raises(ValueError):
+        store.create("a.txt", "text/plain", 10, sha256="not-a-digest")
+
+
+def test_parts_in_any_order_report_missing_ranges(store):
+    upload = store.create("a.txt", "text/plain", len(DATA))
+    assert upload["missing"] == [[0, len(DATA)]]
+
+    third = len(DATA) // 3
+    send(store, upload["upload_id"], 2 * third, len(DATA))
+    upload = send(store, upload["upload_id"], 0, third)
+    assert upload["missing"] == [[third, 2 * third]]
+    assert upload["bytes_received"] == len(DATA) - third
+    with pytest.raises(UploadIncomplete):
+        store.verify(upload["upload_id"])
+
+    upload = send(store, upload["upload_id"], third, 2 * third)
+    assert upload["missing"] == []
+    verified, fingerprint = store.verify(upload["upload_id"])
+    assert fingerprint == hashlib.sha256(DATA).hexdigest()
+    with open(store.file_path(upload["upload_id"]), "rb") as f:
+        assert f.read() == DATA
+
+
+def test_retried_parts_overlap_harmlessly(store):
+    upload_id = store.create("a.txt", "text/plain", len(DATA))["upload_id"]
+    send(store, upload_id, 0, 2000)
+    send(store, upload_id, 1000, 3000)
+    upload = send(store, upload_id, 0, 2000)
+    assert upload["received"] == [[0, 3000]]
+    assert upload["bytes_received"] == 3000
+
+
+def test_a_short_or_long_body_leaves_the_range_missing(store):
+    upload_id = store.create("a.txt", "text/plain", len(DATA))["upload_id"]
+    with pytest.raises(ValueError):
+        asyncio.run(store.write_part(upload_id, 0, 1000, body(DATA[:999])))
+    with pytest.raises(ValueError):
+        asyncio.run(store.write_part(upload_id, 0, 1000, body(DATA[:1001])))
+    with pytest.raises(ValueError):
+        send(store, upload_id, len(DATA) - 10, len(DATA) + 10, DATA + b"x" * 10)
+    assert store.get(upload_id)["missing"] == [[0, len(DATA)]]
+
+
+def test_verify_checks_the_declared_sha256(store):
+    upload_id = store.create("a.txt", "text/plain", len(DATA), sha256="0" * 64)["upload_id"]
+    send(store, upload_id, 0, len(DATA))
+    with pytest.raises(ChecksumMismatch):
+        store.verify(upload_id)
+
+
+def test_expired_sessions_are_deleted_with_their_files(store):
+    upload_id = store.create("a.txt", "text/plain", len(DATA))["upload_id"]
+    store.ttl_s = -1
+    assert store.expire() == 1
+    assert not os.path.exists(store.file_path(upload_id))
+
+
+def test_finalized_upload_is_queued_or_kept_for_a_retry(tmp_path, monkeypatch, store, vector_store,
+                                                       embedding_processor):
+    """The /uploads/{id}/complete path: verify, then hand the file to the ingestion queue."""
+    monkeypatch.setenv("INGESTION_SPOOL_DIR", str(tmp_path / "spool"))
+    job_store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    queue = IngestionQueue(job_store, DocumentLoader(), embedding_processor, vector_store, workers=1)
+
+    async def finalize(upload_id):
+        upload, fingerprint = store.verify(upload_id)
+        job = await queue.submit_spooled(store.file_path(upload_id), fingerprint, upload["filename"],
+                                         upload["content_type"], doc_id=upload["doc_id"])
+        store.delete(upload_id)
+        return job
+
+    async def scenario():
+        await queue.start()
+        try:
+            first = store.create("a.txt", "text/plain", len(DATA))["upload_id"]
+            await store.write_part(first, 0, len(DATA), body(DATA))
+            job = await finalize(first)
+            await asyncio.wait_for(queue._queue.join(), 10)
+            assert job_store.get(job["job_id"])["status"] == "completed"
+            assert vector_store.count_document_chunks(job["doc_id"]) > 0
+
+            # A new version while the document is busy stays in its session
+            job_store.update(job["job_id"], status="running")
+            second = store.create("a.txt", "text/plain", len(DATA) - 100, doc_id=job["doc_id"])["upload_id"]
+            await store.write_part(second, 0, len(DATA) - 100, body(DATA[:-100]))
+            with pytest.raises(DocumentBusy):
+                await finalize(second)
+            assert store.verify(second)[1] == hashlib.sha256(DATA[:-100]).hexdigest()
+        finally:
+            await queue.stop()
+            job_store.close()
+
+    asyncio.run(scenario())
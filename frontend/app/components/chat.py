@@ -1,6 +1,5 @@
 import streamlit as st
-from services.api import APIClient
-import requests
+from services.api import TIMEOUT, get_api_client
 import logging
 
 # Configure logging (you can later adjust this configuration as needed)
@@ -10,7 +9,7 @@ logger = logging.getLogger(__name__)
 class ChatInterface:
     def __init__(self):
         logger.debug("Initializing ChatInterface...")
-        self.api_client = APIClient()
+        self.api_client = get_api_client()
         logger.debug("APIClient initialized.")
 
     def __call__(self):
@@ -47,39 +46,50 @@ class ChatInterface:
             st.session_state.messages.append({"role": "user", "content": user_input})
             logger.debug("User message appended to session state.")
 
-            # Get AI response from backend
-            with st.spinner("Thinking..."):
-                if isinstance(st.session_state.current_document, dict):
-                    document_id = st.session_state.current_document.get("id")
-                else:
-                    document_id = st.session_state.current_document
-                
-                response = self.api_client.query_document(
+            # Stream the AI response from the backend, rendering tokens as they arrive
+            if isinstance(st.session_state.current_document, dict):
+                document_id = st.session_state.current_document.get("id")
+            else:
+                document_id = st.session_state.current_document
+
+            with st.chat_message("assistant"):
+                placeholder = st.empty()
+                placeholder.markdown("Thinking...")
+                answer = ""
+                sources = []
+                error = None
+
+                for event, data in self.api_client.stream_query(
                     document_id=document_id,
                     question=user_input
-                )
-                logger.debug(f"Received response from APIClient: {response}")
+                ):
+                    if event == "sources":
+                        sources = data.get("sources", [])
+                        logger.debug(f"Received {len(sources)} sources from backend.")
+                    elif event == "token":
+                        answer += data.get("text", "")
+                        placeholder.markdown(answer + "▌")
+                    elif event == "error":
+                        error = data.get("detail")
+
+                if error is None:
+                    placeholder.markdown(answer)
+                    if sources:
+                        with st.expander("View Sources"):
+                            for source in sources:
+                                st.markdown(f"📄 Page {source['page']}: {source['text']}")
 
-                if response.get("status") != "error":
                     # Add assistant message
-                    assistant_message = {
+                    st.session_state.messages.append({
                         "role": "assistant",
-                        "content": response["answer"],
-                        "sources": response.get("sources", [])
-                    }
-                    st.session_state.messages.append(assistant_message)
+                        "content": answer,
+                        "sources": sources
+                    })
                     logger.debug("Assistant message appended to session state.")
-                    
-                    # Display the new message immediately
-                    with st.chat_message("assistant"):
-                        st.markdown(response["answer"])
-                        if response.get("sources"):
-                            with st.expander("View Sources"):
-                                for source in response["sources"]:
-                                    st.markdown(f"📄 Page {source['page']}: {source['text']}")
                 else:
-                    st.error(f"❌ Error: {response.get('message')}")
-                    logger.error(f"Error processing query: {response.get('message')}")
+                    placeholder.empty()
+                    st.error(f"❌ Error: {error}")
+                    logger.error(f"Error processing query: {error}")
 
     def ask_question(self):
         logger.debug("ChatInterface.ask_question invoked.")
@@ -109,9 +119,10 @@ class ChatInterface:
                     }
                     logger.debug(f"Request payload: {payload}")
                     
-                    response = requests.post(
-                        "http://localhost:8001/api/v1/query",
+                    response = self.api_client.session.post(
+                        f"{self.api_client.base_url}/query",
                         json=payload,
+                        timeout=TIMEOUT,
                         headers={
                             "Content-Type": "application/json",
                             "Accept": "application/json"
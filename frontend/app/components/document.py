@@ -1,9 +1,9 @@
 import streamlit as st
-from services.api import APIClient
+from services.api import get_api_client
 
 class DocumentViewer:
     def __init__(self):
-        self.api_client = APIClient()
+        self.api_client = get_api_client()
 
     def __call__(self):
         if st.session_state.current_document:
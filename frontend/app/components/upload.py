@@ -1,11 +1,14 @@
+import time
 import streamlit as st
-from services.api import APIClient
+from services.api import get_api_client
 from utils.file import validate_file
 
 
 class FileUploader:
+    POLL_INTERVAL_SECONDS = 1.0
+
     def __init__(self):
-        self.api_client = APIClient()
+        self.api_client = get_api_client()
 
     def __call__(self):
         # Add clear instructions with visible borders
@@ -29,29 +32,67 @@ class FileUploader:
             st.success(f"📄 Uploaded: {uploaded_file.name}")
 
             if validate_file(uploaded_file):
+                current_document = st.session_state.get("current_document")
+                new_version = bool(current_document) and st.checkbox(
+                    "Upload as a new version of the current document",
+                    help="Only the changed parts of the document are processed again"
+                )
                 if st.button("📝 Process Document", type="primary"):
                     try:
-                        with st.spinner("Processing document..."):
-                            response = self.api_client.upload_document(uploaded_file)
-
-                            if response.get("status") == "success":
-                                doc_id = response.get("doc_id")
-                                st.session_state.current_document = doc_id
-
-                                # Verify document in Chroma
-                                doc_status = self.api_client.get_document_status(doc_id)
-                                if doc_status.get("status") == "success":
-                                    st.success(f"""
-                                    ✅ Document processed successfully!
-                                    - Chunks created: {doc_status.get('chunk_count')}
-                                    - Ready for questions
-                                    """)
-
-                                    # Force refresh to show chat interface
-                                    st.rerun()
-                                else:
-                                    st.warning("Document processed but not found in database")
-                            else:
-                                st.error(f"❌ Processing failed: {response.get('message', 'Unknown error')}")
+                        response = self.api_client.upload_document(
+                            uploaded_file, doc_id=current_document if new_version else None
+                        )
+
+                        if response.get("status") == "duplicate":
+                            st.info("ℹ️ This document was already processed, reusing it.")
+                            self._wait_for_ingestion(response["job_id"])
+                        elif response.get("status") == "queued":
+                            self._wait_for_ingestion(response["job_id"])
+                        else:
+                            st.error(f"❌ Processing failed: {response.get('message', 'Unknown error')}")
                     except Exception as e:
                         st.error(f"❌ Error: {str(e)}")
+
+    def _wait_for_ingestion(self, job_id: str):
+        """Poll the ingestion job and show its progress until it finishes"""
+        progress = st.progress(0.0, text="Queued for processing...")
+        while True:
+            job = self.api_client.get_job(job_id)
+            if job is None:
+                return
+
+            if job["status"] == "completed":
+                progress.progress(1.0, text="Done")
+                doc_id = job["doc_id"]
+                st.session_state.current_document = doc_id
+
+                # Verify document in Chroma; its cached status predates this ingestion
+                doc_status = self.api_client.get_document_status(doc_id, fresh=True)
+                if doc_status.get("status") == "success":
+                    st.success(f"""
+                    ✅ Document processed successfully!
+                    - Chunks created: {doc_status.get('chunk_count')}
+                    - Ready for questions
+                    """)
+
+                    # Force refresh to show chat interface
+                    st.rerun()
+                else:
+                    st.warning("Document processed but not found in database")
+                return
+
+            if job["status"] == "failed":
+                progress.empty()
+                st.error(f"❌ Processing failed: {job.get('error') or 'Unknown error'}")
+                return
+
+            total = job["chunks_total"]
+            fraction = job["chunks_stored"] / total if total else 0.0
+            progress.progress(
+                fraction,
+                text=(f"{job['stage'].capitalize()}... "
+                      f"{job['pages_parsed']} pages parsed, "
+                      f"{job['chunks_embedded']}/{total} chunks embedded, "
+                      f"{job['chunks_stored']}/{total} chunks stored")
+            )
+            time.sleep(self.POLL_INTERVAL_SECONDS)
@@ -1,18 +1,63 @@
+import json
 import requests
 import streamlit as st
-from typing import Dict, Any, Optional
+from requests.adapters import HTTPAdapter
+from requests_toolbelt.multipart.encoder import MultipartEncoder
+from typing import Dict, Any, Iterator, Optional, Tuple
+from urllib3.util.retry import Retry
+
+# (connect, read) seconds; the read timeout bounds the wait between streamed tokens too
+TIMEOUT = (3.05, 120)
+# Document status changes only while a document is processed, so reruns can share lookups
+DOCUMENT_STATUS_TTL_SECONDS = 30
+
+
+def create_session(pool_size: int = 10, retries: int = 3) -> requests.Session:
+    """
+    Keep-alive session with a connection pool and retries.
+
+    Connection failures are retried for every method, since the request never
+    reached the backend. Idempotent GETs are also retried on read errors and on
+    502/503/504, with exponential backoff honouring Retry-After.
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=0.5,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET"}),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
 
 class APIClient:
-    def __init__(self, base_url="http://localhost:8001/api/v1"):
+    def __init__(self, base_url="http://localhost:8001/api/v1", session: Optional[requests.Session] = None):
         self.base_url = base_url
+        self.session = session or create_session()
 
-    def upload_document(self, file) -> Dict[str, Any]:
-        """Upload and process a document"""
+    def upload_document(self, file, doc_id: Optional[str] = None) -> Dict[str, Any]:
+        """Upload and process a document, optionally as a new version of doc_id"""
         try:
-            files = {"file": file}
-            response = requests.post(
+            # The encoder reads the file in blocks as the body is sent instead of
+            # building the whole multipart body in memory first
+            file.seek(0)
+            fields = {"file": (file.name, file, file.type or "application/octet-stream")}
+            if doc_id:
+                fields["doc_id"] = doc_id
+            body = MultipartEncoder(fields=fields)
+            response = self.session.post(
                 f"{self.base_url}/ingest",
-                files=files
+                data=body,
+                headers={"Content-Type": body.content_type},
+                timeout=TIMEOUT
             )
             response.raise_for_status()
             return response.json()
@@ -20,6 +65,16 @@ class APIClient:
             st.error(f"Error uploading document: {str(e)}")
             return {"status": "error", "message": str(e)}
 
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get the status and progress of an ingestion job"""
+        try:
+            response = self.session.get(f"{self.base_url}/jobs/{job_id}", timeout=TIMEOUT)
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            st.error(f"Error getting ingestion status: {str(e)}")
+            return None
+
     def query_document(self, document_id: str, question: str) -> Dict[str, Any]:
         """Query a document with a question"""
         try:
@@ -28,33 +83,60 @@ class APIClient:
                 "text": question,
                 "context_id": document_id
             }
-            response = requests.post(url, json=payload)
+            response = self.session.post(url, json=payload, timeout=TIMEOUT)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             st.error(f"Error querying document: {str(e)}")
             return {"status": "error", "message": str(e)}
 
-    def get_document_status(self, doc_id: str) -> Optional[Dict[str, Any]]:
-        """Get document processing status and metadata"""
+    def stream_query(self, document_id: str, question: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Query a document and yield (event, data) pairs as the answer streams in"""
         try:
-            response = requests.get(
-                f"{self.base_url}/document/{doc_id}"
-            )
-            response.raise_for_status()
-            return response.json()
+            url = f"{self.base_url}/query/stream"
+            payload = {
+                "text": question,
+                "context_id": document_id
+            }
+            with self.session.post(url, json=payload, stream=True, timeout=TIMEOUT,
+                                   headers={"Accept": "text/event-stream"}) as response:
+                response.raise_for_status()
+                event = "message"
+                for line in response.iter_lines(decode_unicode=True):
+                    if line.startswith("event:"):
+                        event = line[len("event:"):].strip()
+                    elif line.startswith("data:"):
+                        yield event, json.loads(line[len("data:"):].strip())
+                        event = "message"
         except requests.exceptions.RequestException as e:
-            st.error(f"Error getting document status: {str(e)}")
-            return None
+            st.error(f"Error querying document: {str(e)}")
+            yield "error", {"detail": str(e)}
+
+    def get_document_status(self, doc_id: str, fresh: bool = False) -> Dict[str, Any]:
+        """
+        Get document status from the backend, cached for DOCUMENT_STATUS_TTL_SECONDS.
 
-    def get_document_status(self, doc_id: str) -> Dict[str, Any]:
-        """Get document status from Chroma"""
+        Pass fresh=True after the document changed (e.g. an ingestion finished)
+        to drop cached lookups first. Failed lookups are not cached.
+        """
+        if fresh:
+            _fetch_document_status.clear()
         try:
-            response = requests.get(
-                f"{self.base_url}/documents/{doc_id}"
-            )
-            response.raise_for_status()
-            return response.json()
+            return _fetch_document_status(self.base_url, doc_id)
         except requests.exceptions.RequestException as e:
             st.error(f"Error getting document status: {str(e)}")
             return {"status": "error", "message": str(e)}
+
+
+@st.cache_data(ttl=DOCUMENT_STATUS_TTL_SECONDS, show_spinner=False)
+def _fetch_document_status(base_url: str, doc_id: str) -> Dict[str, Any]:
+    # Raises on failure, and Streamlit does not cache exceptions
+    response = get_api_client(base_url).session.get(f"{base_url}/documents/{doc_id}", timeout=TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+@st.cache_resource
+def get_api_client(base_url: str = "http://localhost:8001/api/v1") -> APIClient:
+    """The APIClient shared by every session and rerun of this Streamlit server, so its pool is reused."""
+    return APIClient(base_url)
@@ -1,4 +1,5 @@
 from typing import Union
+import streamlit as st
 from streamlit.runtime.uploaded_file_manager import UploadedFile
 
 def validate_file(file: Union[UploadedFile, None]) -> bool:
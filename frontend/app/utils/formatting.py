@@ -1,4 +1,4 @@
- def format_sources(sources: list) -> str:
+def format_sources(sources: list) -> str:
     """Format source citations"""
     if not sources:
         return ""